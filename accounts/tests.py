@@ -1,3 +1,58 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from boutique.tests import MOT_DE_PASSE, BudgetRequetes, Cas, creer_catalogue, creer_utilisateur
+
+from .models import AdresseUtilisateur, ProfilUtilisateur
+
+
+def _kwargs_adresse(test):
+    return {'pk': test.adresse.pk}
+
+
+ADRESSE = {
+    'nom': 'Maison', 'prenom': 'Amel', 'nom_famille': 'Ben Salah',
+    'adresse_ligne1': '12 rue de Marseille', 'ville': 'Tunis', 'code_postal': '1000',
+    'pays': 'Tunisie', 'telephone': '+216 71 000 000', 'type_adresse': 'livraison',
+}
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BudgetRequetesAccountsTests(BudgetRequetes, TestCase):
+    URLCONF = 'accounts.urls'
+
+    # Les templates de ces vues ne sont pas encore dans le dépôt
+    SANS_BUDGET = {
+        'accounts:password_reset': 'template accounts/password_reset.html absent',
+        'accounts:password_reset_done': 'template accounts/password_reset_done.html absent',
+        'accounts:password_reset_confirm': 'template accounts/password_reset_confirm.html absent',
+        'accounts:password_reset_complete': 'template accounts/password_reset_complete.html absent',
+    }
+
+    CAS = [
+        Cas('accounts:login', 0),
+        Cas('accounts:login', 10, methode='post', statut=302,
+            donnees={'username': 'acheteur', 'password': MOT_DE_PASSE}),
+        Cas('accounts:inscription', 0),
+        Cas('accounts:inscription', 17, methode='post', statut=302, donnees={
+            'username': 'nouveau', 'email': 'nouveau@example.com', 'prenom': 'Sami', 'nom': 'Trabelsi',
+            'password1': 'Un-mot-de-passe-solide-42', 'password2': 'Un-mot-de-passe-solide-42',
+        }),
+        Cas('accounts:logout', 4, utilisateur='acheteur', statut=302),
+        Cas('accounts:profil', 4, utilisateur='acheteur'),
+        Cas('accounts:modifier_profil', 5, methode='post', utilisateur='acheteur', statut=302, donnees={
+            'prenom': 'Amel', 'nom': 'Ben Salah', 'email': 'amel@example.com', 'telephone': '+216 71 000 001',
+        }),
+        Cas('accounts:ajouter_adresse', 3, methode='post', utilisateur='acheteur', statut=302, donnees=ADRESSE),
+        Cas('accounts:modifier_adresse', 4, methode='post', utilisateur='acheteur', statut=302,
+            kwargs=_kwargs_adresse, donnees=dict(ADRESSE, ville='Sousse', code_postal='4000')),
+        Cas('accounts:supprimer_adresse', 4, methode='post', utilisateur='acheteur', statut=302,
+            kwargs=_kwargs_adresse),
+        Cas('accounts:check_username', 1, donnees={'username': 'acheteur'}),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_catalogue()
+        cls.acheteur = creer_utilisateur('acheteur')
+        ProfilUtilisateur.objects.create(user=cls.acheteur, telephone='+216 71 000 000')
+        cls.adresse = AdresseUtilisateur.objects.create(user=cls.acheteur, **ADRESSE)
@@ -0,0 +1,7 @@
+"""
+Mesures de charge de bout en bout de la boutique (voir __main__.py).
+
+peuplement : catalogue de N produits générés ; scenarios : parcours des
+utilisateurs simulés ; charge : exécution concurrente contre un serveur
+local ; rapport : percentiles, débit, rapports JSON et comparaison.
+"""
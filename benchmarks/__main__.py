@@ -0,0 +1,166 @@
+"""
+Mesures de charge de la boutique.
+
+    python -m benchmarks peupler --produits 100000
+    python -m benchmarks charger --utilisateurs 50 --duree 60
+    python -m benchmarks comparer benchmarks/resultats/avant.json benchmarks/resultats/apres.json
+    python -m benchmarks supprimer
+    python -m benchmarks micro
+"""
+import argparse
+import os
+import sys
+
+from .rapport import SEUIL_REGRESSION, charger as charger_rapport, comparer as comparer_rapports
+from .rapport import comparer_micro, construire_rapport, construire_rapport_micro, enregistrer, formater, get_type
+
+DOSSIER_RESULTATS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultats')
+
+# Identifiants de produits tirés au sort par les scénarios
+ECHANTILLON_PRODUITS = 5000
+
+
+def configurer_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inartdeco.settings')
+    import django
+    django.setup()
+
+
+def contexte_depuis_base():
+    from boutique.models import Categorie, Marque, Produit
+
+    from .scenarios import Contexte
+
+    produits = list(
+        Produit.objects.filter(active=True).order_by('?').values_list('id', flat=True)[:ECHANTILLON_PRODUITS]
+    )
+    if not produits:
+        sys.exit('Catalogue vide : lancer d\'abord `python -m benchmarks peupler --produits N`')
+    return Contexte(
+        produits=produits,
+        categories=list(Categorie.objects.filter(active=True).values_list('id', flat=True)),
+        marques=list(Marque.objects.filter(active=True).values_list('id', flat=True)),
+    )
+
+
+def peupler(options):
+    from .peuplement import peupler as peupler_catalogue
+    crees = peupler_catalogue(options.produits, taille_lot=options.lot, graine=options.graine)
+    print(f'{crees} produits créés')
+
+
+def supprimer(options):
+    from .peuplement import supprimer as supprimer_catalogue
+    print(f'{supprimer_catalogue()} objets supprimés')
+
+
+def charger(options):
+    from boutique.models import Produit
+
+    from .charge import lancer_charge, serveur_local
+    from .scenarios import SCENARIOS
+
+    scenarios = SCENARIOS
+    if options.scenarios:
+        scenarios = {fonction: poids for fonction, poids in SCENARIOS.items() if fonction.__name__ in options.scenarios}
+
+    contexte = contexte_depuis_base()
+    catalogue = {
+        'produits': Produit.objects.count(),
+        'produits_actifs': Produit.objects.filter(active=True).count(),
+    }
+    parametres = {
+        'utilisateurs': options.utilisateurs,
+        'duree': options.duree,
+        'echauffement': options.echauffement,
+        'pause': options.pause,
+        'graine': options.graine,
+        'scenarios': {fonction.__name__: poids for fonction, poids in scenarios.items()},
+    }
+
+    def mesurer(url):
+        parametres['url'] = url
+        print(f"{options.utilisateurs} utilisateurs sur {url} pendant {options.echauffement} + {options.duree} s...")
+        return lancer_charge(
+            url, contexte, utilisateurs=options.utilisateurs, duree=options.duree,
+            echauffement=options.echauffement, pause=options.pause, graine=options.graine, scenarios=scenarios,
+        )
+
+    if options.url:
+        mesures = mesurer(options.url)
+    else:
+        with serveur_local(options.port) as url:
+            mesures = mesurer(url)
+
+    rapport = construire_rapport(mesures, options.duree, parametres, catalogue)
+    print(formater(rapport))
+    print(f'Rapport : {enregistrer(rapport, options.sortie)}')
+
+
+def micro(options):
+    from .micro import executer
+
+    mesures = executer(options.mesures, repetitions=options.repetitions)
+    rapport = construire_rapport_micro(mesures, {'repetitions': options.repetitions})
+    print(f'Rapport : {enregistrer(rapport, options.sortie)}')
+
+
+def comparer(options):
+    ancien, nouveau = charger_rapport(options.ancien), charger_rapport(options.nouveau)
+    if get_type(ancien) != get_type(nouveau):
+        sys.exit(f'Rapports de types différents : {get_type(ancien)} et {get_type(nouveau)}')
+    fonction = comparer_micro if get_type(nouveau) == 'micro' else comparer_rapports
+    tableau, regressions = fonction(ancien, nouveau, options.seuil)
+    print(tableau)
+    for etape, metrique, avant, apres in regressions:
+        print(f'Régression : {etape} {metrique} {avant} -> {apres}')
+    return 1 if regressions else 0
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Mesures de charge de la boutique')
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    commande = commandes.add_parser('peupler', help='Génère un catalogue de N produits (10k, 100k, 1M...)')
+    commande.add_argument('--produits', type=int, required=True)
+    commande.add_argument('--lot', type=int, default=5000, help='Produits insérés par requête')
+    commande.add_argument('--graine', type=int, default=0)
+    commande.set_defaults(fonction=peupler)
+
+    commande = commandes.add_parser('supprimer', help='Retire les produits générés')
+    commande.set_defaults(fonction=supprimer)
+
+    commande = commandes.add_parser('charger', help='Simule des utilisateurs concurrents et enregistre un rapport JSON')
+    commande.add_argument('--url', help='Serveur à mesurer (par défaut : runserver local démarré pour la mesure)')
+    commande.add_argument('--port', type=int, default=8765, help='Port du serveur local')
+    commande.add_argument('--utilisateurs', type=int, default=20)
+    commande.add_argument('--duree', type=int, default=60, help='Durée mesurée en secondes')
+    commande.add_argument('--echauffement', type=int, default=10, help='Secondes non mesurées au début')
+    commande.add_argument('--pause', type=float, default=0.0, help='Temps de réflexion moyen entre deux scénarios (s)')
+    commande.add_argument('--graine', type=int, default=0)
+    commande.add_argument('--scenarios', nargs='+', help='Limiter aux scénarios nommés (ex. panier recherche)')
+    commande.add_argument('--sortie', default=DOSSIER_RESULTATS, help='Dossier des rapports JSON')
+    commande.set_defaults(fonction=charger)
+
+    commande = commandes.add_parser(
+        'micro', help='Chronomètre les propriétés de Produit et le rendu des includes, sans base de données',
+    )
+    commande.add_argument('mesures', nargs='*', help='Préfixes des mesures à lancer (ex. produit. template.product_card)')
+    commande.add_argument('--repetitions', type=int, default=7, help='Séries chronométrées par mesure')
+    commande.add_argument('--sortie', default=DOSSIER_RESULTATS, help='Dossier des rapports JSON')
+    commande.set_defaults(fonction=micro)
+
+    commande = commandes.add_parser('comparer', help='Compare deux rapports de même type (code de sortie 1 en cas de régression)')
+    commande.add_argument('ancien')
+    commande.add_argument('nouveau')
+    commande.add_argument('--seuil', type=float, default=SEUIL_REGRESSION, help='Dégradation relative tolérée')
+    commande.set_defaults(fonction=comparer)
+
+    options = parser.parse_args(arguments)
+    if options.commande != 'comparer':
+        configurer_django()
+    return options.fonction(options) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
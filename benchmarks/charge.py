@@ -0,0 +1,129 @@
+"""Utilisateurs simulés concurrents et serveur local pour les mesures de charge"""
+import contextlib
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .scenarios import SCENARIOS
+
+TIMEOUT_REQUETE = 30
+DELAI_DEMARRAGE_SERVEUR = 60
+
+RACINE_PROJET = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class UtilisateurSimule:
+    """
+    Un visiteur : sa propre session HTTP (cookies de session et CSRF), son
+    générateur aléatoire et ses mesures {étape: [(durée, statut), ...]}.
+    Seules les requêtes envoyées après `debut_mesure` sont enregistrées.
+    """
+
+    def __init__(self, url, contexte, graine, debut_mesure):
+        self.url = url.rstrip('/')
+        self.contexte = contexte
+        self.hasard = random.Random(graine)
+        self.debut_mesure = debut_mesure
+        self.session = requests.Session()
+        self.mesures = defaultdict(list)
+
+    def get(self, etape, chemin, **kwargs):
+        return self._requete(etape, 'GET', chemin, **kwargs)
+
+    def post(self, etape, chemin, **kwargs):
+        if 'csrftoken' not in self.session.cookies:
+            # Les pages de la boutique ne posent le cookie CSRF que pour un
+            # utilisateur connecté ; la page de connexion le pose toujours
+            self.session.get(f'{self.url}/accounts/connexion/', timeout=TIMEOUT_REQUETE)
+        entetes = {'X-CSRFToken': self.session.cookies.get('csrftoken'), 'Referer': f'{self.url}/'}
+        return self._requete(etape, 'POST', chemin, headers=entetes, **kwargs)
+
+    def _requete(self, etape, methode, chemin, **kwargs):
+        debut = time.perf_counter()
+        try:
+            response = self.session.request(methode, f'{self.url}{chemin}', timeout=TIMEOUT_REQUETE, **kwargs)
+            statut = response.status_code
+        except requests.RequestException:
+            response, statut = None, None
+        if time.perf_counter() >= self.debut_mesure:
+            self.mesures[etape].append((time.perf_counter() - debut, statut))
+        return response if response is not None and response.ok else None
+
+
+def simuler(utilisateur, fin, pause, scenarios):
+    """Enchaîne des scénarios tirés selon leurs poids jusqu'à l'instant `fin`"""
+    fonctions, poids = list(scenarios), list(scenarios.values())
+    while time.perf_counter() < fin:
+        utilisateur.hasard.choices(fonctions, poids)[0](utilisateur)
+        if pause:
+            time.sleep(utilisateur.hasard.expovariate(1 / pause))
+    utilisateur.session.close()
+    return utilisateur.mesures
+
+
+def lancer_charge(url, contexte, utilisateurs=20, duree=60, echauffement=10, pause=0.0,
+                  graine=0, scenarios=SCENARIOS):
+    """
+    Fait tourner `utilisateurs` visiteurs simulés en parallèle pendant
+    `echauffement` + `duree` secondes ; retourne les mesures fusionnées
+    {étape: [(durée, statut), ...]} de la période mesurée.
+    """
+    debut = time.perf_counter()
+    debut_mesure = debut + echauffement
+    fin = debut_mesure + duree
+    simules = [
+        UtilisateurSimule(url, contexte, f'{graine}-{numero}', debut_mesure)
+        for numero in range(utilisateurs)
+    ]
+    mesures = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=utilisateurs, thread_name_prefix='utilisateur') as executeur:
+        for resultat in executeur.map(lambda simule: simuler(simule, fin, pause, scenarios), simules):
+            for etape, valeurs in resultat.items():
+                mesures[etape].extend(valeurs)
+    return mesures
+
+
+@contextlib.contextmanager
+def serveur_local(port, settings='benchmarks.settings'):
+    """
+    Démarre `manage.py runserver` (sans rechargement, DEBUG désactivé par
+    benchmarks/settings.py) le temps des mesures. Pour des chiffres proches
+    de la production, lancer plutôt le serveur WSGI de production et passer
+    son adresse avec --url.
+    """
+    url = f'http://127.0.0.1:{port}'
+    # Journal d'accès et erreurs du serveur, consultables après la mesure
+    journal = tempfile.NamedTemporaryFile(prefix='benchmark-serveur-', suffix='.log', delete=False)
+    processus = subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload', '--settings', settings],
+        cwd=RACINE_PROJET,
+        stdout=journal,
+        stderr=subprocess.STDOUT,
+    )
+    try:
+        limite = time.monotonic() + DELAI_DEMARRAGE_SERVEUR
+        while True:
+            if processus.poll() is not None:
+                raise RuntimeError(f'Le serveur local s\'est arrêté (code {processus.returncode}), voir {journal.name}')
+            try:
+                requests.get(f'{url}/', timeout=TIMEOUT_REQUETE)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > limite:
+                    raise RuntimeError(f'Le serveur local ne répond pas sur {url}, voir {journal.name}')
+                time.sleep(0.5)
+        yield url
+    finally:
+        processus.terminate()
+        try:
+            processus.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processus.kill()
+        journal.close()
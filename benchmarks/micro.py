@@ -0,0 +1,214 @@
+"""
+Micro-mesures des chemins chauds : propriétés de Produit calculées à chaque
+carte et rendu des includes répétés sur chaque page (carte produit,
+pagination, menus de catégories).
+
+Tout est mesuré sur des objets construits en mémoire, avec les mêmes données
+à chaque exécution : toute requête SQL fait échouer la mesure, et les
+résultats de deux commits sont directement comparables.
+"""
+import random
+import statistics
+import timeit
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.loader import get_template
+
+from boutique.images import FORMATS, RENDITIONS
+from boutique.models import Categorie, Marque, Produit
+from boutique.notes import CHAMPS_HISTOGRAMME
+from boutique.pagination import PAR_PAGE, PageCurseur
+
+from .vocabulaire import COULEURS, MATERIAUX, TYPES
+
+REPETITIONS = 7
+NOMBRE_PRODUITS = 1000
+
+_mesures = {}
+
+
+def mesure(nom, elements=1):
+    """Enregistre une fabrique de mesure : elle prépare les données et retourne la fonction chronométrée"""
+    def decorateur(fabrique):
+        _mesures[nom] = (fabrique, elements)
+        return fabrique
+    return decorateur
+
+
+def produits_en_memoire(nombre=NOMBRE_PRODUITS, graine=0):
+    """Produits non enregistrés : un sur cinq en promotion, un sur deux avec ses renditions"""
+    hasard = random.Random(graine)
+    categorie = Categorie(pk=1, nom='Cuisine', chemin='1/', niveau=1)
+    marque = Marque(pk=1, nom='Marque')
+    produits = []
+    for numero in range(nombre):
+        prix = Decimal(hasard.randint(500, 50000)) / 100
+        histogramme = [hasard.randint(0, 20) for _ in range(5)]
+        produit = Produit(
+            pk=numero + 1,
+            nom=f'{hasard.choice(TYPES)} {hasard.choice(MATERIAUX)} {hasard.choice(COULEURS)} {numero}',
+            description='Un produit robuste et élégant pour la maison, facile à entretenir au quotidien. ' * 3,
+            prix=prix,
+            prix_promo=(prix * Decimal('0.8')).quantize(Decimal('0.01')) if numero % 5 == 0 else None,
+            stock=hasard.choice([0, 3, 50]),
+            categorie=categorie,
+            marque=marque,
+            image_principale=f'produits/produit-{numero}.jpg',
+            nombre_avis=sum(histogramme),
+            note_moyenne=Decimal(hasard.randint(100, 500)) / 100,
+            **dict(zip(CHAMPS_HISTOGRAMME, histogramme)),
+        )
+        if numero % 2 == 0:
+            produit.renditions = _renditions(produit.image_principale.name, numero)
+        produits.append(produit)
+    return produits
+
+
+def _renditions(source, numero):
+    empreinte = f'{numero:040x}'
+    renditions = {'source': source}
+    for nom, taille in RENDITIONS.items():
+        renditions[nom] = {'largeur': taille, 'hauteur': taille}
+        for extension in FORMATS:
+            renditions[nom][extension] = f'renditions/{empreinte[:2]}/{empreinte}-{nom}.{extension}'
+    return renditions
+
+
+def arbre_en_memoire(racines=16, enfants=6, petits_enfants=3):
+    """Arbre de catégories de la forme retournée par boutique.categories.construire_arbre()"""
+    compteur = iter(range(1, 10 ** 6))
+
+    def noeud(nom, children=()):
+        identifiant = next(compteur)
+        return {
+            'id': identifiant, 'nom': nom, 'slug': f'categorie-{identifiant}', 'icone': 'fas fa-folder',
+            'url': f'/produits/?categorie={identifiant}', 'children': list(children),
+        }
+
+    return [
+        noeud(f'Univers {i}', [
+            noeud(f'Rayon {i}.{j}', [noeud(f'Famille {i}.{j}.{k}') for k in range(petits_enfants)])
+            for j in range(enfants)
+        ])
+        for i in range(racines)
+    ]
+
+
+def _page_curseur(produits):
+    page = PageCurseur(produits[:PAR_PAGE], 'curseur-suivant', 'curseur-precedent')
+    page.querystring = 'categorie=12&tri=prix'
+    return page
+
+
+def _page_numerotee(produits):
+    page = Paginator(produits, PAR_PAGE).page(5)
+    page.querystring = 'categorie=12&tri=prix'
+    return page
+
+
+# --- Propriétés de Produit ---------------------------------------------------
+
+def _propriete(nom):
+    def fabrique():
+        produits = produits_en_memoire()
+        return lambda: [getattr(produit, nom) for produit in produits]
+    return fabrique
+
+
+for _nom in ('prix_final', 'en_promotion', 'economie', 'pourcentage_reduction', 'disponible', 'repartition_notes'):
+    mesure(f'produit.{_nom}', elements=NOMBRE_PRODUITS)(_propriete(_nom))
+
+
+# --- Templates ---------------------------------------------------------------
+
+@mesure('template.product_card', elements=PAR_PAGE)
+def carte_produit():
+    template = get_template('boutique/includes/product_card.html')
+    # Une page de liste : moitié avec renditions, deux produits en promotion
+    produits = produits_en_memoire(PAR_PAGE)
+    return lambda: [template.render({'produit': produit}) for produit in produits]
+
+
+@mesure('template.pagination_curseur')
+def pagination_curseur():
+    template = get_template('boutique/includes/pagination.html')
+    contexte = {'page_obj': _page_curseur(produits_en_memoire(PAR_PAGE))}
+    return lambda: template.render(contexte)
+
+
+@mesure('template.pagination_numerotee')
+def pagination_numerotee():
+    template = get_template('boutique/includes/pagination.html')
+    contexte = {'page_obj': _page_numerotee(produits_en_memoire(PAR_PAGE * 20))}
+    return lambda: template.render(contexte)
+
+
+@mesure('template.categories_dropdown')
+def categories_dropdown():
+    template = get_template('boutique/includes/categories_dropdown.html')
+    contexte = {'categories': arbre_en_memoire()}
+    return lambda: template.render(contexte)
+
+
+@mesure('template.categories_liste')
+def categories_liste():
+    template = get_template('boutique/includes/categories_liste.html')
+    contexte = {'categories': arbre_en_memoire()}
+    return lambda: template.render(contexte)
+
+
+# --- Exécution ---------------------------------------------------------------
+
+class RequeteSQLInterdite(RuntimeError):
+    pass
+
+
+def _interdire_sql(execute, sql, params, many, context):
+    raise RequeteSQLInterdite(f'Requête SQL pendant une micro-mesure : {sql[:200]}')
+
+
+def chronometrer(fonction, repetitions=REPETITIONS):
+    """Durées d'un appel (secondes) : nombre de boucles calibré par timeit, `repetitions` séries"""
+    timer = timeit.Timer(fonction)
+    boucles, _ = timer.autorange()
+    return boucles, [duree / boucles for duree in timer.repeat(repetitions, boucles)]
+
+
+def executer(noms=None, repetitions=REPETITIONS, afficher=print):
+    """
+    Exécute les mesures (toutes, ou celles dont le nom commence par un des
+    préfixes de `noms`) et retourne {nom: statistiques en microsecondes}.
+    La valeur comparée est la durée minimale par élément (une carte, un
+    produit...) : les séries plus lentes mesurent surtout le bruit de la machine.
+    """
+    resultats = {}
+    with _sans_sql():
+        for nom, (fabrique, elements) in _mesures.items():
+            if noms and not any(nom.startswith(prefixe) for prefixe in noms):
+                continue
+            boucles, durees = chronometrer(fabrique(), repetitions)
+            resultats[nom] = {
+                'elements': elements,
+                'boucles': boucles,
+                'min_us': round(min(durees) * 1e6, 3),
+                'median_us': round(statistics.median(durees) * 1e6, 3),
+                'max_us': round(max(durees) * 1e6, 3),
+                'par_element_us': round(min(durees) * 1e6 / elements, 3),
+            }
+            afficher(f"{nom:<36}{resultats[nom]['par_element_us']:>12.3f} µs/élément")
+    return resultats
+
+
+class _sans_sql:
+    """Toute requête SQL lève RequeteSQLInterdite : les mesures portent sur des objets en mémoire"""
+
+    def __enter__(self):
+        self.contextes = [connexion.execute_wrapper(_interdire_sql) for connexion in connections.all()]
+        for contexte in self.contextes:
+            contexte.__enter__()
+
+    def __exit__(self, *exc_info):
+        for contexte in reversed(self.contextes):
+            contexte.__exit__(*exc_info)
@@ -0,0 +1,103 @@
+"""Catalogue de test pour les mesures de charge : N produits générés en masse"""
+import random
+import time
+
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from boutique.cache import invalider_catalogue
+from boutique.models import Categorie, Marque, Produit
+from boutique.notes import CHAMPS_HISTOGRAMME, NOTES, calculer_moyenne
+
+from .vocabulaire import COULEURS, MATERIAUX, QUALIFICATIFS, TYPES
+
+# Les produits générés sont reconnaissables à leur référence
+PREFIXE_REFERENCE = 'BENCH-'
+
+TAILLE_LOT = 5000
+NOMBRE_MARQUES = 60
+
+
+def reference(numero):
+    return f'{PREFIXE_REFERENCE}{numero:07d}'
+
+
+def creer_marques():
+    Marque.objects.bulk_create(
+        [Marque(nom=f'Bench {i:02d}') for i in range(NOMBRE_MARQUES)], ignore_conflicts=True
+    )
+    return list(Marque.objects.filter(nom__startswith='Bench ').values_list('id', flat=True))
+
+
+def construire_produit(numero, hasard, categories, marques):
+    type_produit = hasard.choice(TYPES)
+    materiau = hasard.choice(MATERIAUX)
+    couleur = hasard.choice(COULEURS)
+    prix = hasard.randint(500, 50000) / 100
+    histogramme = {note: hasard.randint(0, 20) for note in NOTES}
+    produit = Produit(
+        nom=f'{type_produit} {materiau} {couleur} {hasard.choice(QUALIFICATIFS)} {numero}',
+        description=f'{type_produit} en {materiau}, coloris {couleur}. ' * 4,
+        prix=prix,
+        prix_promo=round(prix * 0.8, 2) if hasard.random() < 0.15 else None,
+        stock=hasard.choice([0, 2, 10, 50, 200]),
+        categorie_id=hasard.choice(categories),
+        marque_id=hasard.choice(marques),
+        reference=reference(numero),
+        sku=f'BSKU-{numero:07d}',
+        couleur=couleur,
+        materiau=materiau,
+        etat='neuf' if hasard.random() < 0.9 else 'reconditionne',
+        image_principale='produits/bench.jpg',
+        active=hasard.random() < 0.97,
+        featured=hasard.random() < 0.01,
+        nouveau=hasard.random() < 0.05,
+        nombre_avis=sum(histogramme.values()),
+        note_moyenne=calculer_moyenne(histogramme),
+    )
+    for champ, note in zip(CHAMPS_HISTOGRAMME, NOTES):
+        setattr(produit, champ, histogramme[note])
+    return produit
+
+
+def peupler(nombre, taille_lot=TAILLE_LOT, graine=0, afficher=print):
+    """
+    Complète le catalogue jusqu'à `nombre` produits générés (références BENCH-*).
+
+    Idempotent : une nouvelle exécution avec un nombre plus grand ajoute les
+    produits manquants. L'arbre de catégories vient de create_categories ;
+    les notes sont écrites directement dans les agrégats (histogramme) sans
+    créer d'avis. Les statistiques PostgreSQL sont mises à jour à la fin
+    (les comptages estimés en dépendent, voir boutique/comptage.py).
+    """
+    if not Categorie.objects.filter(niveau=3).exists():
+        call_command('create_categories')
+    categories = list(Categorie.objects.filter(niveau=3, active=True).values_list('id', flat=True))
+    marques = creer_marques()
+
+    existants = Produit.objects.filter(reference__startswith=PREFIXE_REFERENCE).count()
+    debut = time.perf_counter()
+    for lot in range(existants, nombre, taille_lot):
+        fin = min(lot + taille_lot, nombre)
+        # Graine par lot : le même catalogue quelle que soit la reprise
+        hasard = random.Random(f'{graine}-{lot}')
+        with transaction.atomic():
+            Produit.objects.bulk_create(
+                [construire_produit(numero, hasard, categories, marques) for numero in range(lot, fin)],
+                ignore_conflicts=True,
+            )
+        afficher(f'{fin}/{nombre} produits ({time.perf_counter() - debut:.0f} s)')
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE boutique_produit')
+    invalider_catalogue()
+    return max(nombre - existants, 0)
+
+
+def supprimer():
+    """Retire les produits et marques générés"""
+    supprimes, _ = Produit.objects.filter(reference__startswith=PREFIXE_REFERENCE).delete()
+    Marque.objects.filter(nom__startswith='Bench ').delete()
+    invalider_catalogue()
+    return supprimes
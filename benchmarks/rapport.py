@@ -0,0 +1,178 @@
+"""Statistiques des mesures de charge et micro-mesures, rapports JSON et comparaison entre deux exécutions"""
+import json
+import math
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from .charge import RACINE_PROJET
+
+PERCENTILES = (50, 95, 99)
+
+# Écart relatif à partir duquel la comparaison signale une régression
+SEUIL_REGRESSION = 0.10
+
+
+def percentile(valeurs_triees, rang):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not valeurs_triees:
+        return None
+    indice = max(math.ceil(rang / 100 * len(valeurs_triees)) - 1, 0)
+    return valeurs_triees[indice]
+
+
+def resumer(mesures, duree):
+    """Statistiques d'une liste de (durée en secondes, statut HTTP ou None)"""
+    durees = sorted(duree_requete for duree_requete, _ in mesures)
+    erreurs = sum(1 for _, statut in mesures if statut is None or statut >= 400)
+    resume = {
+        'requetes': len(mesures),
+        'erreurs': erreurs,
+        'requetes_par_seconde': round(len(mesures) / duree, 2) if duree else None,
+        'moyenne_ms': round(sum(durees) / len(durees) * 1000, 2) if durees else None,
+    }
+    for rang in PERCENTILES:
+        valeur = percentile(durees, rang)
+        resume[f'p{rang}_ms'] = round(valeur * 1000, 2) if valeur is not None else None
+    resume['max_ms'] = round(durees[-1] * 1000, 2) if durees else None
+    return resume
+
+
+def get_commit():
+    """Commit courant (et modifications non commitées) pour comparer les exécutions"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE_PROJET,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        modifie = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RACINE_PROJET,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'modifie': None}
+    return {'commit': commit, 'modifie': modifie}
+
+
+def _entete():
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **get_commit(),
+        'machine': {'python': platform.python_version(), 'systeme': platform.platform(), 'cpu': os.cpu_count()},
+    }
+
+
+def construire_rapport(mesures, duree, parametres, catalogue):
+    toutes = [mesure for valeurs in mesures.values() for mesure in valeurs]
+    return {
+        'type': 'charge',
+        **_entete(),
+        'parametres': parametres,
+        'catalogue': catalogue,
+        'global': resumer(toutes, duree),
+        'etapes': {etape: resumer(valeurs, duree) for etape, valeurs in sorted(mesures.items())},
+    }
+
+
+def construire_rapport_micro(mesures, parametres):
+    return {'type': 'micro', **_entete(), 'parametres': parametres, 'mesures': mesures}
+
+
+def enregistrer(rapport, dossier):
+    """
+    Écrit le rapport sous <dossier>/<date>-<commit>-<produits>.json
+    (<date>-<commit>-micro.json pour les micro-mesures) et retourne son chemin
+    """
+    os.makedirs(dossier, exist_ok=True)
+    horodatage = datetime.fromisoformat(rapport['date']).strftime('%Y%m%d-%H%M%S')
+    commit = (rapport['commit'] or 'inconnu') + ('-modifie' if rapport['modifie'] else '')
+    suffixe = 'micro' if get_type(rapport) == 'micro' else rapport['catalogue']['produits']
+    chemin = os.path.join(dossier, f"{horodatage}-{commit}-{suffixe}.json")
+    with open(chemin, 'w', encoding='utf-8') as fichier:
+        json.dump(rapport, fichier, ensure_ascii=False, indent=2)
+    return chemin
+
+
+def charger(chemin):
+    with open(chemin, encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+def get_type(rapport):
+    # Les rapports antérieurs aux micro-mesures n'ont pas de type
+    return rapport.get('type', 'charge')
+
+
+def formater(rapport):
+    """Tableau texte d'un rapport"""
+    lignes = [
+        f"{rapport['commit']}{' (modifié)' if rapport['modifie'] else ''} — "
+        f"{rapport['catalogue']['produits']} produits, {rapport['parametres']['utilisateurs']} utilisateurs, "
+        f"{rapport['parametres']['duree']} s",
+        f"{'étape':<26}{'req.':>8}{'err.':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}",
+    ]
+    for etape, resume in [*rapport['etapes'].items(), ('TOTAL', rapport['global'])]:
+        lignes.append(
+            f"{etape:<26}{resume['requetes']:>8}{resume['erreurs']:>6}{resume['requetes_par_seconde']:>9}"
+            + ''.join(f"{_ms(resume[f'p{rang}_ms']):>9}" for rang in PERCENTILES)
+        )
+    return '\n'.join(lignes)
+
+
+def comparer(ancien, nouveau, seuil=SEUIL_REGRESSION):
+    """
+    Compare deux rapports étape par étape (débit et percentiles).
+
+    Retourne (tableau texte, régressions) ; une régression est une latence
+    plus élevée ou un débit plus faible de plus de `seuil` (10 % par défaut).
+    """
+    metriques = [f'p{rang}_ms' for rang in PERCENTILES] + ['requetes_par_seconde']
+    lignes = [
+        f"{ancien['commit']} -> {nouveau['commit']}",
+        f"{'étape':<26}" + ''.join(f'{metrique:>30}' for metrique in metriques),
+    ]
+    regressions = []
+    etapes = [etape for etape in nouveau['etapes'] if etape in ancien['etapes']]
+    for etape in [*etapes, 'TOTAL']:
+        avant = ancien['global'] if etape == 'TOTAL' else ancien['etapes'][etape]
+        apres = nouveau['global'] if etape == 'TOTAL' else nouveau['etapes'][etape]
+        cellules = []
+        for metrique in metriques:
+            if not avant[metrique] or apres[metrique] is None:
+                cellules.append(f'{"-":>30}')
+                continue
+            ecart = (apres[metrique] - avant[metrique]) / avant[metrique]
+            # Le débit baisse quand ça se dégrade, les latences augmentent
+            degradation = -ecart if metrique == 'requetes_par_seconde' else ecart
+            if degradation > seuil:
+                regressions.append((etape, metrique, avant[metrique], apres[metrique]))
+            cellules.append(f"{f'{avant[metrique]} -> {apres[metrique]} ({ecart:+.0%})':>30}")
+        lignes.append(f'{etape:<26}' + ''.join(cellules))
+    return '\n'.join(lignes), regressions
+
+
+def comparer_micro(ancien, nouveau, seuil=SEUIL_REGRESSION):
+    """
+    Compare deux rapports de micro-mesures sur la durée minimale par élément.
+
+    Retourne (tableau texte, régressions) comme comparer().
+    """
+    lignes = [
+        f"{ancien['commit']} -> {nouveau['commit']}",
+        f"{'mesure':<36}{'µs/élément':>30}",
+    ]
+    regressions = []
+    for nom, mesure in nouveau['mesures'].items():
+        if nom not in ancien['mesures']:
+            continue
+        avant, apres = ancien['mesures'][nom]['par_element_us'], mesure['par_element_us']
+        ecart = (apres - avant) / avant
+        if ecart > seuil:
+            regressions.append((nom, 'par_element_us', avant, apres))
+        lignes.append(f"{nom:<36}{f'{avant} -> {apres} ({ecart:+.0%})':>30}")
+    return '\n'.join(lignes), regressions
+
+
+def _ms(valeur):
+    return '-' if valeur is None else f'{valeur:.1f}'
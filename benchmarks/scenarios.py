@@ -0,0 +1,110 @@
+"""
+Parcours des utilisateurs simulés.
+
+Chaque scénario enchaîne une ou plusieurs requêtes HTTP avec la session
+(cookies) de l'utilisateur ; chaque requête est mesurée sous le nom de son
+étape (accueil, liste_produits, panier_ajouter...).
+"""
+import re
+from dataclasses import dataclass, field
+
+from .vocabulaire import TERMES_RECHERCHE
+
+TRIS = ['', 'nom', '-nom', 'prix', '-prix', '-date_creation', '-note_moyenne']
+
+_RE_CURSEUR_SUIVANT = re.compile(r'href="\?([^"]*curseur=[^"]+)">\s*Suivant')
+
+
+@dataclass
+class Contexte:
+    """Identifiants connus du catalogue, tirés au sort par les scénarios"""
+    produits: list
+    categories: list
+    marques: list
+    termes: list = field(default_factory=lambda: list(TERMES_RECHERCHE))
+
+
+def accueil(utilisateur):
+    utilisateur.get('accueil', '/')
+
+
+def liste_produits(utilisateur):
+    hasard, contexte = utilisateur.hasard, utilisateur.contexte
+    parametres = {}
+    if hasard.random() < 0.6:
+        parametres['categorie'] = hasard.choice(contexte.categories)
+    if hasard.random() < 0.3:
+        parametres['marque'] = hasard.choice(contexte.marques)
+    if hasard.random() < 0.3:
+        parametres['prix_min'], parametres['prix_max'] = sorted(hasard.sample(range(5, 500, 5), 2))
+    if hasard.random() < 0.2:
+        parametres['en_stock'] = 1
+    if tri := hasard.choice(TRIS):
+        parametres['tri'] = tri
+    response = utilisateur.get('liste_produits', '/produits/', params=parametres)
+
+    # Une fois sur trois, l'utilisateur parcourt les pages suivantes
+    pages = hasard.choice([0, 0, 1, 3]) if response is not None else 0
+    for _ in range(pages):
+        suivant = _RE_CURSEUR_SUIVANT.search(response.text)
+        if not suivant:
+            break
+        response = utilisateur.get('liste_produits_suivante', '/produits/?' + suivant.group(1).replace('&amp;', '&'))
+        if response is None:
+            break
+
+
+def recherche(utilisateur):
+    utilisateur.get('recherche', '/recherche/', params={'q': utilisateur.hasard.choice(utilisateur.contexte.termes)})
+
+
+def suggestions(utilisateur):
+    terme = utilisateur.hasard.choice(utilisateur.contexte.termes)
+    # Frappe progressive dans la barre de recherche
+    for longueur in range(3, min(len(terme), 6) + 1):
+        utilisateur.get('suggestions', '/api/suggestions/', params={'q': terme[:longueur]})
+
+
+def recherche_avancee(utilisateur):
+    hasard, contexte = utilisateur.hasard, utilisateur.contexte
+    parametres = {'q': hasard.choice(contexte.termes)}
+    if hasard.random() < 0.5:
+        parametres['categorie'] = hasard.choice(contexte.categories)
+    if hasard.random() < 0.3:
+        parametres['note_min'] = hasard.choice([3, 4])
+    if hasard.random() < 0.3:
+        parametres['tri'] = hasard.choice(['prix_asc', 'prix_desc', 'nouveau', 'note'])
+    utilisateur.get('recherche_avancee', '/recherche-avancee/', params=parametres)
+
+
+def detail_produit(utilisateur):
+    produit_id = utilisateur.hasard.choice(utilisateur.contexte.produits)
+    utilisateur.get('detail_produit', f'/produit/{produit_id}/')
+
+
+def panier(utilisateur):
+    """Ajouts au panier depuis les fiches produit, modification puis consultation"""
+    hasard, contexte = utilisateur.hasard, utilisateur.contexte
+    produits = hasard.sample(contexte.produits, hasard.randint(1, 3))
+    for produit_id in produits:
+        utilisateur.get('detail_produit', f'/produit/{produit_id}/')
+        utilisateur.post('panier_ajouter', f'/panier/ajouter/{produit_id}/')
+        utilisateur.get('panier_count', '/panier/count/')
+    utilisateur.post('panier_modifier', f'/panier/modifier/{produits[0]}/', json={'quantite': hasard.randint(1, 3)})
+    utilisateur.get('voir_panier', '/panier/')
+    if hasard.random() < 0.3:
+        utilisateur.post('panier_supprimer', f'/panier/supprimer/{produits[-1]}/')
+    if hasard.random() < 0.2:
+        utilisateur.post('panier_vider', '/panier/vider/')
+
+
+# Scénario -> poids relatif dans le mélange de trafic
+SCENARIOS = {
+    accueil: 15,
+    liste_produits: 30,
+    recherche: 10,
+    suggestions: 5,
+    recherche_avancee: 5,
+    detail_produit: 25,
+    panier: 10,
+}
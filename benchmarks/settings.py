@@ -0,0 +1,7 @@
+"""Réglages du serveur local de mesure : ceux du projet, sans le mode DEBUG"""
+from inartdeco.settings import *  # noqa: F401,F403
+
+# En DEBUG, Django garde chaque requête SQL en mémoire et sert les pages
+# d'erreur détaillées : les temps mesurés ne seraient pas représentatifs
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
@@ -0,0 +1,17 @@
+"""
+Vocabulaire des produits générés : des noms et descriptions qui donnent des
+recherches plein texte et trigrammes réalistes (des milliers de résultats
+par mot sur les gros catalogues).
+"""
+
+TYPES = [
+    'Poêle', 'Casserole', 'Cocotte', 'Couteau', 'Planche', 'Saladier', 'Assiette', 'Verre',
+    'Carafe', 'Théière', 'Bocal', 'Panier', 'Étagère', 'Lampe', 'Coussin', 'Plaid',
+    'Serviette', 'Drap', 'Housse', 'Miroir', 'Vase', 'Bougeoir', 'Tapis', 'Rideau',
+]
+MATERIAUX = ['inox', 'fonte', 'céramique', 'verre', 'bambou', 'bois', 'coton', 'lin', 'grès', 'acier']
+COULEURS = ['blanc', 'noir', 'gris', 'beige', 'bleu', 'vert', 'terracotta', 'doré']
+QUALIFICATIFS = ['classique', 'moderne', 'artisanal', 'premium', 'compact', 'empilable', 'antiadhésif']
+
+# Mots à rechercher pendant les mesures
+TERMES_RECHERCHE = [nom.lower() for nom in TYPES] + MATERIAUX + ['poele inox', 'verre bleu', 'lampe bois']
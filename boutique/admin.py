@@ -12,7 +12,8 @@ admin.site.index_title = "Gestion du site e-commerce"
 @admin.register(Categorie)
 class CategorieAdmin(admin.ModelAdmin):
     list_display = ('nom', 'parent', 'get_niveau', 'active')
-    list_filter = ('active', 'parent')
+    list_filter = ('active', 'niveau', 'parent')
+    list_select_related = ('parent',)
     search_fields = ('nom', 'description')
     list_editable = ('active',)
     
@@ -95,9 +96,9 @@ class ProfilClientAdmin(admin.ModelAdmin):
 @admin.register(Commande)
 class CommandeAdmin(admin.ModelAdmin):
     list_display = ('numero_commande', 'client', 'statut', 'total', 'date_commande')
-    list_filter = ('statut', 'date_commande')
-    search_fields = ('numero_commande', 'client__user__username', 'client__user__email')
-    readonly_fields = ('numero_commande', 'total', 'date_commande')
+    list_filter = ('statut', 'date_commande', 'mode_livraison')
+    search_fields = ('numero_commande', 'client__user__username', 'client__user__email', 'code_promo__code')
+    readonly_fields = ('numero_commande', 'total', 'reduction', 'code_promo', 'date_commande')
     date_hierarchy = 'date_commande'
 
 @admin.register(CodePromo)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+CACHE_CLE_VERSION_CATALOGUE = 'catalogue:version'
+
+# Durée pendant laquelle une valeur périmée peut encore être servie
+DELAI_GRACE = 300
+
+# Durée de vie des verrous de recalcul et attente maximale d'un worker sans verrou
+VERROU_TTL = 30
+ATTENTE_MAX = 5.0
+ATTENTE_PAS = 0.05
+
+
+def get_version_catalogue():
+    """Version courante du catalogue, à inclure dans les clés de cache"""
+    version = cache.get(CACHE_CLE_VERSION_CATALOGUE)
+    if version is None:
+        # Horodatage : une version perdue (redémarrage, éviction) n'est jamais réutilisée
+        cache.add(CACHE_CLE_VERSION_CATALOGUE, time.time_ns(), None)
+        version = cache.get(CACHE_CLE_VERSION_CATALOGUE, 0)
+    return version
+
+
+def invalider_catalogue():
+    """Passe à une nouvelle version : toutes les clés versionnées deviennent obsolètes"""
+    try:
+        cache.incr(CACHE_CLE_VERSION_CATALOGUE)
+    except ValueError:
+        cache.set(CACHE_CLE_VERSION_CATALOGUE, time.time_ns(), None)
+
+
+def cle_filtres(espace, filtres):
+    """Clé de cache versionnée pour un jeu de filtres, indépendante de l'ordre et de la casse"""
+    normalises = sorted(
+        (cle, str(valeur).strip().lower())
+        for cle, valeur in filtres.items()
+        if valeur not in (None, '')
+    )
+    empreinte = hashlib.md5(json.dumps(normalises).encode()).hexdigest()
+    return f'{espace}:{get_version_catalogue()}:{empreinte}'
+
+
+def get_or_set_protege(cle, calculer, ttl):
+    """
+    Lecture en cache protégée contre l'effet de meute (cache stampede).
+
+    La valeur est stockée avec sa date d'expiration « douce » et conservée
+    un peu plus longtemps dans le cache. À l'expiration, un seul worker
+    (celui qui obtient le verrou via cache.add) recalcule pendant que les
+    autres continuent de servir l'ancienne valeur. Si la clé est absente,
+    les autres workers attendent brièvement le résultat du premier.
+    """
+    entree = cache.get(cle)
+    if entree is not None:
+        valeur, expire_a = entree
+        if time.time() < expire_a or not _prendre_verrou(cle):
+            return valeur
+        return _recalculer(cle, calculer, ttl)
+
+    if _prendre_verrou(cle):
+        return _recalculer(cle, calculer, ttl)
+
+    fin = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < fin:
+        time.sleep(ATTENTE_PAS)
+        entree = cache.get(cle)
+        if entree is not None:
+            return entree[0]
+    # Le détenteur du verrou est trop lent ou a échoué : calculer sans mettre en cache
+    return calculer()
+
+
+def _prendre_verrou(cle):
+    return cache.add(f'{cle}:verrou', 1, VERROU_TTL)
+
+
+def _recalculer(cle, calculer, ttl):
+    try:
+        valeur = calculer()
+        cache.set(cle, (valeur, time.time() + ttl), ttl + DELAI_GRACE)
+        return valeur
+    finally:
+        cache.delete(f'{cle}:verrou')
@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .models import Categorie
+
+CACHE_CLE_ARBRE = 'categories:arbre'
+CACHE_CLE_MEGA_MENU = 'categories:mega_menu'
+CACHE_CLE_DROPDOWN = 'categories:dropdown'
+CACHE_TTL = 60 * 60 * 24  # invalidé par signal à chaque modification
+
+
+def construire_arbre():
+    """Charge toutes les catégories actives en une requête et assemble l'arbre en mémoire"""
+    url_produits = reverse('boutique:liste_produits')
+    categories = Categorie.objects.filter(active=True).order_by(
+        'niveau', 'ordre', 'nom'
+    ).values('id', 'nom', 'slug', 'icone', 'parent_id')
+
+    noeuds = {}
+    racines = []
+    # Tri par niveau : un parent est toujours rencontré avant ses enfants
+    for categorie in categories:
+        noeud = {
+            'id': categorie['id'],
+            'nom': categorie['nom'],
+            'slug': categorie['slug'],
+            'icone': categorie['icone'],
+            'url': f"{url_produits}?categorie={categorie['id']}",
+            'children': [],
+        }
+        noeuds[categorie['id']] = noeud
+        if categorie['parent_id'] is None:
+            racines.append(noeud)
+        elif categorie['parent_id'] in noeuds:
+            noeuds[categorie['parent_id']]['children'].append(noeud)
+        # sinon : parent inactif, la branche entière est masquée
+    return racines
+
+
+def get_arbre_categories():
+    """Arbre des catégories actives (liste de dicts sérialisable en JSON)"""
+    arbre = cache.get(CACHE_CLE_ARBRE)
+    if arbre is None:
+        arbre = construire_arbre()
+        cache.set(CACHE_CLE_ARBRE, arbre, CACHE_TTL)
+    return arbre
+
+
+def get_mega_menu_html():
+    """Rendu HTML du mega menu (trois niveaux)"""
+    html = cache.get(CACHE_CLE_MEGA_MENU)
+    if html is None:
+        html = render_to_string('boutique/includes/categories_dropdown.html', {
+            'categories': get_arbre_categories()
+        })
+        cache.set(CACHE_CLE_MEGA_MENU, html, CACHE_TTL)
+    return html
+
+
+def get_dropdown_html():
+    """Rendu HTML de la liste simple de la navbar (deux niveaux)"""
+    html = cache.get(CACHE_CLE_DROPDOWN)
+    if html is None:
+        html = render_to_string('boutique/includes/categories_liste.html', {
+            'categories': get_arbre_categories()
+        })
+        cache.set(CACHE_CLE_DROPDOWN, html, CACHE_TTL)
+    return html
+
+
+def invalider_cache_categories():
+    """Supprime toutes les versions en cache de l'arbre des catégories"""
+    cache.delete_many([CACHE_CLE_ARBRE, CACHE_CLE_MEGA_MENU, CACHE_CLE_DROPDOWN])
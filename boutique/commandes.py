@@ -0,0 +1,133 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import IntegrityError, transaction
+
+from .models import Commande, LigneCommande, Panier
+from .promos import utiliser_code_promo
+from .stock import convertir_en_vente
+
+# Livraison standard, offerte à partir de SEUIL_LIVRAISON_GRATUITE (TND)
+FRAIS_LIVRAISON_DEFAUT = Decimal('15.00')
+SEUIL_LIVRAISON_GRATUITE = Decimal('100.00')
+
+CENTIME = Decimal('0.01')
+
+# Tentatives de création d'une commande dont le numéro est déjà pris
+ESSAIS_NUMERO = 3
+
+
+class CommandeInvalide(Exception):
+    """Le panier ne peut pas être transformé en commande (panier vide, code refusé...)"""
+
+
+def calculer_frais_livraison(sous_total, mode_livraison=None):
+    if mode_livraison is not None:
+        return mode_livraison.prix
+    return FRAIS_LIVRAISON_DEFAUT if sous_total < SEUIL_LIVRAISON_GRATUITE else Decimal('0.00')
+
+
+def calculer_reduction(code_promo, sous_total):
+    """Montant de la réduction d'un code promo, plafonné au sous-total"""
+    if code_promo.type_reduction == 'pourcentage':
+        reduction = (sous_total * code_promo.valeur / 100).quantize(CENTIME, rounding=ROUND_HALF_UP)
+    else:
+        reduction = code_promo.valeur
+    return min(reduction, sous_total)
+
+
+def passer_commande(client_id, adresse_facturation, adresse_livraison,
+                    mode_livraison=None, code_promo=None, notes_client=''):
+    """
+    Transforme le panier d'un client (ProfilClient) en commande, en une transaction.
+
+    Les lignes du panier sont verrouillées puis lues avec leurs produits en
+    une requête ; les montants sont calculés en Decimal en un seul passage.
+    Le stock est décrémenté par un seul UPDATE ... CASE (les réservations
+    du panier deviennent des ventes) et les lignes de commande sont
+    insérées par bulk_create. Le code promo est vérifié d'abord sans
+    écriture ; son utilisation est comptée par un UPDATE conditionnel en
+    dernière instruction : le verrou de la ligne du code, partagé par toutes
+    les commandes qui l'utilisent, n'est tenu que jusqu'au commit qui suit.
+    Tout est annulé si une étape échoue.
+
+    Lève CommandeInvalide ou StockInsuffisant.
+    """
+    with transaction.atomic():
+        lignes = list(
+            Panier.objects.select_for_update(of=('self',))
+            .filter(client_id=client_id)
+            .select_related('produit')
+            .order_by('produit_id')
+        )
+        if not lignes:
+            raise CommandeInvalide("Votre panier est vide")
+
+        sous_total = Decimal('0.00')
+        for ligne in lignes:
+            ligne.prix_unitaire = ligne.produit.prix_final
+            sous_total += ligne.prix_unitaire * ligne.quantite
+
+        reduction = Decimal('0.00')
+        if code_promo is not None:
+            if sous_total < code_promo.montant_minimum:
+                raise CommandeInvalide(
+                    f"Le code {code_promo.code} nécessite {code_promo.montant_minimum} TND d'achat minimum"
+                )
+            if not code_promo.est_valide:
+                raise CommandeInvalide(f"Le code {code_promo.code} n'est plus valide")
+            reduction = calculer_reduction(code_promo, sous_total)
+
+        frais_livraison = calculer_frais_livraison(sous_total, mode_livraison)
+
+        convertir_en_vente({
+            ligne.produit_id: (ligne.quantite, ligne.quantite_reservee) for ligne in lignes
+        })
+
+        commande = _creer_commande(
+            client_id=client_id,
+            sous_total=sous_total,
+            frais_livraison=frais_livraison,
+            reduction=reduction,
+            total=sous_total + frais_livraison - reduction,
+            mode_livraison=mode_livraison,
+            code_promo=code_promo,
+            adresse_facturation=adresse_facturation,
+            adresse_livraison=adresse_livraison,
+            notes_client=notes_client,
+        )
+        LigneCommande.objects.bulk_create([
+            LigneCommande(
+                commande=commande,
+                produit_id=ligne.produit_id,
+                quantite=ligne.quantite,
+                prix_unitaire=ligne.prix_unitaire,
+            )
+            for ligne in lignes
+        ])
+
+        # Le stock réservé a été converti en vente : supprimer sans libérer
+        Panier.objects.filter(id__in=[ligne.id for ligne in lignes]).delete()
+
+        # Dernière instruction avant le commit (voir la docstring)
+        if code_promo is not None and not utiliser_code_promo(code_promo):
+            raise CommandeInvalide(f"Le code {code_promo.code} n'est plus valide")
+
+    return commande
+
+
+def _creer_commande(**valeurs):
+    """
+    Insère la commande ; si son numéro vient d'être pris par une commande
+    concurrente (numérotation sans séquence, voir boutique/numerotation.py),
+    un nouveau numéro est tiré.
+    """
+    commande = Commande(**valeurs)
+    for essai in range(ESSAIS_NUMERO, 0, -1):
+        try:
+            with transaction.atomic():
+                commande.save(force_insert=True)
+            return commande
+        except IntegrityError:
+            if essai == 1 or not Commande.objects.filter(numero_commande=commande.numero_commande).exists():
+                raise
+            commande.numero_commande = ''
@@ -0,0 +1,92 @@
+from functools import total_ordering
+import json
+import numbers
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .cache import cle_filtres
+
+COMPTAGE_CACHE_TTL = 60 * 5
+
+
+@total_ordering
+class Comptage:
+    """Nombre de résultats, exact ou estimé (affiché « 1 000+ » au-delà du seuil)"""
+
+    def __init__(self, valeur, approximatif=False, seuil=None):
+        self.valeur = valeur
+        self.approximatif = approximatif
+        self.seuil = seuil
+
+    def __int__(self):
+        return self.valeur
+
+    def __float__(self):
+        return float(self.valeur)
+
+    def __bool__(self):
+        return self.valeur > 0
+
+    def __eq__(self, autre):
+        if not isinstance(autre, (Comptage, numbers.Integral)):
+            return NotImplemented
+        return self.valeur == int(autre)
+
+    def __lt__(self, autre):
+        if not isinstance(autre, (Comptage, numbers.Integral)):
+            return NotImplemented
+        return self.valeur < int(autre)
+
+    def __hash__(self):
+        return hash(self.valeur)
+
+    def __str__(self):
+        if self.approximatif:
+            return f"{self.seuil:,}+".replace(',', ' ')
+        return str(self.valeur)
+
+
+def get_seuil_comptage():
+    return getattr(settings, 'COMPTAGE_SEUIL_EXACT', 1000)
+
+
+def estimer_lignes(queryset):
+    """Estimation du planificateur PostgreSQL (EXPLAIN), sans parcourir les lignes"""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def compter(queryset, filtres, espace='produits'):
+    """
+    Compte les résultats d'un jeu de filtres, une seule fois et avec cache.
+
+    Le résultat est mis en cache par jeu de filtres normalisé et par version
+    du catalogue. Si le planificateur estime plus de COMPTAGE_SEUIL_EXACT
+    lignes, l'estimation est utilisée au lieu d'un COUNT(*) exact.
+    """
+    cle = cle_filtres(f'comptage:{espace}', filtres)
+
+    comptage = cache.get(cle)
+    if comptage is None:
+        comptage = _compter(queryset)
+        cache.set(cle, comptage, COMPTAGE_CACHE_TTL)
+    return comptage
+
+
+def _compter(queryset):
+    if queryset.query.is_empty():
+        return Comptage(0)
+    seuil = get_seuil_comptage()
+    if connections[queryset.db].vendor == 'postgresql':
+        estimation = estimer_lignes(queryset.order_by())
+        if estimation > seuil:
+            return Comptage(estimation, approximatif=True, seuil=seuil)
+    return Comptage(queryset.count())
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DecimalField, F
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Categorie, Produit
+
+# Lignes lues par aller-retour avec le curseur côté serveur
+TAILLE_LOT_EXPORT = 2000
+
+# Taille des morceaux envoyés au client
+TAILLE_MORCEAU = 64 * 1024
+
+TYPES_CONTENU = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+FORMATS_EXPORT = list(TYPES_CONTENU)
+
+# Colonne exportée -> expression lue en base (chemin de catégorie ajouté ensuite)
+COLONNES = {
+    'id': F('id'),
+    'reference': F('reference'),
+    'sku': F('sku'),
+    'nom': F('nom'),
+    'categorie': F('categorie_id'),
+    'marque': F('marque__nom'),
+    'fournisseur': F('fournisseur__nom'),
+    'prix': F('prix'),
+    'prix_promo': F('prix_promo'),
+    'prix_final': Coalesce('prix_promo', 'prix', output_field=DecimalField(max_digits=10, decimal_places=2)),
+    'stock': F('stock'),
+    'stock_disponible': Greatest(F('stock') - F('stock_reserve'), 0),
+    'etat': F('etat'),
+    'active': F('active'),
+    'note_moyenne': F('note_moyenne'),
+    'nombre_avis': F('nombre_avis'),
+    'date_modification': F('date_modification'),
+}
+
+
+def get_chemins_categories():
+    """{id: "Maison > Cuisine > Ustensiles"} pour toutes les catégories, en une requête"""
+    categories = {
+        categorie['id']: categorie
+        for categorie in Categorie.objects.values('id', 'nom', 'chemin')
+    }
+    return {
+        pk: ' > '.join(
+            categories[int(ancetre)]['nom']
+            for ancetre in categorie['chemin'].split('/') if ancetre and int(ancetre) in categories
+        ) or categorie['nom']
+        for pk, categorie in categories.items()
+    }
+
+
+def lignes_catalogue(actifs=False, taille_lot=TAILLE_LOT_EXPORT):
+    """
+    Produits du catalogue sous forme de dicts {colonne: valeur}, dans l'ordre des id.
+
+    Les lignes sont lues par .iterator() (curseur côté serveur sous
+    PostgreSQL) sans instancier de modèles : la mémoire utilisée ne dépend
+    pas de la taille du catalogue.
+    """
+    chemins = get_chemins_categories()
+    produits = Produit.objects.all()
+    if actifs:
+        produits = produits.filter(active=True)
+    lignes = produits.order_by('id').values(**{
+        f'export_{colonne}': expression for colonne, expression in COLONNES.items()
+    })
+    for ligne in lignes.iterator(chunk_size=taille_lot):
+        ligne = {colonne: ligne[f'export_{colonne}'] for colonne in COLONNES}
+        ligne['categorie'] = chemins.get(ligne['categorie'], '')
+        yield ligne
+
+
+def exporter_csv(lignes):
+    tampon = io.StringIO()
+    # BOM : Excel ouvre alors le fichier en UTF-8
+    tampon.write('\ufeff')
+    writer = csv.DictWriter(tampon, fieldnames=list(COLONNES))
+    writer.writeheader()
+    for ligne in lignes:
+        writer.writerow(ligne)
+        if tampon.tell() >= TAILLE_MORCEAU:
+            yield tampon.getvalue().encode()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue().encode()
+
+
+def exporter_jsonl(lignes):
+    morceau = []
+    taille = 0
+    for ligne in lignes:
+        texte = json.dumps(ligne, ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+        morceau.append(texte)
+        taille += len(texte)
+        if taille >= TAILLE_MORCEAU:
+            yield ''.join(morceau).encode()
+            morceau, taille = [], 0
+    yield ''.join(morceau).encode()
+
+
+def exporter_xlsx(lignes):
+    """
+    Classeur openpyxl en écriture seule : les lignes sont écrites au fil de
+    l'eau dans un fichier temporaire, puis le .xlsx est renvoyé par morceaux.
+
+    Limite : contrairement au CSV et au JSONL, rien n'est envoyé avant la fin
+    de l'écriture. Un .xlsx est une archive ZIP dont l'index vient en dernier
+    et qu'openpyxl écrit dans un fichier positionnable : le délai avant le
+    premier octet et l'espace disque temporaire croissent avec le catalogue.
+    La mémoire reste constante. Pour un gros catalogue, préférer le CSV.
+    """
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet('Produits')
+    feuille.append(list(COLONNES))
+    for ligne in lignes:
+        # Excel ne connaît pas les fuseaux horaires : dates en heure locale
+        feuille.append([
+            timezone.localtime(valeur).replace(tzinfo=None) if isinstance(valeur, datetime) else valeur
+            for valeur in ligne.values()
+        ])
+    with tempfile.TemporaryFile() as fichier:
+        classeur.save(fichier)
+        fichier.seek(0)
+        while morceau := fichier.read(TAILLE_MORCEAU):
+            yield morceau
+
+
+EXPORTEURS = {
+    'csv': exporter_csv,
+    'jsonl': exporter_jsonl,
+    'xlsx': exporter_xlsx,
+}
+
+
+def exporter_catalogue(format_export, actifs=False):
+    """Itérateur d'octets du catalogue au format demandé ('csv', 'jsonl' ou 'xlsx')"""
+    return EXPORTEURS[format_export](lignes_catalogue(actifs=actifs))
@@ -0,0 +1,159 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import BooleanField, Case, IntegerField, Value, When
+from django.db.models.functions import StrIndex, Substr
+
+from .cache import cle_filtres
+
+# Tranches de prix (TND) : (min inclus, max exclu) ; None = pas de borne
+TRANCHES_PRIX = [(0, 25), (25, 50), (50, 100), (100, 250), (250, 500), (500, None)]
+
+FACETTES_CACHE_TTL = 60 * 10
+
+# Dimensions sélectionnables : le décompte d'une dimension ignore sa propre
+# sélection (facettes disjonctives), pour pouvoir changer de marque, d'état...
+DIMENSIONS_SELECTION = ('marque_id', 'etat', 'stock_dispo', 'promo')
+DIMENSIONS = ('racine', 'tranche') + DIMENSIONS_SELECTION
+
+
+def calculer_facettes(base, filtres_base, selection):
+    """
+    Décomptes par catégorie racine, marque, tranche de prix, état, stock et promotion.
+
+    `base` est le queryset filtré par les critères non facettés (texte,
+    catégorie, prix) ; `selection` donne la valeur choisie pour chaque
+    dimension de DIMENSIONS_SELECTION (None si aucune). Chaque facette est
+    un GROUP BY sur sa seule dimension, filtré par la sélection des autres :
+    une requête pour toutes les facettes (GROUPING SETS sur PostgreSQL,
+    UNION ALL ailleurs), dont le résultat ne dépend que du nombre de
+    valeurs de chaque dimension. Mis en cache par filtres et sélection.
+    """
+    selection = {dim: valeur for dim, valeur in selection.items() if valeur is not None}
+    cle = cle_filtres('facettes', {**filtres_base, **{f'selection_{dim}': valeur for dim, valeur in selection.items()}})
+    decomptes = cache.get(cle)
+    if decomptes is None:
+        decomptes = _compter_facettes(base, selection)
+        cache.set(cle, decomptes, FACETTES_CACHE_TTL)
+
+    return {
+        'categories': dict(decomptes['racine']),
+        'marques': dict(decomptes['marque_id']),
+        'etats': dict(decomptes['etat']),
+        'tranches_prix': [
+            {'min': minimum, 'max': maximum, 'count': decomptes['tranche'].get(index, 0)}
+            for index, (minimum, maximum) in enumerate(TRANCHES_PRIX)
+        ],
+        'en_stock': decomptes['stock_dispo'].get(True, 0),
+        'promotion': decomptes['promo'].get(True, 0),
+    }
+
+
+def _compter_facettes(base, selection):
+    decomptes = {dim: Counter() for dim in DIMENSIONS}
+    tranches = [
+        When(**_bornes_prix(minimum, maximum), then=Value(index))
+        for index, (minimum, maximum) in enumerate(TRANCHES_PRIX)
+    ]
+    lignes = base.order_by().annotate(
+        # Premier segment du chemin matérialisé (« 12/34/ ») = id de la catégorie racine
+        racine=Substr('categorie__chemin', 1, StrIndex('categorie__chemin', Value('/')) - 1),
+        tranche=Case(*tranches, output_field=IntegerField()),
+        stock_dispo=Case(When(stock__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        promo=Case(When(prix_promo__isnull=False, then=Value(True)), default=Value(False), output_field=BooleanField()),
+    ).values(*DIMENSIONS)
+    try:
+        sql_base, params_base = lignes.query.sql_with_params()
+    except EmptyResultSet:
+        return decomptes
+
+    connexion = connections[base.db]
+    colonnes = {dim: connexion.ops.quote_name(dim) for dim in DIMENSIONS}
+
+    def condition(dimension):
+        # Facettes disjonctives : le décompte d'une dimension ignore sa propre sélection
+        autres = [dim for dim in selection if dim != dimension]
+        return ' AND '.join(f'{colonnes[dim]} = %s' for dim in autres) or '1 = 1', [selection[dim] for dim in autres]
+
+    if connexion.vendor == 'postgresql':
+        # GROUPING(...) donne un bit par dimension, à 1 si elle est agrégée :
+        # il identifie l'ensemble de regroupement (donc la facette) de la ligne
+        filtres, params_filtres = [], []
+        for dimension in DIMENSIONS:
+            sql_condition, params_condition = condition(dimension)
+            filtres.append(f'COUNT(*) FILTER (WHERE {sql_condition})')
+            params_filtres += params_condition
+        sql = (
+            f"SELECT {', '.join(colonnes.values())}, GROUPING({', '.join(colonnes.values())}), {', '.join(filtres)} "
+            f"FROM ({sql_base}) produits "
+            f"GROUP BY GROUPING SETS ({', '.join(f'({colonne})' for colonne in colonnes.values())})"
+        )
+        params = params_filtres + list(params_base)
+        tous = (1 << len(DIMENSIONS)) - 1
+        masques = {tous ^ (1 << (len(DIMENSIONS) - 1 - index)): index for index in range(len(DIMENSIONS))}
+        with connexion.cursor() as cursor:
+            cursor.execute(sql, params)
+            for ligne in cursor.fetchall():
+                index = masques[ligne[len(DIMENSIONS)]]
+                decomptes[DIMENSIONS[index]][ligne[index]] += ligne[len(DIMENSIONS) + 1 + index]
+    else:
+        requetes, params = [], list(params_base)
+        for dimension in DIMENSIONS:
+            sql_condition, params_condition = condition(dimension)
+            requetes.append(
+                f"SELECT %s, {colonnes[dimension]}, COUNT(*) FROM produits "
+                f"WHERE {sql_condition} GROUP BY {colonnes[dimension]}"
+            )
+            params += [dimension] + params_condition
+        sql = f"WITH produits AS ({sql_base}) " + ' UNION ALL '.join(requetes)
+        with connexion.cursor() as cursor:
+            cursor.execute(sql, params)
+            for dimension, valeur, nb in cursor.fetchall():
+                decomptes[dimension][valeur] += nb
+
+    # Conversions que l'ORM ferait : id de catégorie racine, booléens (0/1 sur SQLite)
+    decomptes['racine'] = Counter({int(racine): nb for racine, nb in decomptes['racine'].items() if racine and racine.isdigit()})
+    for dimension in ('stock_dispo', 'promo'):
+        decomptes[dimension] = Counter({bool(valeur): nb for valeur, nb in decomptes[dimension].items()})
+    # dict simples : mis en cache
+    return {dim: dict(compteur) for dim, compteur in decomptes.items()}
+
+
+def _bornes_prix(minimum, maximum):
+    bornes = {'prix__gte': minimum}
+    if maximum is not None:
+        bornes['prix__lt'] = maximum
+    return bornes
+
+
+def selection_depuis_requete(marque_id=None, etat=None, en_stock=None, promotion=None):
+    """Convertit les paramètres GET en sélection de facettes"""
+    return {
+        'marque_id': int(marque_id) if marque_id and marque_id.isdigit() else None,
+        'etat': etat or None,
+        'stock_dispo': True if en_stock else None,
+        'promo': True if promotion else None,
+    }
+
+
+def appliquer_decomptes(objets, decomptes):
+    """Ajoute l'attribut nb_produits à chaque catégorie/marque affichée"""
+    objets = list(objets)
+    for objet in objets:
+        objet.nb_produits = decomptes.get(objet.id, 0)
+    return objets
+
+
+def ajouter_liens_tranches(facettes, request):
+    """Ajoute à chaque tranche de prix la querystring qui la sélectionne"""
+    parametres = request.GET.copy()
+    for cle in ('prix_min', 'prix_max', 'page', 'curseur'):
+        parametres.pop(cle, None)
+    for tranche in facettes['tranches_prix']:
+        lien = parametres.copy()
+        lien['prix_min'] = tranche['min']
+        if tranche['max'] is not None:
+            lien['prix_max'] = tranche['max']
+        tranche['querystring'] = lien.urlencode()
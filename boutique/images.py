@@ -0,0 +1,172 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+import hashlib
+import logging
+import os
+import warnings
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .cache import invalider_catalogue
+
+logger = logging.getLogger(__name__)
+
+# Renditions générées pour chaque image : plus grand côté en pixels
+RENDITIONS = {
+    'miniature': 200,
+    'carte': 480,
+    'zoom': 1600,
+}
+
+# Formats produits pour chaque rendition, du plus léger au format de repli
+FORMATS = {
+    'avif': {'format': 'AVIF', 'type': 'image/avif', 'options': {'quality': 55}},
+    'webp': {'format': 'WEBP', 'type': 'image/webp', 'options': {'quality': 80, 'method': 6}},
+    'jpeg': {'format': 'JPEG', 'type': 'image/jpeg', 'options': {'quality': 85, 'optimize': True, 'progressive': True}},
+}
+
+DOSSIER_RENDITIONS = 'renditions'
+
+# Champ image de chaque modèle disposant d'un champ `renditions` (images
+# affichées par {% image_responsive %})
+CHAMPS_IMAGE = {
+    'Produit': 'image_principale',
+    'ImageProduit': 'image',
+    'Marque': 'logo',
+    'Categorie': 'image',
+}
+
+# Images figurant dans des pages mises en cache (cartes produits et
+# catégories de l'accueil) ; galeries et logos de marque ne sont affichés
+# que sur des pages calculées à chaque requête (fiche produit)
+MODELES_EN_CACHE = {'Produit', 'Categorie'}
+
+_executeur = None
+
+
+@lru_cache(maxsize=None)
+def formats_disponibles():
+    """Formats pris en charge par la version de Pillow installée (AVIF : Pillow >= 11.3)"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return [nom for nom in FORMATS if nom == 'jpeg' or features.check(nom)]
+
+
+def get_champ_image(instance):
+    return CHAMPS_IMAGE[type(instance).__name__]
+
+
+def renditions_a_jour(instance):
+    """Les renditions enregistrées correspondent-elles à l'image actuelle ?"""
+    image = getattr(instance, get_champ_image(instance))
+    return bool(image) and instance.renditions.get('source') == image.name
+
+
+def generer_renditions(image):
+    """
+    Génère toutes les renditions d'une image et retourne leur description.
+
+    Les fichiers sont nommés d'après l'empreinte SHA-1 du contenu source :
+    une même image n'est traitée qu'une fois, et les URL peuvent être mises
+    en cache indéfiniment par les navigateurs et le CDN.
+    """
+    image.open('rb')
+    try:
+        contenu = image.read()
+    finally:
+        image.close()
+    empreinte = hashlib.sha1(contenu).hexdigest()
+
+    source = Image.open(BytesIO(contenu))
+    source = ImageOps.exif_transpose(source)
+    if source.mode not in ('RGB', 'L'):
+        # JPEG ne gère pas la transparence : fond blanc
+        fond = Image.new('RGB', source.size, 'white')
+        fond.paste(source, mask=source.convert('RGBA').split()[-1])
+        source = fond
+
+    resultat = {'source': image.name}
+    for nom, taille in RENDITIONS.items():
+        rendition = source.copy()
+        rendition.thumbnail((taille, taille), Image.LANCZOS)
+        description = {'largeur': rendition.width, 'hauteur': rendition.height}
+        for extension in formats_disponibles():
+            chemin = f'{DOSSIER_RENDITIONS}/{empreinte[:2]}/{empreinte}-{nom}.{extension}'
+            if not default_storage.exists(chemin):
+                tampon = BytesIO()
+                rendition.convert('RGB').save(tampon, FORMATS[extension]['format'], **FORMATS[extension]['options'])
+                default_storage.save(chemin, ContentFile(tampon.getvalue()))
+            description[extension] = chemin
+        resultat[nom] = description
+    return resultat
+
+
+def traiter_instance(modele, pk, invalider=True):
+    """
+    Génère et enregistre les renditions d'un objet ; retourne True si elles ont changé.
+
+    Le cache du catalogue n'est invalidé que pour les images affichées dans
+    des pages en cache ; un traitement par lots passe invalider=False et
+    invalide une seule fois à la fin.
+    """
+    try:
+        instance = modele.objects.filter(pk=pk).first()
+        if instance is None or renditions_a_jour(instance):
+            return False
+        champ = get_champ_image(instance)
+        image = getattr(instance, champ)
+        if not image:
+            return False
+        renditions = generer_renditions(image)
+        # Ne pas écraser les renditions si l'image a encore changé entre-temps
+        modifie = modele.objects.filter(pk=pk, **{champ: image.name}).update(renditions=renditions) > 0
+        if modifie and invalider and modele.__name__ in MODELES_EN_CACHE:
+            invalider_catalogue()
+        return modifie
+    except Exception:
+        logger.exception("Échec de la génération des renditions de %s #%s", modele.__name__, pk)
+        return False
+
+
+def tache_renditions(modele, pk, invalider=True):
+    """traiter_instance() exécuté dans un thread du pool : ferme ses connexions à la fin"""
+    try:
+        return traiter_instance(modele, pk, invalider)
+    finally:
+        connections.close_all()
+
+
+def planifier_renditions(instance):
+    """
+    Programme la génération des renditions après le commit de la transaction.
+
+    Le travail est confié à un pool de threads en arrière-plan pour ne pas
+    ralentir l'enregistrement ; RENDITIONS_SYNCHRONES = True (tests, scripts)
+    le fait immédiatement. `manage.py generer_renditions` rattrape les oublis.
+    """
+    if renditions_a_jour(instance) or not getattr(instance, get_champ_image(instance)):
+        return
+    modele, pk = type(instance), instance.pk
+
+    def lancer():
+        if getattr(settings, 'RENDITIONS_SYNCHRONES', False):
+            traiter_instance(modele, pk)
+        else:
+            _get_executeur().submit(tache_renditions, modele, pk)
+
+    transaction.on_commit(lancer)
+
+
+def _get_executeur():
+    global _executeur
+    if _executeur is None:
+        _executeur = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'RENDITIONS_WORKERS', min(4, os.cpu_count() or 1)),
+            thread_name_prefix='renditions',
+        )
+    return _executeur
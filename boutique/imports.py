@@ -0,0 +1,331 @@
+import csv
+import os
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from openpyxl import load_workbook
+
+from .cache import invalider_catalogue
+from .models import Categorie, Fournisseur, Marque, Produit
+
+# Produits insérés ou mis à jour par requête
+TAILLE_LOT = 2000
+
+# Feuilles de template_produits_inartdeco.xlsx (voir generate_excel_template.py)
+FEUILLE_CATEGORIES = '1-Catégories'
+FEUILLE_MARQUES = '2-Marques'
+FEUILLE_FOURNISSEURS = '3-Fournisseurs'
+FEUILLE_PRODUITS = '4-Produits'
+
+# Colonne de la feuille produits -> champ de Produit
+COLONNES_PRODUIT = {
+    'nom': 'nom',
+    'description': 'description',
+    'prix': 'prix',
+    'prix_promo': 'prix_promo',
+    'stock': 'stock',
+    'seuil_stock': 'seuil_stock',
+    'reference': 'reference',
+    'sku': 'sku',
+    'code_barre': 'code_barre',
+    'poids': 'poids',
+    'dimensions': 'dimensions',
+    'couleur': 'couleur',
+    'materiau': 'materiau',
+    'etat': 'etat',
+    'active': 'active',
+    'featured': 'featured',
+    'nouveau': 'nouveau',
+    'meta_title': 'meta_title',
+    'meta_description': 'meta_description',
+}
+COLONNES_OBLIGATOIRES = ['nom', 'prix', 'stock', 'categorie_nom', 'reference']
+
+# Champs réécrits quand la référence existe déjà ; l'image n'est renseignée
+# qu'à la création pour ne pas effacer celle d'un produit existant
+CHAMPS_MIS_A_JOUR = [
+    champ for champ in COLONNES_PRODUIT.values() if champ != 'reference'
+] + ['categorie', 'marque', 'fournisseur', 'date_modification']
+
+COLONNES_FOURNISSEUR = {
+    'nom': 'nom',
+    'description': 'description',
+    'contact_nom': 'contact_principal',
+    'contact_email': 'email',
+    'contact_telephone': 'telephone',
+    'site_web': 'site_web',
+    'active': 'active',
+}
+
+
+class LigneInvalide(ValueError):
+    """Une ligne du fichier ne peut pas être importée"""
+
+
+class RapportImport:
+    """Compteurs par feuille et erreurs ligne par ligne d'un import"""
+
+    def __init__(self):
+        self.crees = defaultdict(int)
+        self.mis_a_jour = defaultdict(int)
+        self.erreurs = []
+
+    def erreur(self, feuille, ligne, message):
+        self.erreurs.append((feuille, ligne, message))
+
+
+def importer_catalogue(chemin, taille_lot=TAILLE_LOT):
+    """
+    Importe un classeur au format du template (ou un CSV de produits).
+
+    Le fichier est lu en flux (openpyxl en lecture seule) ; marques et
+    fournisseurs sont insérés ou mis à jour sur leur nom, puis les produits
+    par lots de `taille_lot` avec un seul INSERT ... ON CONFLICT (reference)
+    DO UPDATE par lot. Catégories, marques et fournisseurs sont résolus par
+    nom dans des dictionnaires construits une fois. Une ligne invalide est
+    signalée dans le rapport sans interrompre l'import.
+    """
+    rapport = RapportImport()
+    if os.path.splitext(chemin)[1].lower() == '.csv':
+        with open(chemin, newline='', encoding='utf-8-sig') as fichier:
+            importer_produits(lire_csv(fichier), rapport, taille_lot)
+    else:
+        classeur = load_workbook(chemin, read_only=True, data_only=True)
+        try:
+            feuilles = set(classeur.sheetnames)
+            if FEUILLE_CATEGORIES in feuilles:
+                importer_categories(lire_lignes(classeur[FEUILLE_CATEGORIES].iter_rows(values_only=True)), rapport)
+            if FEUILLE_MARQUES in feuilles:
+                importer_marques(lire_lignes(classeur[FEUILLE_MARQUES].iter_rows(values_only=True)), rapport)
+            if FEUILLE_FOURNISSEURS in feuilles:
+                importer_fournisseurs(lire_lignes(classeur[FEUILLE_FOURNISSEURS].iter_rows(values_only=True)), rapport)
+            if FEUILLE_PRODUITS in feuilles:
+                importer_produits(lire_lignes(classeur[FEUILLE_PRODUITS].iter_rows(values_only=True)), rapport, taille_lot)
+        finally:
+            classeur.close()
+    invalider_catalogue()
+    return rapport
+
+
+def lire_csv(fichier):
+    """Lignes d'un CSV séparé par des virgules ou des points-virgules (export Excel français)"""
+    debut = fichier.read(4096)
+    fichier.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=',;')
+    except csv.Error:
+        dialecte = csv.excel
+    return lire_lignes(csv.reader(fichier, dialecte))
+
+
+def lire_lignes(lignes):
+    """(numéro de ligne, {colonne: valeur}) ; la première ligne est l'en-tête, les lignes vides sont ignorées"""
+    lignes = iter(lignes)
+    entete = [str(colonne).strip() if colonne is not None else '' for colonne in next(lignes, ())]
+    for numero, valeurs in enumerate(lignes, 2):
+        valeurs = [valeur.strip() if isinstance(valeur, str) else valeur for valeur in valeurs]
+        if all(valeur in (None, '') for valeur in valeurs):
+            continue
+        yield numero, dict(zip(entete, valeurs))
+
+
+def convertir(modele, champ, valeur):
+    """Valeur d'une cellule convertie et validée selon le champ du modèle ; LigneInvalide sinon"""
+    field = modele._meta.get_field(champ)
+    if valeur in (None, ''):
+        if field.null:
+            return None
+        return field.get_default()
+    if isinstance(valeur, str) and field.get_internal_type() == 'DecimalField':
+        valeur = valeur.replace(',', '.')
+    elif isinstance(valeur, float) and valeur.is_integer() and field.get_internal_type().endswith('IntegerField'):
+        valeur = int(valeur)
+    try:
+        return field.clean(valeur, None)
+    except ValidationError as e:
+        raise LigneInvalide(f"{champ} : {' '.join(e.messages)}")
+
+
+def _url(valeur):
+    """Ajoute https:// aux adresses saisies sans protocole (www.exemple.tn)"""
+    if isinstance(valeur, str) and valeur and '://' not in valeur:
+        return f'https://{valeur}'
+    return valeur
+
+
+def importer_categories(lignes, rapport):
+    """Crée les catégories absentes et met à jour les autres ; parent_id = id ou nom du parent"""
+    categories = {categorie.nom: categorie for categorie in Categorie.objects.all()}
+    par_id = {categorie.pk: categorie for categorie in categories.values()}
+    a_mettre_a_jour = []
+    for numero, ligne in lignes:
+        try:
+            nom = convertir(Categorie, 'nom', ligne.get('nom'))
+            if not nom:
+                raise LigneInvalide("nom obligatoire")
+            parent = None
+            if ligne.get('parent_id') not in (None, ''):
+                cle = str(ligne['parent_id']).removesuffix('.0')
+                parent = par_id.get(int(cle)) if cle.isdigit() else categories.get(cle)
+                if parent is None:
+                    raise LigneInvalide(f"catégorie parente introuvable : {ligne['parent_id']}")
+            valeurs = {
+                'description': convertir(Categorie, 'description', ligne.get('description')),
+                'active': convertir(Categorie, 'active', ligne.get('active')),
+            }
+        except LigneInvalide as e:
+            rapport.erreur(FEUILLE_CATEGORIES, numero, str(e))
+            continue
+
+        categorie = categories.get(nom)
+        if categorie is None or categorie.parent_id != (parent.pk if parent else None):
+            # Création ou déplacement : save() maintient slug, chemin et niveau
+            categorie = categorie or Categorie(nom=nom)
+            for champ, valeur in valeurs.items():
+                setattr(categorie, champ, valeur)
+            categorie.parent = parent
+            creee = categorie.pk is None
+            try:
+                with transaction.atomic():
+                    categorie.save()
+            except (IntegrityError, ValidationError) as e:
+                rapport.erreur(FEUILLE_CATEGORIES, numero, str(e))
+                continue
+            categories[nom] = par_id[categorie.pk] = categorie
+            if creee:
+                rapport.crees[FEUILLE_CATEGORIES] += 1
+            else:
+                rapport.mis_a_jour[FEUILLE_CATEGORIES] += 1
+        else:
+            for champ, valeur in valeurs.items():
+                setattr(categorie, champ, valeur)
+            a_mettre_a_jour.append(categorie)
+            rapport.mis_a_jour[FEUILLE_CATEGORIES] += 1
+    Categorie.objects.bulk_update(a_mettre_a_jour, ['description', 'active'], batch_size=TAILLE_LOT)
+
+
+def importer_marques(lignes, rapport):
+    objets = {}
+    for numero, ligne in lignes:
+        try:
+            marque = Marque(
+                nom=convertir(Marque, 'nom', ligne.get('nom')),
+                description=convertir(Marque, 'description', ligne.get('description')),
+                logo=ligne.get('logo') or None,
+                site_web=convertir(Marque, 'site_web', _url(ligne.get('site_web'))),
+                active=convertir(Marque, 'active', ligne.get('active')),
+            )
+            if not marque.nom:
+                raise LigneInvalide("nom obligatoire")
+        except LigneInvalide as e:
+            rapport.erreur(FEUILLE_MARQUES, numero, str(e))
+            continue
+        objets[marque.nom] = marque
+    _upsert_par_nom(Marque, objets, ['description', 'site_web', 'active'], FEUILLE_MARQUES, rapport)
+
+
+def importer_fournisseurs(lignes, rapport):
+    objets = {}
+    for numero, ligne in lignes:
+        try:
+            ligne['site_web'] = _url(ligne.get('site_web'))
+            fournisseur = Fournisseur(**{
+                champ: convertir(Fournisseur, champ, ligne.get(colonne))
+                for colonne, champ in COLONNES_FOURNISSEUR.items()
+            })
+            if not fournisseur.nom:
+                raise LigneInvalide("nom obligatoire")
+        except LigneInvalide as e:
+            rapport.erreur(FEUILLE_FOURNISSEURS, numero, str(e))
+            continue
+        # Le template découpe l'adresse, le modèle la garde en un seul champ
+        fournisseur.adresse = '\n'.join(
+            ' '.join(str(ligne[colonne]) for colonne in colonnes if ligne.get(colonne) not in (None, ''))
+            for colonnes in (('adresse',), ('code_postal', 'ville'), ('pays',))
+        ).strip()
+        objets[fournisseur.nom] = fournisseur
+    champs = [champ for champ in COLONNES_FOURNISSEUR.values() if champ != 'nom'] + ['adresse']
+    _upsert_par_nom(Fournisseur, objets, champs, FEUILLE_FOURNISSEURS, rapport)
+
+
+def _upsert_par_nom(modele, objets, champs, feuille, rapport):
+    existants = set(modele.objects.filter(nom__in=objets).values_list('nom', flat=True))
+    modele.objects.bulk_create(
+        objets.values(), update_conflicts=True, unique_fields=['nom'], update_fields=champs, batch_size=TAILLE_LOT,
+    )
+    rapport.mis_a_jour[feuille] += len(existants)
+    rapport.crees[feuille] += len(objets) - len(existants)
+
+
+def importer_produits(lignes, rapport, taille_lot=TAILLE_LOT):
+    categories = dict(Categorie.objects.values_list('nom', 'id'))
+    marques = dict(Marque.objects.values_list('nom', 'id'))
+    fournisseurs = dict(Fournisseur.objects.values_list('nom', 'id'))
+
+    lot = {}
+    for numero, ligne in lignes:
+        try:
+            produit = construire_produit(ligne, categories, marques, fournisseurs)
+        except LigneInvalide as e:
+            rapport.erreur(FEUILLE_PRODUITS, numero, str(e))
+            continue
+        # Une référence répétée dans le fichier : la dernière ligne l'emporte
+        lot.pop(produit.reference, None)
+        lot[produit.reference] = (numero, produit)
+        if len(lot) >= taille_lot:
+            _enregistrer_produits(lot, rapport)
+            lot = {}
+    if lot:
+        _enregistrer_produits(lot, rapport)
+
+
+def construire_produit(ligne, categories, marques, fournisseurs):
+    """Produit non enregistré correspondant à une ligne ; LigneInvalide si elle est incomplète ou incorrecte"""
+    manquantes = [colonne for colonne in COLONNES_OBLIGATOIRES if ligne.get(colonne) in (None, '')]
+    if manquantes:
+        raise LigneInvalide(f"colonne(s) obligatoire(s) vide(s) : {', '.join(manquantes)}")
+
+    valeurs = {
+        champ: convertir(Produit, champ, ligne.get(colonne))
+        for colonne, champ in COLONNES_PRODUIT.items()
+    }
+    valeurs['categorie_id'] = _resoudre(categories, ligne, 'categorie_nom', 'catégorie')
+    valeurs['marque_id'] = _resoudre(marques, ligne, 'marque_nom', 'marque')
+    valeurs['fournisseur_id'] = _resoudre(fournisseurs, ligne, 'fournisseur_nom', 'fournisseur')
+    valeurs['image_principale'] = ligne.get('image_principale') or ''
+    return Produit(**valeurs)
+
+
+def _resoudre(ids, ligne, colonne, libelle):
+    nom = ligne.get(colonne)
+    if nom in (None, ''):
+        return None
+    try:
+        return ids[str(nom)]
+    except KeyError:
+        raise LigneInvalide(f"{libelle} introuvable : {nom}")
+
+
+def _enregistrer_produits(lot, rapport):
+    existantes = set(Produit.objects.filter(reference__in=lot).values_list('reference', flat=True))
+    try:
+        with transaction.atomic():
+            _upsert_produits([produit for _, produit in lot.values()])
+    except IntegrityError:
+        # Conflit sur une autre contrainte (sku...) : isoler les lignes fautives
+        for reference, (numero, produit) in list(lot.items()):
+            try:
+                with transaction.atomic():
+                    _upsert_produits([produit])
+            except IntegrityError as e:
+                rapport.erreur(FEUILLE_PRODUITS, numero, f"conflit en base : {str(e).strip().splitlines()[0]}")
+                del lot[reference]
+    rapport.mis_a_jour[FEUILLE_PRODUITS] += len(existantes & lot.keys())
+    rapport.crees[FEUILLE_PRODUITS] += len(lot.keys() - existantes)
+
+
+def _upsert_produits(produits):
+    Produit.objects.bulk_create(
+        produits, update_conflicts=True, unique_fields=['reference'], update_fields=CHAMPS_MIS_A_JOUR,
+    )
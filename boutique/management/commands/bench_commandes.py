@@ -0,0 +1,159 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+
+from boutique.commandes import CommandeInvalide, passer_commande
+from boutique.models import Adresse, Categorie, Commande, LigneCommande, Panier, ProfilClient, Produit
+from boutique.stock import StockInsuffisant
+
+PREFIXE = 'bench-commande'
+
+
+def _initialiser_worker():
+    # Processus lancés par « spawn » (macOS, Windows) : Django n'y est pas encore configuré
+    django.setup()
+
+
+def _connecter(_):
+    connections['default'].ensure_connection()
+
+
+def _commander(client):
+    """Une validation de panier, dans un processus du pool (sa propre connexion, gardée entre deux commandes)"""
+    debut = time.perf_counter()
+    try:
+        passer_commande(client['id'], client['adresse'], client['adresse'])
+        reussie = True
+    except (CommandeInvalide, StockInsuffisant):
+        reussie = False
+    return time.perf_counter() - debut, reussie
+
+
+class Command(BaseCommand):
+    help = 'Mesure le débit de passer_commande() : N paniers validés en parallèle (données créées puis supprimées)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--commandes', type=int, default=500, help='Nombre de commandes à passer')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Nombre de processus concurrents, chacun avec sa connexion (des threads partageraient le GIL)',
+        )
+        parser.add_argument('--produits', type=int, default=50, help='Taille du catalogue de test')
+        parser.add_argument('--lignes', type=int, default=3, help='Lignes par panier')
+        parser.add_argument(
+            '--stock', type=int,
+            help='Stock de chaque produit (par défaut : de quoi servir tous les paniers ; '
+                 'plus petit pour vérifier qu\'aucune commande ne survend)',
+        )
+        parser.add_argument('--garder', action='store_true', help='Ne pas supprimer les données de test')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor == 'sqlite' and options['workers'] > 1:
+            raise CommandError('SQLite refuse les écritures concurrentes de plusieurs processus : utiliser --workers 1')
+        self.stdout.write('Préparation des données...')
+        stock = options['stock']
+        if stock is None:
+            stock = options['commandes'] * 3
+        clients = self.preparer(options['commandes'], options['produits'], options['lignes'], stock)
+
+        try:
+            # Les processus forkés ne doivent pas hériter des connexions ouvertes du parent
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_initialiser_worker) as pool:
+                # Démarrage des processus et connexions hors de la mesure
+                list(pool.map(_connecter, range(options['workers'])))
+                debut = time.perf_counter()
+                resultats = list(pool.map(
+                    _commander, clients, chunksize=max(1, len(clients) // (options['workers'] * 8)),
+                ))
+            duree_totale = time.perf_counter() - debut
+            durees = [duree for duree, _ in resultats]
+            reussies = sum(reussie for _, reussie in resultats)
+
+            quantiles = statistics.quantiles(durees, n=100) if len(durees) > 1 else durees * 99
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(durees)} commandes ({reussies} acceptées) en {duree_totale:.2f} s "
+                f"({len(durees) / duree_totale:.0f} commandes/s, {options['workers']} processus)"
+            ))
+            self.stdout.write(
+                f"Latence : p50 {quantiles[49] * 1000:.1f} ms, "
+                f"p95 {quantiles[94] * 1000:.1f} ms, p99 {quantiles[98] * 1000:.1f} ms"
+            )
+            self.verifier(reussies, options['produits'] * stock)
+        finally:
+            if not options['garder']:
+                self.nettoyer()
+
+    def preparer(self, nb_commandes, nb_produits, nb_lignes, stock):
+        categorie = Categorie.objects.create(nom=f'{PREFIXE}-categorie', active=False)
+        produits = Produit.objects.bulk_create([
+            Produit(
+                nom=f'{PREFIXE}-{i}',
+                description='Produit de test du benchmark de commande',
+                reference=f'{PREFIXE}-{i}',
+                prix=random.randint(5, 200),
+                stock=stock,
+                categorie=categorie,
+                image_principale='produits/bench.jpg',
+                active=True,
+            )
+            for i in range(nb_produits)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'{PREFIXE}-{i}') for i in range(nb_commandes)
+        ])
+        profils = ProfilClient.objects.bulk_create([ProfilClient(user=user) for user in users])
+        adresses = Adresse.objects.bulk_create([
+            Adresse(
+                client=profil, type_adresse='livraison', nom='Test', prenom='Bench',
+                adresse1='1 rue du Test', ville='Tunis', code_postal='1000', pays='Tunisie',
+            )
+            for profil in profils
+        ])
+        Panier.objects.bulk_create([
+            Panier(client=profil, produit=produit, quantite=random.randint(1, 3))
+            for profil in profils
+            for produit in random.sample(produits, min(nb_lignes, len(produits)))
+        ])
+        return [{'id': profil.id, 'adresse': adresse} for profil, adresse in zip(profils, adresses)]
+
+    def verifier(self, reussies, stock_initial):
+        """Aucune survente : le stock vendu correspond aux commandes acceptées, sans stock négatif ni réservé"""
+        produits = Produit.objects.filter(reference__startswith=PREFIXE)
+        commandes = Commande.objects.filter(client__user__username__startswith=PREFIXE).count()
+        paniers = Panier.objects.filter(client__user__username__startswith=PREFIXE).count()
+        totaux = produits.aggregate(stock=Sum('stock'), reserve=Sum('stock_reserve'))
+        vendu = LigneCommande.objects.filter(
+            commande__client__user__username__startswith=PREFIXE
+        ).aggregate(total=Sum('quantite'))['total'] or 0
+        self.stdout.write(
+            f"Vérification : {commandes} commandes, {paniers} lignes de panier restantes, "
+            f"stock restant {totaux['stock']}, vendu {vendu}"
+        )
+
+        erreurs = []
+        if commandes != reussies:
+            erreurs.append(f'{commandes} commandes enregistrées pour {reussies} acceptées')
+        if produits.filter(stock__lt=0).exists():
+            erreurs.append('stock négatif')
+        if totaux['reserve']:
+            erreurs.append(f"{totaux['reserve']} unités encore réservées")
+        if totaux['stock'] + vendu != stock_initial:
+            erreurs.append(f"stock restant {totaux['stock']} + vendu {vendu} != stock initial {stock_initial}")
+        if erreurs:
+            raise CommandError('Vérification échouée : ' + ', '.join(erreurs))
+
+    def nettoyer(self):
+        Commande.objects.filter(client__user__username__startswith=PREFIXE).delete()
+        User.objects.filter(username__startswith=PREFIXE).delete()
+        Produit.objects.filter(reference__startswith=PREFIXE).delete()
+        Categorie.objects.filter(nom__startswith=PREFIXE).delete()
+        self.stdout.write('Données de test supprimées')
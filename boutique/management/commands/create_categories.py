@@ -1,18 +1,20 @@
 # Remplacer le contenu de boutique/management/commands/create_categories.py
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import slugify
+from boutique.cache import invalider_catalogue
+from boutique.categories import invalider_cache_categories
 from boutique.models import Categorie
 
+# Champs que la synchronisation peut modifier sur une catégorie existante
+CHAMPS_SYNCHRONISES = ['parent', 'ordre', 'icone', 'chemin', 'niveau']
+
+
 class Command(BaseCommand):
-    help = 'Crée la hiérarchie complète des catégories'
+    help = 'Crée ou met à jour la hiérarchie complète des catégories (sans supprimer les existantes)'
     
     def handle(self, *args, **options):
-        """Créer toute la hiérarchie de catégories"""
-        
-        # Supprimer toutes les catégories existantes
-        count_before = Categorie.objects.count()
-        if count_before > 0:
-            self.stdout.write(f"Suppression de {count_before} catégories existantes...")
-            Categorie.objects.all().delete()
+        """Synchroniser la hiérarchie de catégories"""
         
         # Catégories principales (niveau 1)
         categories_principales = [
@@ -34,13 +36,6 @@ class Command(BaseCommand):
             {'nom': 'Quincaillerie légère & Électricité', 'icone': 'fas fa-tools', 'ordre': 16},
         ]
         
-        # Créer les catégories principales
-        cats_principales = {}
-        for cat_data in categories_principales:
-            cat = Categorie.objects.create(**cat_data)
-            cats_principales[cat.nom] = cat
-            self.stdout.write(f"✅ Créé: {cat.nom}")
-        
         # Sous-catégories niveau 2 avec noms uniques
         sous_categories = {
             'Cuisine & Préparation': [
@@ -139,19 +134,6 @@ class Command(BaseCommand):
             ],
         }
         
-        # Créer les sous-catégories niveau 2
-        cats_niveau2 = {}
-        for parent_nom, sous_cats in sous_categories.items():
-            parent = cats_principales[parent_nom]
-            for i, sous_cat_nom in enumerate(sous_cats):
-                sous_cat = Categorie.objects.create(
-                    nom=sous_cat_nom,
-                    parent=parent,
-                    ordre=i + 1
-                )
-                cats_niveau2[sous_cat_nom] = sous_cat
-                self.stdout.write(f"  ✅ Créé: {parent_nom} > {sous_cat_nom}")
-        
         # Sous-catégories niveau 3 (quelques exemples)
         sous_sous_categories = {
             'Batterie de cuisine': [
@@ -291,22 +273,100 @@ class Command(BaseCommand):
             ],
         }
         
-        # Créer les sous-sous-catégories niveau 3
-        for parent_nom, sous_sous_cats in sous_sous_categories.items():
-            if parent_nom in cats_niveau2:
-                parent = cats_niveau2[parent_nom]
-                for i, sous_sous_cat_nom in enumerate(sous_sous_cats):
-                    try:
-                        Categorie.objects.create(
-                            nom=sous_sous_cat_nom,
-                            parent=parent,
-                            ordre=i + 1
-                        )
-                        self.stdout.write(f"    ✅ Créé: {parent.parent.nom} > {parent_nom} > {sous_sous_cat_nom}")
-                    except Exception as e:
-                        self.stdout.write(f"    ❌ Erreur: {sous_sous_cat_nom} - {str(e)}")
+        # Arbre souhaité, niveau par niveau : (nom, nom du parent, champs)
+        noms_niveau2 = {nom for sous_cats in sous_categories.values() for nom in sous_cats}
+        niveaux = [
+            [(cat_data['nom'], None, {'icone': cat_data['icone'], 'ordre': cat_data['ordre']})
+             for cat_data in categories_principales],
+            [(nom, parent_nom, {'ordre': i + 1})
+             for parent_nom, sous_cats in sous_categories.items()
+             for i, nom in enumerate(sous_cats)],
+            [(nom, parent_nom, {'ordre': i + 1})
+             for parent_nom, sous_sous_cats in sous_sous_categories.items() if parent_nom in noms_niveau2
+             for i, nom in enumerate(sous_sous_cats)],
+        ]
+        
+        creees, modifiees, inchangees = self.synchroniser(niveaux)
+        invalider_cache_categories()
+        invalider_catalogue()
         
-        total = Categorie.objects.count()
         self.stdout.write(
-            self.style.SUCCESS(f'\n🎉 {total} catégories créées avec succès!')
-        )
\ No newline at end of file
+            self.style.SUCCESS(
+                f'\n🎉 Catégories synchronisées : {creees} créées, {modifiees} mises à jour, '
+                f'{inchangees} inchangées ({Categorie.objects.count()} au total)'
+            )
+        )
+    
+    def synchroniser(self, niveaux):
+        """
+        Aligne la table sur l'arbre souhaité sans jamais supprimer de catégorie.
+        
+        Les catégories sont rapprochées par nom (unique) : les manquantes sont
+        insérées par un bulk_create par niveau, les existantes gardent leur id
+        (et donc leurs produits). chemin et niveau sont ensuite recalculés en
+        mémoire pour tout l'arbre et les lignes modifiées enregistrées par un
+        seul bulk_update. Les catégories absentes de l'arbre sont conservées.
+        """
+        with transaction.atomic():
+            categories = {categorie.nom: categorie for categorie in Categorie.objects.all()}
+            slugs = {categorie.slug for categorie in categories.values()}
+            deja_vues = set()
+            modifiees = set()
+            creees = []
+            
+            for numero, niveau in enumerate(niveaux, 1):
+                a_creer = []
+                for nom, parent_nom, champs in niveau:
+                    if nom in deja_vues:
+                        self.stdout.write(f"❌ Erreur: {nom} - nom déjà utilisé dans l'arbre")
+                        continue
+                    deja_vues.add(nom)
+                    parent_id = categories[parent_nom].pk if parent_nom else None
+                    categorie = categories.get(nom)
+                    if categorie is None:
+                        categorie = Categorie(nom=nom, parent_id=parent_id, slug=self.slug_unique(nom, slugs), **champs)
+                        a_creer.append(categorie)
+                        continue
+                    for champ, valeur in {'parent_id': parent_id, **champs}.items():
+                        if getattr(categorie, champ) != valeur:
+                            setattr(categorie, champ, valeur)
+                            modifiees.add(nom)
+                
+                Categorie.objects.bulk_create(a_creer)
+                for categorie in a_creer:
+                    categories[categorie.nom] = categorie
+                    self.stdout.write(f"{'  ' * (numero - 1)}✅ Créé: {categorie.nom}")
+                creees.extend(a_creer)
+            
+            # chemin et niveau de toutes les catégories, à partir des parents en mémoire
+            par_id = {categorie.pk: categorie for categorie in categories.values()}
+            chemins = {}
+            
+            def chemin(categorie):
+                if categorie.pk not in chemins:
+                    parent = par_id.get(categorie.parent_id)
+                    chemins[categorie.pk] = (chemin(parent) if parent else '') + f'{categorie.pk}/'
+                return chemins[categorie.pk]
+            
+            ids_creees = {categorie.pk for categorie in creees}
+            a_enregistrer = []
+            for categorie in categories.values():
+                nouveau_chemin = chemin(categorie)
+                if (categorie.chemin, categorie.niveau) != (nouveau_chemin, nouveau_chemin.count('/')):
+                    categorie.chemin, categorie.niveau = nouveau_chemin, nouveau_chemin.count('/')
+                    if categorie.pk not in ids_creees:
+                        modifiees.add(categorie.nom)
+                if categorie.pk in ids_creees or categorie.nom in modifiees:
+                    a_enregistrer.append(categorie)
+            Categorie.objects.bulk_update(a_enregistrer, CHAMPS_SYNCHRONISES)
+        
+        return len(creees), len(modifiees), len(deja_vues - modifiees) - len(creees)
+    
+    def slug_unique(self, nom, slugs):
+        slug = base = slugify(nom)
+        suffixe = 2
+        while slug in slugs:
+            slug = f'{base}-{suffixe}'
+            suffixe += 1
+        slugs.add(slug)
+        return slug
@@ -3,14 +3,146 @@ from django.core.management.base import BaseCommand
 from django.core.files.base import ContentFile
 from boutique.models import Produit, Categorie, Marque
 from django.db import models
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import requests
 from io import BytesIO
 from PIL import Image
+import glob
+import hashlib
+import os
 import random
+import tempfile
+
+TAILLE_IMAGE = (600, 600)
+TIMEOUT_TELECHARGEMENT = 15
+
+
+def redimensionner(contenu):
+    """Décode une image et retourne sa version JPEG réduite (exécuté dans un processus du pool)"""
+    image = Image.open(BytesIO(contenu))
+    image = image.convert('RGB')
+    image.thumbnail(TAILLE_IMAGE, Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+class CacheImages:
+    """
+    Cache local des images adressé par contenu.
+
+    objets/<sha1> contient les octets téléchargés, sources/<sha1 de l'URL>
+    l'empreinte du contenu de cette URL et traitees/<sha1>.jpg l'image
+    redimensionnée : une nouvelle exécution ne télécharge ni ne décode
+    les images déjà obtenues.
+    """
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        for sous_dossier in ('objets', 'sources', 'traitees'):
+            os.makedirs(os.path.join(dossier, sous_dossier), exist_ok=True)
+
+    def _chemin(self, *parties):
+        return os.path.join(self.dossier, *parties)
+
+    def _lire(self, chemin):
+        try:
+            with open(chemin, 'rb') as fichier:
+                return fichier.read()
+        except FileNotFoundError:
+            return None
+
+    def _ecrire(self, chemin, contenu):
+        # Écriture atomique : un fichier du cache n'est jamais à moitié écrit
+        descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin))
+        with os.fdopen(descripteur, 'wb') as fichier:
+            fichier.write(contenu)
+        os.replace(temporaire, chemin)
+
+    def get_empreinte(self, source):
+        empreinte = self._lire(self._chemin('sources', hashlib.sha1(source.encode()).hexdigest()))
+        if empreinte and os.path.exists(self._chemin('objets', empreinte.decode())):
+            return empreinte.decode()
+        return None
+
+    def get_contenu(self, empreinte):
+        return self._lire(self._chemin('objets', empreinte))
+
+    def ajouter(self, source, contenu):
+        empreinte = hashlib.sha1(contenu).hexdigest()
+        if not os.path.exists(self._chemin('objets', empreinte)):
+            self._ecrire(self._chemin('objets', empreinte), contenu)
+        self._ecrire(self._chemin('sources', hashlib.sha1(source.encode()).hexdigest()), empreinte.encode())
+        return empreinte
+
+    def get_traitee(self, empreinte):
+        return self._lire(self._chemin('traitees', f'{empreinte}.jpg'))
+
+    def ajouter_traitee(self, empreinte, contenu):
+        self._ecrire(self._chemin('traitees', f'{empreinte}.jpg'), contenu)
+
 
 class Command(BaseCommand):
     help = 'Crée un jeu de données de 10 produits avec images'
     
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help="Dossier local (<reference>.jpg/.png/.webp) ou URL d'un serveur de fixtures "
+                 "(<url>/<reference>.jpg) à utiliser à la place des URL d'origine",
+        )
+        parser.add_argument(
+            '--cache', default=os.path.join(tempfile.gettempdir(), 'inartdeco-images'),
+            help='Dossier du cache local des images',
+        )
+        parser.add_argument('--workers', type=int, default=8, help='Téléchargements simultanés')
+        parser.add_argument('--processus', type=int, default=os.cpu_count() or 1, help='Processus de redimensionnement')
+
+    def get_session(self, workers):
+        """Session HTTP partagée par les threads, avec pool de connexions et nouvelles tentatives"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=workers,
+            pool_maxsize=workers,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def localiser_image(self, produit_data, source):
+        """Chemin local ou URL de l'image d'un produit"""
+        if not source:
+            return produit_data['image_url']
+        if os.path.isdir(source):
+            fichiers = sorted(glob.glob(os.path.join(source, glob.escape(produit_data['reference']) + '.*')))
+            if not fichiers:
+                raise FileNotFoundError(f"aucune image {produit_data['reference']}.* dans {source}")
+            return fichiers[0]
+        return f"{source.rstrip('/')}/{produit_data['reference']}.jpg"
+
+    def obtenir_image(self, produit_data, source, session, cache, processus):
+        """Image redimensionnée d'un produit : cache, sinon téléchargement puis pool de processus"""
+        emplacement = self.localiser_image(produit_data, source)
+        empreinte = cache.get_empreinte(emplacement)
+        if empreinte is None:
+            if os.path.isfile(emplacement):
+                with open(emplacement, 'rb') as fichier:
+                    contenu = fichier.read()
+            else:
+                response = session.get(emplacement, timeout=TIMEOUT_TELECHARGEMENT)
+                response.raise_for_status()
+                contenu = response.content
+            empreinte = cache.ajouter(emplacement, contenu)
+
+        image = cache.get_traitee(empreinte)
+        if image is None:
+            image = processus.submit(redimensionner, cache.get_contenu(empreinte)).result()
+            cache.ajouter_traitee(empreinte, image)
+        return image
+
     def handle(self, *args, **options):
         """Créer 10 produits avec images"""
         
@@ -250,72 +382,103 @@ class Command(BaseCommand):
             },
         ]
         
-        # Supprimer les produits existants
-        count_before = Produit.objects.count()
-        if count_before > 0:
-            self.stdout.write(f"Suppression de {count_before} produits existants...")
-            Produit.objects.all().delete()
+        # Lancer le téléchargement des images pendant la création des produits ;
+        # les produits qui ont déjà leur image (exécution précédente) sont sautés
+        avec_image = set(Produit.objects.filter(
+            reference__in=[produit_data['reference'] for produit_data in produits_data],
+        ).exclude(image_principale='').values_list('reference', flat=True))
+        a_telecharger = [produit_data for produit_data in produits_data if produit_data['reference'] not in avec_image]
+        self.stdout.write(f"📥 Téléchargement de {len(a_telecharger)} images ({options['workers']} en parallèle)...")
+        cache = CacheImages(options['cache'])
+        session = self.get_session(options['workers'])
+        telechargements = ThreadPoolExecutor(max_workers=options['workers'])
+        processus = ProcessPoolExecutor(max_workers=options['processus'])
+        images = {
+            produit_data['reference']: telechargements.submit(
+                self.obtenir_image, produit_data, options['source'], session, cache, processus,
+            )
+            for produit_data in a_telecharger
+        }
+
+        try:
+            self.creer_produits(produits_data, images, categories, marques)
+        finally:
+            telechargements.shutdown(cancel_futures=True)
+            processus.shutdown(cancel_futures=True)
+            session.close()
+
+        # Résumé détaillé
+        total_produits = Produit.objects.count()
+        produits_featured = Produit.objects.filter(featured=True).count()
+        produits_nouveaux = Produit.objects.filter(nouveau=True).count()
+        produits_promo = Produit.objects.filter(prix_promo__isnull=False).count()
+        produits_avec_images = Produit.objects.exclude(image_principale='').count()
+        
+        if total_produits > 0:
+            valeur_stock_total = sum(p.prix * p.stock for p in Produit.objects.all())
+        else:
+            valeur_stock_total = 0
         
-        # Créer les produits
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n🎉 Création terminée avec succès !\n"
+                f"📦 {total_produits} produits créés\n"
+                f"⭐ {produits_featured} produits vedette (featured)\n"
+                f"🆕 {produits_nouveaux} nouveaux produits\n"
+                f"💰 {produits_promo} produits en promotion\n"
+                f"🖼️ {produits_avec_images} produits avec images\n"
+                f"💎 Valeur totale du stock: {valeur_stock_total:.2f}€\n"
+                f"🏷️ Marques: {', '.join(marques.keys())}"
+            )
+        )
+
+    def creer_produits(self, produits_data, images, categories, marques):
+        """
+        Crée ou met à jour les produits (clé naturelle : la référence) et leur
+        attache l'image téléchargée s'ils n'en ont pas encore : la commande
+        peut être relancée après une interruption sans rien dupliquer.
+        """
+        # Créer ou mettre à jour les produits
         for i, produit_data in enumerate(produits_data, 1):
             try:
-                # Sélectionner une catégorie aléatoire
-                categorie = random.choice(categories)
+                # Catégorie tirée au hasard, mais toujours la même pour une référence
+                categorie = random.Random(produit_data['reference']).choice(categories)
                 marque = marques[produit_data['marque']]
                 
-                # Créer le produit
-                produit = Produit.objects.create(
-                    nom=produit_data['nom'],
-                    description=produit_data['description'],
-                    prix=produit_data['prix'],
-                    prix_promo=produit_data.get('prix_promo'),
-                    stock=produit_data['stock'],
-                    seuil_stock=produit_data.get('seuil_stock', 5),
+                # Créer le produit, ou remettre à jour celui d'une exécution précédente
+                produit, created = Produit.objects.update_or_create(
                     reference=produit_data['reference'],
-                    sku=produit_data.get('sku'),
-                    categorie=categorie,
-                    marque=marque,
-                    poids=produit_data.get('poids'),
-                    dimensions=produit_data.get('dimensions'),
-                    couleur=produit_data.get('couleur'),
-                    materiau=produit_data.get('materiau'),
-                    etat=produit_data.get('etat', 'neuf'),
-                    featured=produit_data.get('featured', False),
-                    nouveau=produit_data.get('nouveau', False),
-                    meta_title=produit_data.get('meta_title'),
-                    meta_description=produit_data.get('meta_description'),
+                    defaults=dict(
+                        nom=produit_data['nom'],
+                        description=produit_data['description'],
+                        prix=produit_data['prix'],
+                        prix_promo=produit_data.get('prix_promo'),
+                        stock=produit_data['stock'],
+                        seuil_stock=produit_data.get('seuil_stock', 5),
+                        sku=produit_data.get('sku'),
+                        categorie=categorie,
+                        marque=marque,
+                        poids=produit_data.get('poids'),
+                        dimensions=produit_data.get('dimensions'),
+                        couleur=produit_data.get('couleur'),
+                        materiau=produit_data.get('materiau'),
+                        etat=produit_data.get('etat', 'neuf'),
+                        featured=produit_data.get('featured', False),
+                        nouveau=produit_data.get('nouveau', False),
+                        meta_title=produit_data.get('meta_title'),
+                        meta_description=produit_data.get('meta_description'),
+                    ),
                 )
                 
-                # Télécharger et attacher l'image
+                # Attacher l'image téléchargée en arrière-plan
                 try:
-                    self.stdout.write(f"📥 Téléchargement de l'image pour {produit.nom}...")
-                    
-                    response = requests.get(produit_data['image_url'], timeout=15)
-                    if response.status_code == 200:
-                        # Créer un nom de fichier
-                        filename = f"produit_{produit.id}_{produit.reference}.jpg"
-                        
-                        # Redimensionner l'image
-                        image = Image.open(BytesIO(response.content))
-                        image = image.convert('RGB')
-                        image.thumbnail((600, 600), Image.LANCZOS)
-                        
-                        # Sauvegarder l'image redimensionnée
-                        output = BytesIO()
-                        image.save(output, format='JPEG', quality=85)
-                        output.seek(0)
-                        
-                        # Attacher à l'objet produit
+                    if produit.reference in images:
                         produit.image_principale.save(
-                            filename,
-                            ContentFile(output.getvalue()),
+                            f"produit_{produit.id}_{produit.reference}.jpg",
+                            ContentFile(images[produit.reference].result()),
                             save=True
                         )
-                        
-                        image_status = "🖼️ Avec image"
-                    else:
-                        image_status = "⚠️ Sans image (erreur téléchargement)"
-                        
+                    image_status = "🖼️ Avec image"
                 except Exception as e:
                     image_status = f"⚠️ Sans image ({str(e)[:30]}...)"
                 
@@ -331,35 +494,10 @@ class Command(BaseCommand):
                 status_str = f" ({', '.join(status_info)})" if status_info else ""
                 
                 self.stdout.write(
-                    f"✅ Produit {i}/10 créé: {produit.nom}{status_str}\n"
+                    f"✅ Produit {i}/10 {'créé' if created else 'mis à jour'}: {produit.nom}{status_str}\n"
                     f"   📂 Catégorie: {categorie.nom} | 🏷️ {produit.reference} | "
                     f"💶 {produit.prix}€ | 📦 Stock: {produit.stock} | {image_status}"
                 )
                     
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"❌ Erreur création produit {i}: {str(e)}"))
-        
-        # Résumé détaillé
-        total_produits = Produit.objects.count()
-        produits_featured = Produit.objects.filter(featured=True).count()
-        produits_nouveaux = Produit.objects.filter(nouveau=True).count()
-        produits_promo = Produit.objects.filter(prix_promo__isnull=False).count()
-        produits_avec_images = Produit.objects.exclude(image_principale='').count()
-        
-        if total_produits > 0:
-            valeur_stock_total = sum(p.prix * p.stock for p in Produit.objects.all())
-        else:
-            valeur_stock_total = 0
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"\n🎉 Création terminée avec succès !\n"
-                f"📦 {total_produits} produits créés\n"
-                f"⭐ {produits_featured} produits vedette (featured)\n"
-                f"🆕 {produits_nouveaux} nouveaux produits\n"
-                f"💰 {produits_promo} produits en promotion\n"
-                f"🖼️ {produits_avec_images} produits avec images\n"
-                f"💎 Valeur totale du stock: {valeur_stock_total:.2f}€\n"
-                f"🏷️ Marques: {', '.join(marques.keys())}"
-            )
-        )
\ No newline at end of file
@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from boutique.exports import FORMATS_EXPORT, exporter_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporte le catalogue produits en CSV, JSONL ou XLSX (mémoire constante ; '
+        'le XLSX passe par un fichier temporaire et n\'est écrit qu\'à la fin)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS_EXPORT, default='csv', help='Format du fichier')
+        parser.add_argument('--sortie', help='Fichier de destination (sortie standard par défaut)')
+        parser.add_argument('--actifs', action='store_true', help='Seulement les produits actifs')
+
+    def handle(self, *args, **options):
+        morceaux = exporter_catalogue(options['format'], actifs=options['actifs'])
+        if options['sortie']:
+            with open(options['sortie'], 'wb') as fichier:
+                fichier.writelines(morceaux)
+            self.stderr.write(self.style.SUCCESS(f"Catalogue exporté dans {options['sortie']}"))
+        else:
+            sys.stdout.buffer.writelines(morceaux)
+            sys.stdout.flush()
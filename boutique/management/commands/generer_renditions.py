@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from boutique.cache import invalider_catalogue
+from boutique.images import CHAMPS_IMAGE, MODELES_EN_CACHE, renditions_a_jour, tache_renditions
+from boutique import models
+
+
+class Command(BaseCommand):
+    help = 'Génère les renditions manquantes ou périmées (produits, galeries, marques, catégories)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Nombre de générations en parallèle')
+
+    def handle(self, *args, **options):
+        invalider = False
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for nom_modele, champ in CHAMPS_IMAGE.items():
+                modele = getattr(models, nom_modele)
+                objets = (
+                    modele.objects.exclude(Q(**{champ: ''}) | Q(**{f'{champ}__isnull': True}))
+                    .only('pk', champ, 'renditions')
+                    .iterator(chunk_size=500)
+                )
+                a_traiter = [objet.pk for objet in objets if not renditions_a_jour(objet)]
+                modifies = sum(pool.map(lambda pk: tache_renditions(modele, pk, invalider=False), a_traiter))
+                invalider = invalider or (modifies > 0 and nom_modele in MODELES_EN_CACHE)
+                self.stdout.write(f'{nom_modele} : {len(a_traiter)} image(s) traitée(s)')
+        # Une seule invalidation du cache du catalogue pour tout le lot
+        if invalider:
+            invalider_catalogue()
+        self.stdout.write(self.style.SUCCESS('Renditions à jour'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from boutique.imports import TAILLE_LOT, importer_catalogue
+
+# Erreurs affichées en détail, les suivantes sont seulement comptées
+ERREURS_AFFICHEES = 50
+
+
+class Command(BaseCommand):
+    help = 'Importe catégories, marques, fournisseurs et produits depuis le template Excel (ou un CSV de produits)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help='Classeur .xlsx au format template_produits_inartdeco.xlsx, ou .csv de produits')
+        parser.add_argument('--lot', type=int, default=TAILLE_LOT, help='Produits enregistrés par requête')
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        try:
+            rapport = importer_catalogue(options['fichier'], taille_lot=options['lot'])
+        except FileNotFoundError:
+            raise CommandError(f"Fichier introuvable : {options['fichier']}")
+        duree = time.perf_counter() - debut
+
+        for feuille, ligne, message in rapport.erreurs[:ERREURS_AFFICHEES]:
+            self.stdout.write(self.style.WARNING(f'{feuille}, ligne {ligne} : {message}'))
+        if len(rapport.erreurs) > ERREURS_AFFICHEES:
+            self.stdout.write(self.style.WARNING(f'... et {len(rapport.erreurs) - ERREURS_AFFICHEES} autre(s) erreur(s)'))
+
+        for feuille in sorted(rapport.crees.keys() | rapport.mis_a_jour.keys()):
+            self.stdout.write(f'{feuille} : {rapport.crees[feuille]} créé(s), {rapport.mis_a_jour[feuille]} mis à jour')
+        self.stdout.write(self.style.SUCCESS(
+            f'Import terminé en {duree:.1f} s, {len(rapport.erreurs)} ligne(s) en erreur'
+        ))
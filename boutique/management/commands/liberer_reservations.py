@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from boutique.stock import liberer_reservations_expirees
+
+
+class Command(BaseCommand):
+    help = 'Libère le stock réservé par les lignes de panier expirées (à planifier, ex. toutes les minutes)'
+
+    def handle(self, *args, **options):
+        nombre = liberer_reservations_expirees()
+        self.stdout.write(self.style.SUCCESS(f'{nombre} réservation(s) expirée(s) libérée(s)'))
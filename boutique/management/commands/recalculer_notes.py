@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from boutique.notes import recalculer_notes
+
+
+class Command(BaseCommand):
+    help = 'Recalcule note moyenne, nombre d\'avis et répartition des notes de tous les produits'
+
+    def handle(self, *args, **options):
+        nombre = recalculer_notes()
+        self.stdout.write(self.style.SUCCESS(f'Notes recalculées ({nombre} produit(s) avec avis)'))
@@ -0,0 +1,65 @@
+# Generated by Django 5.0 on 2026-10-18 06:53
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations
+
+
+# Configuration de recherche française insensible aux accents
+CREATE_SEARCH_CONFIG = """
+CREATE TEXT SEARCH CONFIGURATION french_unaccent ( COPY = french );
+ALTER TEXT SEARCH CONFIGURATION french_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+"""
+
+DROP_SEARCH_CONFIG = "DROP TEXT SEARCH CONFIGURATION IF EXISTS french_unaccent;"
+
+# Le vecteur est pondéré : nom (A) > référence (B) > description (C).
+# Il est maintenu par un trigger pour rester à jour aussi lors des
+# bulk_create / update() qui ne passent pas par Produit.save().
+CREATE_TRIGGER = """
+CREATE FUNCTION boutique_produit_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('french_unaccent', coalesce(NEW.nom, '')), 'A') ||
+        setweight(to_tsvector('french_unaccent', coalesce(NEW.reference, '')), 'B') ||
+        setweight(to_tsvector('french_unaccent', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER boutique_produit_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF nom, reference, description
+    ON boutique_produit
+    FOR EACH ROW EXECUTE FUNCTION boutique_produit_search_vector_update();
+
+UPDATE boutique_produit SET nom = nom;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS boutique_produit_search_vector_trigger ON boutique_produit;
+DROP FUNCTION IF EXISTS boutique_produit_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0004_remove_categorie_meta_keywords'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunSQL(CREATE_SEARCH_CONFIG, DROP_SEARCH_CONFIG),
+        migrations.AddField(
+            model_name='produit',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='produit_search_vector_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
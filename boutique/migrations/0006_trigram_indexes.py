@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-18 06:53
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0005_produit_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='categorie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nom'], name='categorie_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='marque',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nom'], name='marque_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nom'], name='produit_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['reference'], name='produit_reference_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
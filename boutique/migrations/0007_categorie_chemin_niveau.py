@@ -0,0 +1,45 @@
+# Generated by Django 5.0 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+# Calcul initial des chemins pour les catégories existantes
+REMPLIR_CHEMINS = """
+WITH RECURSIVE arbre AS (
+    SELECT id, id::text || '/' AS chemin, 1 AS niveau
+    FROM boutique_categorie
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT c.id, a.chemin || c.id::text || '/', a.niveau + 1
+    FROM boutique_categorie c
+    JOIN arbre a ON c.parent_id = a.id
+)
+UPDATE boutique_categorie
+SET chemin = arbre.chemin, niveau = arbre.niveau
+FROM arbre
+WHERE boutique_categorie.id = arbre.id;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0006_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='chemin',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='niveau',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='categorie',
+            index=models.Index(fields=['chemin'], name='categorie_chemin_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunSQL(REMPLIR_CHEMINS, migrations.RunSQL.noop),
+    ]
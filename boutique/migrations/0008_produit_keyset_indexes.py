@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-18 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0007_categorie_chemin_niveau'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(condition=models.Q(('active', True)), fields=['date_creation', 'id'], name='produit_actif_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(condition=models.Q(('active', True)), fields=['prix', 'id'], name='produit_actif_prix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(condition=models.Q(('active', True)), fields=['nom', 'id'], name='produit_actif_nom_idx'),
+        ),
+    ]
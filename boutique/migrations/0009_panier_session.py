@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 07:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0008_produit_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='panier',
+            name='cle_session',
+            field=models.CharField(blank=True, editable=False, help_text="Jeton du panier d'un visiteur non connecté", max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='panier',
+            name='client',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='paniers', to='boutique.profilclient'),
+        ),
+        migrations.AddConstraint(
+            model_name='panier',
+            constraint=models.UniqueConstraint(fields=('cle_session', 'produit'), name='panier_session_produit_unique'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0009_panier_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='panier',
+            name='quantite_reservee',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='panier',
+            name='reservation_expire',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='stock_reserve',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Unités réservées dans des paniers (voir boutique/stock.py)'),
+        ),
+    ]
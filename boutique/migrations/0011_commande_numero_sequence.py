@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 07:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0010_reservation_stock'),
+    ]
+
+    operations = [
+        # Compteur des numéros de commande (voir boutique/numerotation.py)
+        migrations.RunSQL(
+            sql='CREATE SEQUENCE IF NOT EXISTS boutique_commande_numero_seq START 1;',
+            reverse_sql='DROP SEQUENCE IF EXISTS boutique_commande_numero_seq;',
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0011_commande_numero_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='nb_avis_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='nb_avis_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='nb_avis_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='nb_avis_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='nb_avis_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='nombre_avis',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='note_moyenne',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(condition=models.Q(('active', True)), fields=['note_moyenne', 'id'], name='produit_actif_note_idx'),
+        ),
+        # Reprise des avis déjà approuvés (ensuite : manage.py recalculer_notes)
+        migrations.RunSQL(
+            sql="""
+                UPDATE boutique_produit p SET
+                    nb_avis_1 = s.n1, nb_avis_2 = s.n2, nb_avis_3 = s.n3, nb_avis_4 = s.n4, nb_avis_5 = s.n5,
+                    nombre_avis = s.total,
+                    note_moyenne = round(s.somme::numeric / s.total, 2)
+                FROM (
+                    SELECT produit_id,
+                           count(*) FILTER (WHERE note = 1) AS n1,
+                           count(*) FILTER (WHERE note = 2) AS n2,
+                           count(*) FILTER (WHERE note = 3) AS n3,
+                           count(*) FILTER (WHERE note = 4) AS n4,
+                           count(*) FILTER (WHERE note = 5) AS n5,
+                           count(*) AS total,
+                           sum(note) AS somme
+                    FROM boutique_avis
+                    WHERE approuve
+                    GROUP BY produit_id
+                ) s
+                WHERE p.id = s.produit_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
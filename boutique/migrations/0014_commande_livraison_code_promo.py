@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0013_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='code_promo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='commandes', to='boutique.codepromo'),
+        ),
+        migrations.AddField(
+            model_name='commande',
+            name='mode_livraison',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='commandes', to='boutique.modelivraison'),
+        ),
+    ]
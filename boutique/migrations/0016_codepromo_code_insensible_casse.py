@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 08:00
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# Codes existants ramenés à leur forme normalisée. Deux codes qui ne
+# diffèrent que par la casse (« ETE10 » et « ete10 ») font échouer la
+# migration sur la contrainte d'unicité : en supprimer ou renommer un avant.
+NORMALISER_CODES = "UPDATE boutique_codepromo SET code = UPPER(TRIM(code)) WHERE code <> UPPER(TRIM(code));"
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0014_commande_livraison_code_promo'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NORMALISER_CODES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='codepromo',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('code'), name='codepromo_code_insensible_casse'),
+        ),
+    ]
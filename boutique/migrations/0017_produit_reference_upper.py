@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 08:15
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boutique', '0016_codepromo_code_insensible_casse'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produit',
+            name='produit_reference_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('reference'), name='text_pattern_ops'), name='produit_reference_upper'),
+        ),
+    ]
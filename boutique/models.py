@@ -1,14 +1,21 @@
-from django.db import models
+from django.db import models, router
+from django.db.models.functions import Lower, Upper
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.urls import reverse
+from django.utils.functional import cached_property
 import os
 
+from .numerotation import prochain_numero_commande
+
 # Dans boutique/models.py, ajouter les nouveaux champs
 class Categorie(models.Model):
     """Modèle pour les catégories de produits"""
     nom = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='sous_categories')
     
     # Nouveaux champs
@@ -19,25 +26,89 @@ class Categorie(models.Model):
     active = models.BooleanField(default=True)
     date_creation = models.DateTimeField(auto_now_add=True)
     
+    # Ascendance matérialisée : "1/5/12/" = ids de la racine jusqu'à la catégorie
+    chemin = models.CharField(max_length=255, blank=True, editable=False)
+    niveau = models.PositiveSmallIntegerField(default=1, editable=False)
+    
     class Meta:
         verbose_name = "Catégorie"
         verbose_name_plural = "Catégories"
         ordering = ['ordre', 'nom']
+        indexes = [
+            GinIndex(fields=['nom'], name='categorie_nom_trgm', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['chemin'], name='categorie_chemin_idx', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return self.nom
     
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.pk and self.parent_id and self.chemin and self.parent.chemin.startswith(self.chemin):
+            raise ValidationError({'parent': "Une catégorie ne peut pas être déplacée sous l'une de ses sous-catégories."})
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             from django.utils.text import slugify
             self.slug = slugify(self.nom)
+        
+        ancien_chemin, ancien_niveau = self.chemin, self.niveau
+        chemin_parent = self.parent.chemin if self.parent_id else ''
+        self.niveau = chemin_parent.count('/') + 1
+        
+        if self.pk is None:
+            # L'id n'est connu qu'après l'insertion
+            super().save(*args, **kwargs)
+            self.chemin = f"{chemin_parent}{self.pk}/"
+            Categorie.objects.filter(pk=self.pk).update(chemin=self.chemin)
+            return
+        
+        self.chemin = f"{chemin_parent}{self.pk}/"
         super().save(*args, **kwargs)
+        
+        if ancien_chemin and ancien_chemin != self.chemin:
+            # Déplacement : réécrire le préfixe de tous les descendants en une requête
+            from django.db.models import F, Value
+            from django.db.models.functions import Concat, Substr
+            Categorie.objects.filter(
+                chemin__startswith=ancien_chemin
+            ).exclude(pk=self.pk).update(
+                chemin=Concat(Value(self.chemin), Substr('chemin', len(ancien_chemin) + 1)),
+                niveau=F('niveau') + (self.niveau - ancien_niveau),
+            )
+    
+    @property
+    def ids_ancetres(self):
+        """Ids de la racine jusqu'à cette catégorie (incluse)"""
+        return [int(pk) for pk in self.chemin.split('/') if pk]
+    
+    @cached_property
+    def ancetres(self):
+        """Catégories de la racine jusqu'à celle-ci, en une seule requête"""
+        return list(Categorie.objects.filter(pk__in=self.ids_ancetres).order_by('niveau'))
+    
+    @property
+    def chemin_complet(self):
+        """Fil d'Ariane textuel, ex. : Cuisine & Préparation > Batterie de cuisine"""
+        return ' > '.join(categorie.nom for categorie in self.ancetres)
+    
+    def get_descendants(self, inclure_soi=False):
+        """Toutes les sous-catégories, quel que soit le niveau, en une requête indexée"""
+        descendants = Categorie.objects.filter(chemin__startswith=self.chemin)
+        if not inclure_soi:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+    
+    def get_produits(self):
+        """Produits de cette catégorie et de toutes ses sous-catégories"""
+        return Produit.objects.filter(categorie__chemin__startswith=self.chemin)
 
 class Marque(models.Model):
     """Modèle pour les marques de produits"""
     nom = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     logo = models.ImageField(upload_to='marques/', blank=True, null=True)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
     site_web = models.URLField(blank=True)
     active = models.BooleanField(default=True)
     
@@ -45,6 +116,9 @@ class Marque(models.Model):
         verbose_name = "Marque"
         verbose_name_plural = "Marques"
         ordering = ['nom']
+        indexes = [
+            GinIndex(fields=['nom'], name='marque_nom_trgm', opclasses=['gin_trgm_ops']),
+        ]
     
     def __str__(self):
         return self.nom
@@ -86,6 +160,8 @@ class Produit(models.Model):
     prix = models.DecimalField(max_digits=10, decimal_places=2)
     prix_promo = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     stock = models.PositiveIntegerField(default=0)
+    stock_reserve = models.PositiveIntegerField(default=0, editable=False,
+                                                help_text="Unités réservées dans des paniers (voir boutique/stock.py)")
     seuil_stock = models.PositiveIntegerField(default=5)
     
     # Relations
@@ -119,10 +195,36 @@ class Produit(models.Model):
     meta_title = models.CharField(max_length=60, blank=True)
     meta_description = models.CharField(max_length=160, blank=True)
     
+    # Renditions de image_principale (voir boutique/images.py)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    
+    # Recherche plein texte (maintenu par un trigger PostgreSQL, voir migration 0005)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    # Avis approuvés, maintenus à chaque approbation/suppression (voir boutique/notes.py)
+    note_moyenne = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    nombre_avis = models.PositiveIntegerField(default=0, editable=False)
+    nb_avis_1 = models.PositiveIntegerField(default=0, editable=False)
+    nb_avis_2 = models.PositiveIntegerField(default=0, editable=False)
+    nb_avis_3 = models.PositiveIntegerField(default=0, editable=False)
+    nb_avis_4 = models.PositiveIntegerField(default=0, editable=False)
+    nb_avis_5 = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
         ordering = ['-date_creation']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='produit_search_vector_gin'),
+            GinIndex(fields=['nom'], name='produit_nom_trgm', opclasses=['gin_trgm_ops']),
+            # reference__istartswith des suggestions : UPPER(reference) LIKE 'TERME%'
+            models.Index(OpClass(Upper('reference'), name='text_pattern_ops'), name='produit_reference_upper'),
+            # Pagination par curseur sur les produits actifs (voir boutique/pagination.py)
+            models.Index(fields=['date_creation', 'id'], name='produit_actif_date_idx', condition=models.Q(active=True)),
+            models.Index(fields=['prix', 'id'], name='produit_actif_prix_idx', condition=models.Q(active=True)),
+            models.Index(fields=['nom', 'id'], name='produit_actif_nom_idx', condition=models.Q(active=True)),
+            models.Index(fields=['note_moyenne', 'id'], name='produit_actif_note_idx', condition=models.Q(active=True)),
+        ]
     
     def __str__(self):
         return self.nom
@@ -150,6 +252,11 @@ class Produit(models.Model):
         """Vérifie si le produit est disponible"""
         return self.stock > 0 and self.active
     
+    @property
+    def stock_disponible(self):
+        """Stock non réservé dans un panier"""
+        return max(self.stock - self.stock_reserve, 0)
+    
     @property
     def chemin_categorie(self):
         """Retourne le chemin complet de la catégorie du produit"""
@@ -159,14 +266,26 @@ class Produit(models.Model):
     def economie(self):
         """Calcule l'économie réalisée avec la promotion"""
         if self.prix_promo and self.prix_promo < self.prix:
-            return float(self.prix) - float(self.prix_promo)
+            return self.prix - self.prix_promo
         return 0
     
+    @property
+    def repartition_notes(self):
+        """Nombre et part des avis approuvés par note, de 5 à 1 étoile"""
+        return [
+            {
+                'note': note,
+                'nombre': getattr(self, f'nb_avis_{note}'),
+                'pourcentage': round(getattr(self, f'nb_avis_{note}') * 100 / self.nombre_avis) if self.nombre_avis else 0,
+            }
+            for note in range(5, 0, -1)
+        ]
+    
     @property
     def pourcentage_reduction(self):
         """Calcule le pourcentage de réduction"""
         if self.prix_promo and self.prix_promo < self.prix:
-            return round(((float(self.prix) - float(self.prix_promo)) / float(self.prix)) * 100)
+            return round((self.prix - self.prix_promo) * 100 / self.prix)
         return 0
 
 
@@ -174,6 +293,7 @@ class ImageProduit(models.Model):
     """Modèle pour les images supplémentaires des produits"""
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='produits/gallery/')
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
     alt_text = models.CharField(max_length=100, blank=True)
     ordre = models.PositiveIntegerField(default=0)
     
@@ -263,6 +383,14 @@ class Commande(models.Model):
     reduction = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     
+    # Livraison choisie et code promo appliqué : la réduction reste vérifiable (et annulable)
+    mode_livraison = models.ForeignKey(
+        'ModeLivraison', on_delete=models.PROTECT, blank=True, null=True, related_name='commandes'
+    )
+    code_promo = models.ForeignKey(
+        'CodePromo', on_delete=models.PROTECT, blank=True, null=True, related_name='commandes'
+    )
+    
     # Adresses
     adresse_facturation = models.ForeignKey(Adresse, on_delete=models.PROTECT, related_name='commandes_facturation')
     adresse_livraison = models.ForeignKey(Adresse, on_delete=models.PROTECT, related_name='commandes_livraison')
@@ -287,10 +415,8 @@ class Commande(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.numero_commande:
-            # Génération automatique du numéro de commande
-            import datetime
-            now = datetime.datetime.now()
-            self.numero_commande = f"CMD{now.strftime('%Y%m%d')}{self.pk or ''}"
+            # Génération automatique du numéro de commande (voir boutique/numerotation.py)
+            self.numero_commande = prochain_numero_commande(kwargs.get('using') or router.db_for_write(Commande, instance=self))
         super().save(*args, **kwargs)
 
 
@@ -314,19 +440,29 @@ class LigneCommande(models.Model):
 
 
 class Panier(models.Model):
-    """Modèle pour le panier temporaire"""
-    client = models.ForeignKey(ProfilClient, on_delete=models.CASCADE, related_name='paniers')
+    """Ligne de panier, d'un client connecté ou d'un visiteur anonyme (voir boutique/panier.py)"""
+    client = models.ForeignKey(ProfilClient, on_delete=models.CASCADE, related_name='paniers', null=True, blank=True)
+    cle_session = models.CharField(max_length=32, null=True, blank=True, editable=False,
+                                   help_text="Jeton du panier d'un visiteur non connecté")
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE)
     quantite = models.PositiveIntegerField(default=1)
     date_ajout = models.DateTimeField(auto_now_add=True)
     
+    # Réservation de stock de la ligne, libérée à expiration (voir boutique/stock.py)
+    quantite_reservee = models.PositiveIntegerField(default=0, editable=False)
+    reservation_expire = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    
     class Meta:
         verbose_name = "Panier"
         verbose_name_plural = "Paniers"
         unique_together = ['client', 'produit']
+        constraints = [
+            models.UniqueConstraint(fields=['cle_session', 'produit'], name='panier_session_produit_unique'),
+        ]
     
     def __str__(self):
-        return f"{self.client.user.username} - {self.produit.nom} (x{self.quantite})"
+        proprietaire = self.client.user.username if self.client_id else 'Visiteur'
+        return f"{proprietaire} - {self.produit.nom} (x{self.quantite})"
     
     @property
     def sous_total(self):
@@ -371,10 +507,19 @@ class CodePromo(models.Model):
     class Meta:
         verbose_name = "Code promo"
         verbose_name_plural = "Codes promo"
+        constraints = [
+            # Les codes sont saisis sans tenir compte de la casse (voir boutique/promos.py)
+            models.UniqueConstraint(Lower('code'), name='codepromo_code_insensible_casse'),
+        ]
     
     def __str__(self):
         return self.code
     
+    def save(self, *args, **kwargs):
+        # Forme normalisée, la même que celle recherchée par get_code_promo()
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+    
     @property
     def est_valide(self):
         from django.utils import timezone
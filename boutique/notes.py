@@ -0,0 +1,116 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, FloatField, OuterRef, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .cache import invalider_catalogue
+from .models import Avis, Produit
+
+NOTES = range(1, 6)
+CHAMPS_HISTOGRAMME = [f'nb_avis_{note}' for note in NOTES]
+
+# Produits mis à jour par requête lors d'un recalcul complet
+LOT_RECALCUL = 1000
+
+
+def lire_note_min(valeur):
+    """Paramètre ?note_min= en Decimal ramené entre 0 et 5 ; None s'il est absent ou invalide"""
+    try:
+        note = Decimal(str(valeur).strip().replace(',', '.'))
+    except InvalidOperation:
+        return None
+    if not note.is_finite():
+        return None
+    return min(max(note, Decimal(0)), Decimal(max(NOTES)))
+
+
+def contribution(avis):
+    """(produit_id, note) d'un avis pris en compte dans les notes, None sinon"""
+    if avis is None or not avis.approuve:
+        return None
+    return (avis.produit_id, avis.note)
+
+
+def mettre_a_jour_notes(ancienne, nouvelle):
+    """
+    Reporte sur Produit le passage d'un avis de la contribution `ancienne` à `nouvelle`.
+
+    Chaque produit concerné est mis à jour par un UPDATE incrémental : la
+    case de l'histogramme, le nombre d'avis et la moyenne (recalculée à
+    partir de l'histogramme dans la même instruction) changent ensemble.
+    """
+    if ancienne == nouvelle:
+        return
+    deltas = defaultdict(lambda: defaultdict(int))
+    if ancienne is not None:
+        deltas[ancienne[0]][ancienne[1]] -= 1
+    if nouvelle is not None:
+        deltas[nouvelle[0]][nouvelle[1]] += 1
+
+    with transaction.atomic():
+        for produit_id, par_note in deltas.items():
+            Produit.objects.filter(pk=produit_id).update(**_incrementer(par_note))
+    invalider_catalogue()
+
+
+def _incrementer(par_note):
+    """Expressions UPDATE appliquant {note: delta} à l'histogramme et aux agrégats"""
+    delta_total = sum(par_note.values())
+    histogramme = {note: F(f'nb_avis_{note}') + par_note.get(note, 0) for note in NOTES}
+    total = F('nombre_avis') + delta_total
+    somme = sum((note * expression for note, expression in histogramme.items()), Value(0))
+    moyenne = Cast(somme, FloatField()) / NullIf(total, 0)
+    valeurs = {
+        f'nb_avis_{note}': expression
+        for note, expression in histogramme.items() if par_note.get(note)
+    }
+    valeurs['nombre_avis'] = total
+    valeurs['note_moyenne'] = Coalesce(moyenne, Value(Decimal('0')), output_field=DecimalField(max_digits=3, decimal_places=2))
+    return valeurs
+
+
+def calculer_moyenne(histogramme):
+    """Moyenne arrondie au centième d'un histogramme {note: nombre}"""
+    total = sum(histogramme.values())
+    if not total:
+        return Decimal('0')
+    somme = sum(note * nombre for note, nombre in histogramme.items())
+    return (Decimal(somme) / total).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def recalculer_notes():
+    """
+    Recalcule les notes de tous les produits à partir des avis approuvés.
+
+    Une seule requête GROUP BY (produit, note) sur les avis, puis des
+    bulk_update par lots ; les produits sans avis approuvé sont remis à zéro.
+    Retourne le nombre de produits ayant au moins un avis.
+    """
+    histogrammes = defaultdict(dict)
+    for produit_id, note, nombre in (
+        Avis.objects.filter(approuve=True).order_by()
+        .values_list('produit_id', 'note').annotate(nombre=Count('id'))
+    ):
+        histogrammes[produit_id][note] = nombre
+
+    produits = []
+    for produit_id, histogramme in histogrammes.items():
+        produit = Produit(pk=produit_id, nombre_avis=sum(histogramme.values()), note_moyenne=calculer_moyenne(histogramme))
+        for note in NOTES:
+            setattr(produit, f'nb_avis_{note}', histogramme.get(note, 0))
+        produits.append(produit)
+
+    with transaction.atomic():
+        # Sous-requête plutôt qu'une liste NOT IN de tous les produits notés
+        Produit.objects.exclude(nombre_avis=0).exclude(
+            Exists(Avis.objects.filter(produit=OuterRef('pk'), approuve=True))
+        ).update(
+            note_moyenne=0, nombre_avis=0, **{champ: 0 for champ in CHAMPS_HISTOGRAMME}
+        )
+        Produit.objects.bulk_update(
+            produits, ['note_moyenne', 'nombre_avis', *CHAMPS_HISTOGRAMME], batch_size=LOT_RECALCUL
+        )
+    invalider_catalogue()
+    return len(produits)
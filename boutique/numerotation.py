@@ -0,0 +1,33 @@
+from django.db import connections
+from django.utils import timezone
+
+# Séquence PostgreSQL créée par la migration 0011
+SEQUENCE_NUMERO_COMMANDE = 'boutique_commande_numero_seq'
+
+PREFIXE_COMMANDE = 'CMD'
+
+
+def prochain_numero_commande(using='default'):
+    """
+    Numéro de commande unique et croissant, ex. CMD20261018000042.
+
+    Le compteur vient d'une séquence PostgreSQL : nextval() ne prend aucun
+    verrou durable, les workers qui créent des commandes en parallèle ne
+    s'attendent donc pas (une transaction annulée laisse simplement un trou
+    dans la numérotation). La date ne sert qu'à la lisibilité.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [SEQUENCE_NUMERO_COMMANDE])
+            compteur = cursor.fetchone()[0]
+    else:
+        compteur = _compteur_sans_sequence(using)
+    return f"{PREFIXE_COMMANDE}{timezone.localdate():%Y%m%d}{compteur:06d}"
+
+
+def _compteur_sans_sequence(using):
+    # Bases sans séquence (développement) : pas de garantie en cas de concurrence
+    from .models import Commande
+    dernier = Commande.objects.using(using).order_by('-id').values_list('id', flat=True).first()
+    return (dernier or 0) + 1
@@ -0,0 +1,177 @@
+from functools import reduce
+import operator
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+PAR_PAGE = 12
+
+# Tris exposés dans l'URL (?tri=...). Chaque tri se termine par l'id dans le
+# même sens, ce qui rend l'ordre total et permet un parcours d'index inversé.
+TRIS = {
+    '-date_creation': ('-date_creation', '-id'),
+    'date_creation': ('date_creation', 'id'),
+    'nom': ('nom', 'id'),
+    '-nom': ('-nom', '-id'),
+    'prix': ('prix', 'id'),
+    '-prix': ('-prix', '-id'),
+    '-note_moyenne': ('-note_moyenne', '-id'),
+}
+
+# Valeurs utilisées par le formulaire de recherche avancée
+ALIAS_TRIS = {
+    'prix_asc': 'prix',
+    'prix_desc': '-prix',
+    'nouveau': '-date_creation',
+    'note': '-note_moyenne',
+}
+
+# Tri par pertinence, pour les querysets annotés par rechercher_produits()
+ORDRE_PERTINENCE = ('-rang', '-date_creation', '-id')
+
+SALT_CURSEUR = 'boutique.pagination.curseur'
+
+
+def get_ordre(tri, defaut='-date_creation'):
+    """Convertit le paramètre ?tri= en ordre SQL, avec repli sur le tri par défaut"""
+    tri = ALIAS_TRIS.get(tri, tri)
+    return TRIS.get(tri, TRIS[defaut])
+
+
+class PageCurseur:
+    """Page obtenue par pagination par curseur (keyset), sans COUNT ni OFFSET"""
+    mode_curseur = True
+
+    def __init__(self, object_list, curseur_suivant, curseur_precedent):
+        self.object_list = object_list
+        self.curseur_suivant = curseur_suivant
+        self.curseur_precedent = curseur_precedent
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.curseur_suivant is not None
+
+    def has_previous(self):
+        return self.curseur_precedent is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginateurCurseur:
+    """
+    Pagination par curseur sur un ordre total (ex. -date_creation, -id).
+
+    Chaque page est obtenue par un filtre « après la dernière ligne vue »
+    suivi d'un LIMIT : le coût d'une page profonde est celui de la première.
+    Les curseurs sont opaques et signés pour ne pas être falsifiables.
+    """
+
+    def __init__(self, queryset, par_page, ordre):
+        self.queryset = queryset
+        self.par_page = par_page
+        self.ordre = [(champ.lstrip('-'), champ.startswith('-')) for champ in ordre]
+
+    def get_page(self, curseur=None):
+        precedent, valeurs = self._decoder(curseur)
+        ordre = [(champ, desc != precedent) for champ, desc in self.ordre]
+
+        produits = self.queryset
+        if valeurs is not None:
+            produits = produits.filter(self._apres(ordre, valeurs))
+        produits = produits.order_by(*[('-' if desc else '') + champ for champ, desc in ordre])
+
+        objets = list(produits[:self.par_page + 1])
+        encore = len(objets) > self.par_page
+        objets = objets[:self.par_page]
+
+        if precedent:
+            objets.reverse()
+            a_suivant, a_precedent = True, encore
+        else:
+            a_suivant, a_precedent = encore, valeurs is not None
+
+        return PageCurseur(
+            objets,
+            self._encoder(objets[-1], False) if objets and a_suivant else None,
+            self._encoder(objets[0], True) if objets and a_precedent else None,
+        )
+
+    def _apres(self, ordre, valeurs):
+        # (a, b) après (x, y)  <=>  a > x  OU  (a = x ET b > y)
+        conditions = []
+        egalites = Q()
+        for (champ, desc), valeur in zip(ordre, valeurs):
+            lookup = 'lt' if desc else 'gt'
+            conditions.append(egalites & Q(**{f'{champ}__{lookup}': valeur}))
+            egalites &= Q(**{champ: valeur})
+        return reduce(operator.or_, conditions)
+
+    def _signature_ordre(self):
+        return [('-' if desc else '') + champ for champ, desc in self.ordre]
+
+    def _encoder(self, objet, precedent):
+        valeurs = []
+        for champ, _ in self.ordre:
+            valeur = getattr(objet, champ)
+            valeurs.append(valeur if isinstance(valeur, (int, float, str)) else str(valeur))
+        return signing.dumps(
+            {'o': self._signature_ordre(), 'p': precedent, 'v': valeurs},
+            salt=SALT_CURSEUR, compress=True
+        )
+
+    def _decoder(self, curseur):
+        """Retourne (precedent, valeurs) ; un curseur invalide ramène à la première page"""
+        if not curseur:
+            return False, None
+        try:
+            donnees = signing.loads(curseur, salt=SALT_CURSEUR)
+        except signing.BadSignature:
+            return False, None
+        if donnees.get('o') != self._signature_ordre():
+            return False, None
+
+        valeurs = []
+        for (champ, _), valeur in zip(self.ordre, donnees['v']):
+            try:
+                valeur = self.queryset.model._meta.get_field(champ).to_python(valeur)
+            except FieldDoesNotExist:
+                pass  # annotation (ex. rang de pertinence)
+            valeurs.append(valeur)
+        return bool(donnees['p']), valeurs
+
+
+def paginer(request, queryset, ordre, par_page=PAR_PAGE, total=None):
+    """
+    Pagine un queryset selon la requête.
+
+    La pagination par curseur est utilisée par défaut ; un paramètre ?page=N
+    explicite conserve la pagination numérotée classique (anciens liens).
+    Un total exact déjà calculé (voir boutique/comptage.py) évite au
+    Paginator de relancer son propre COUNT(*).
+    """
+    numero = request.GET.get('page')
+    if numero:
+        paginator = Paginator(queryset.order_by(*ordre), par_page)
+        if total is not None and not total.approximatif:
+            paginator.count = int(total)
+        page_obj = paginator.get_page(numero)
+    else:
+        page_obj = PaginateurCurseur(queryset, par_page, ordre).get_page(request.GET.get('curseur'))
+
+    # Paramètres courants (filtres, tri) sans la position dans la pagination
+    parametres = request.GET.copy()
+    parametres.pop('page', None)
+    parametres.pop('curseur', None)
+    page_obj.querystring = parametres.urlencode()
+    return page_obj
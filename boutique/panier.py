@@ -0,0 +1,342 @@
+from collections import Counter
+from decimal import Decimal
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Panier, Produit, ProfilClient
+from .stock import StockInsuffisant, expiration_reservation, liberer, reserver
+
+# Clés de session : jeton du panier anonyme, profil client mémorisé et
+# ancien panier stocké entièrement en session (importé une seule fois)
+SESSION_CLE_PANIER = 'panier_cle'
+SESSION_CLIENT_ID = 'panier_client_id'
+SESSION_ANCIEN_PANIER = 'panier'
+
+# Nombre d'articles du panier, recopié dans un cookie lisible en JavaScript :
+# le compteur de la barre de navigation et count_panier() n'ont besoin ni de
+# la session ni de la base. Durée courte : le panier d'un client peut changer
+# depuis un autre appareil.
+COOKIE_NB_ARTICLES = 'panier_nb'
+DUREE_COOKIE_NB_ARTICLES = 60 * 60
+
+
+class ServicePanier:
+    """
+    Panier persistant, une ligne Panier par produit.
+
+    Le panier d'un client connecté est rattaché à son ProfilClient ; celui
+    d'un visiteur anonyme à un jeton aléatoire, seule donnée écrite en
+    session. Chaque opération ne touche que les lignes concernées, et les
+    quantités ajoutées réservent le stock (voir boutique/stock.py).
+
+    Les modifications n'écrivent pas la session (sauf à la création du
+    jeton) ; le nombre d'articles calculé pendant la requête est recopié dans
+    le cookie COOKIE_NB_ARTICLES par CompteurPanierMiddleware.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.session = request.session
+        self._proprietaire = None
+        if SESSION_ANCIEN_PANIER in self.session:
+            self._importer_ancien_panier()
+
+    # -- Propriétaire -----------------------------------------------------
+
+    def _get_proprietaire(self, creer=False):
+        """Filtre identifiant les lignes du panier, None si le visiteur n'en a pas"""
+        if self._proprietaire is None:
+            user = self.request.user
+            if user.is_authenticated:
+                client_id = self.session.get(SESSION_CLIENT_ID)
+                if client_id is None:
+                    client_id = get_client(user).id
+                    self.session[SESSION_CLIENT_ID] = client_id
+                self._proprietaire = {'client_id': client_id}
+            else:
+                cle = self.session.get(SESSION_CLE_PANIER)
+                if cle is None and creer:
+                    cle = uuid.uuid4().hex
+                    self.session[SESSION_CLE_PANIER] = cle
+                if cle is not None:
+                    self._proprietaire = {'cle_session': cle}
+        return self._proprietaire
+
+    def get_client_id(self):
+        """ProfilClient du panier, None pour un visiteur anonyme"""
+        proprietaire = self._get_proprietaire()
+        return proprietaire.get('client_id') if proprietaire else None
+
+    def lignes(self):
+        proprietaire = self._get_proprietaire()
+        if proprietaire is None:
+            return Panier.objects.none()
+        return Panier.objects.filter(**proprietaire)
+
+    # -- Lecture ------------------------------------------------------------
+
+    def quantite(self, produit_id):
+        ligne = self.lignes().filter(produit_id=produit_id).values_list('quantite', flat=True).first()
+        return ligne or 0
+
+    def nb_articles(self):
+        nb_articles = self.lignes().aggregate(total=Sum('quantite'))['total'] or 0
+        memoriser_nb_articles(self.request, nb_articles)
+        return nb_articles
+
+    def totaux(self):
+        """(nombre d'articles, sous-total au prix actuel) en une seule requête"""
+        totaux = self.lignes().aggregate(
+            nb_articles=Sum('quantite'),
+            sous_total=Sum(F('quantite') * Coalesce('produit__prix_promo', 'produit__prix')),
+        )
+        memoriser_nb_articles(self.request, totaux['nb_articles'] or 0)
+        return totaux['nb_articles'] or 0, totaux['sous_total'] or Decimal('0.00')
+
+    def contenu(self):
+        """Lignes du panier avec leur produit, en une seule requête"""
+        return self.lignes().select_related('produit__marque', 'produit__categorie').order_by('date_ajout', 'id')
+
+    # -- Modifications --------------------------------------------------------
+
+    def ajouter(self, produit_id, quantite=1):
+        """
+        Réserve le stock puis incrémente la ligne du produit, ou la crée (upsert).
+        Lève StockInsuffisant si les unités demandées ne sont plus libres.
+
+        Réservation et écriture de la ligne tiennent dans une transaction : une
+        réservation sans ligne de panier ne serait jamais libérée.
+        """
+        proprietaire = self._get_proprietaire(creer=True)
+        ligne = Panier.objects.filter(produit_id=produit_id, **proprietaire)
+        with transaction.atomic():
+            existe = bool(ligne.select_for_update().values_list('id', flat=True))
+            if not reserver(produit_id, quantite):
+                raise StockInsuffisant([produit_id])
+            memoriser_nb_articles(self.request, None)
+            increment = {
+                'quantite': F('quantite') + quantite,
+                'quantite_reservee': F('quantite_reservee') + quantite,
+                'reservation_expire': expiration_reservation(),
+            }
+            if existe:
+                ligne.update(**increment)
+                return
+            try:
+                with transaction.atomic():
+                    Panier.objects.create(
+                        produit_id=produit_id, quantite=quantite, quantite_reservee=quantite,
+                        reservation_expire=increment['reservation_expire'], **proprietaire
+                    )
+            except IntegrityError:
+                # Ligne créée entre-temps par une requête concurrente
+                ligne.update(**increment)
+
+    def definir_quantite(self, produit_id, quantite):
+        """Fixe la quantité d'un produit ; une quantité nulle retire la ligne"""
+        self.appliquer({produit_id: quantite})
+
+    def supprimer(self, produit_id):
+        memoriser_nb_articles(self.request, None)
+        return self._supprimer_lignes(self.lignes().filter(produit_id=produit_id)) > 0
+
+    def vider(self):
+        self._supprimer_lignes(self.lignes())
+        memoriser_nb_articles(self.request, 0)
+
+    def appliquer(self, changements):
+        """
+        Applique plusieurs changements {produit_id: quantite} d'un coup.
+
+        La réservation de chaque ligne est ajustée à sa nouvelle quantité :
+        une requête par produit dont la réservation augmente, puis une
+        libération, une suppression et un upsert groupés. Tout ou rien :
+        lève StockInsuffisant si un produit ne peut pas être réservé.
+        """
+        a_supprimer = [produit_id for produit_id, quantite in changements.items() if quantite <= 0]
+        a_definir = {produit_id: quantite for produit_id, quantite in changements.items() if quantite > 0}
+        proprietaire = self._get_proprietaire(creer=bool(a_definir))
+        if proprietaire is None:
+            return
+
+        memoriser_nb_articles(self.request, None)
+        with transaction.atomic():
+            reservees = dict(
+                Panier.objects.select_for_update()
+                .filter(produit_id__in=a_definir, **proprietaire)
+                .values_list('produit_id', 'quantite_reservee')
+            )
+            refuses = [
+                produit_id for produit_id, quantite in a_definir.items()
+                if not reserver(produit_id, quantite - reservees.get(produit_id, 0))
+            ]
+            if refuses:
+                raise StockInsuffisant(refuses)
+            liberer({
+                produit_id: reservees[produit_id] - quantite
+                for produit_id, quantite in a_definir.items() if produit_id in reservees
+            })
+
+            if a_supprimer:
+                self._supprimer_lignes(Panier.objects.filter(produit_id__in=a_supprimer, **proprietaire))
+            if a_definir:
+                self._upsert(proprietaire, {
+                    produit_id: (quantite, quantite) for produit_id, quantite in a_definir.items()
+                }, expiration_reservation())
+
+    def retirer_lignes(self, ids):
+        """Retire des lignes devenues invalides (produit désactivé, en rupture...)"""
+        memoriser_nb_articles(self.request, None)
+        self._supprimer_lignes(self.lignes().filter(id__in=ids))
+
+    def plafonner(self, quantites):
+        """Réduit des lignes {ligne_id: quantite} et libère la réservation excédentaire"""
+        memoriser_nb_articles(self.request, None)
+        with transaction.atomic():
+            lignes = list(self.lignes().select_for_update().filter(id__in=quantites))
+            excedents = Counter()
+            for ligne in lignes:
+                ligne.quantite = quantites[ligne.id]
+                if ligne.quantite_reservee > ligne.quantite:
+                    excedents[ligne.produit_id] += ligne.quantite_reservee - ligne.quantite
+                    ligne.quantite_reservee = ligne.quantite
+            Panier.objects.bulk_update(lignes, ['quantite', 'quantite_reservee'])
+            liberer(excedents)
+
+    @staticmethod
+    def _supprimer_lignes(lignes):
+        """Supprime des lignes et libère leur stock réservé ; retourne le nombre de lignes"""
+        with transaction.atomic():
+            supprimees = list(lignes.select_for_update().values_list('id', 'produit_id', 'quantite_reservee'))
+            if not supprimees:
+                return 0
+            Panier.objects.filter(id__in=[ligne_id for ligne_id, _, _ in supprimees]).delete()
+            liberer({produit_id: reservee for _, produit_id, reservee in supprimees})
+        return len(supprimees)
+
+    @staticmethod
+    def _upsert(proprietaire, lignes, expire):
+        """Insère ou remplace les lignes {produit_id: (quantite, quantite_reservee)}"""
+        Panier.objects.bulk_create(
+            [
+                Panier(
+                    produit_id=produit_id, quantite=quantite, quantite_reservee=reservee,
+                    reservation_expire=expire if reservee else None, **proprietaire
+                )
+                for produit_id, (quantite, reservee) in lignes.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['client' if 'client_id' in proprietaire else 'cle_session', 'produit'],
+            update_fields=['quantite', 'quantite_reservee', 'reservation_expire'],
+        )
+
+    def _importer_ancien_panier(self):
+        """Reprend un panier stocké en session avant le passage au panier persistant"""
+        ancien = self.session.pop(SESSION_ANCIEN_PANIER) or {}
+        quantites = {
+            int(produit_id): int(item.get('quantite', 0))
+            for produit_id, item in ancien.items()
+            if str(produit_id).isdigit()
+        }
+        quantites = {produit_id: quantite for produit_id, quantite in quantites.items() if quantite > 0}
+        if quantites:
+            # Ignorer les produits supprimés depuis
+            existants = Produit.objects.filter(pk__in=quantites).values_list('pk', flat=True)
+            quantites = {produit_id: quantites[produit_id] for produit_id in existants}
+        if quantites:
+            # Sans réservation : le stock sera vérifié à la commande
+            memoriser_nb_articles(self.request, None)
+            self._upsert(
+                self._get_proprietaire(creer=True),
+                {produit_id: (quantite, 0) for produit_id, quantite in quantites.items()},
+                None,
+            )
+
+
+def get_client(user):
+    client, _ = ProfilClient.objects.get_or_create(user=user)
+    return client
+
+
+def fusionner_panier_anonyme(request, user):
+    """
+    Fusionne le panier anonyme du visiteur dans celui du client qui se connecte.
+
+    Les quantités d'un même produit s'additionnent ; le plafonnement au stock
+    est fait à l'affichage du panier. Le jeton anonyme est ensuite oublié.
+    """
+    session = request.session
+    client_id = get_client(user).id
+    session[SESSION_CLIENT_ID] = client_id
+    # Le compteur du visiteur anonyme ne vaut plus pour le client
+    memoriser_nb_articles(request, None)
+
+    cle = session.pop(SESSION_CLE_PANIER, None)
+    if cle is None:
+        return
+
+    with transaction.atomic():
+        anonymes = {
+            produit_id: (quantite, reservee)
+            for produit_id, quantite, reservee in Panier.objects.select_for_update()
+            .filter(cle_session=cle).values_list('produit_id', 'quantite', 'quantite_reservee')
+        }
+        if not anonymes:
+            return
+        existantes = {
+            produit_id: (quantite, reservee)
+            for produit_id, quantite, reservee in Panier.objects.select_for_update()
+            .filter(client_id=client_id, produit_id__in=anonymes).values_list('produit_id', 'quantite', 'quantite_reservee')
+        }
+        # Les réservations des deux paniers sont cumulées et prolongées
+        ServicePanier._upsert(
+            {'client_id': client_id},
+            {
+                produit_id: tuple(a + b for a, b in zip(valeurs, existantes.get(produit_id, (0, 0))))
+                for produit_id, valeurs in anonymes.items()
+            },
+            expiration_reservation(),
+        )
+        Panier.objects.filter(cle_session=cle).delete()
+
+
+def memoriser_nb_articles(request, nb_articles):
+    """
+    Nombre d'articles à recopier dans le cookie en fin de requête ; None
+    quand il n'est plus connu (panier modifié, changement d'utilisateur) :
+    le cookie est alors supprimé, à moins qu'un comptage ultérieur dans la
+    même requête ne le fixe.
+    """
+    request.panier_nb_articles = nb_articles
+
+
+def lire_nb_articles(request):
+    """Nombre d'articles d'après le cookie, None s'il est absent ou invalide"""
+    valeur = request.COOKIES.get(COOKIE_NB_ARTICLES, '')
+    return int(valeur) if valeur.isdigit() else None
+
+
+class CompteurPanierMiddleware:
+    """Tient à jour le cookie COOKIE_NB_ARTICLES d'après memoriser_nb_articles()"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not hasattr(request, 'panier_nb_articles'):
+            return response
+        nb_articles = request.panier_nb_articles
+        if nb_articles is None:
+            if COOKIE_NB_ARTICLES in request.COOKIES:
+                response.delete_cookie(COOKIE_NB_ARTICLES, samesite='Lax')
+        elif nb_articles != lire_nb_articles(request):
+            response.set_cookie(
+                COOKIE_NB_ARTICLES, str(nb_articles), max_age=DUREE_COOKIE_NB_ARTICLES,
+                secure=settings.SESSION_COOKIE_SECURE, samesite='Lax',
+            )
+        return response
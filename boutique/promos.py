@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CodePromo
+
+# Durée de mise en cache d'un code (ou de son absence) : courte, car
+# l'utilisation réelle est toujours vérifiée en base par utiliser_code_promo()
+PROMO_CACHE_TTL = 30
+
+# Marqueur mis en cache pour un code inexistant
+CODE_INCONNU = 'inconnu'
+
+
+def normaliser_code(code):
+    """Forme enregistrée des codes (voir CodePromo.save) : sans espaces, en majuscules"""
+    return (code or '').strip().upper()
+
+
+def _cle_code(code):
+    return f'promo:{normaliser_code(code)}'
+
+
+def get_code_promo(code):
+    """
+    CodePromo correspondant à `code` (sans tenir compte de la casse), ou None.
+
+    Les codes sont enregistrés en majuscules et uniques sans tenir compte de
+    la casse : la recherche exacte sur la forme normalisée est déterministe.
+
+    Les codes trouvés comme les codes inconnus sont mis en cache quelques
+    secondes : une vente flash sur un même code ne relit pas la table à
+    chaque visite du panier, et des essais de codes au hasard non plus.
+    """
+    code = normaliser_code(code)
+    if not code:
+        return None
+    cle = _cle_code(code)
+    code_promo = cache.get(cle)
+    if code_promo is None:
+        code_promo = CodePromo.objects.filter(code=code).first() or CODE_INCONNU
+        cache.set(cle, code_promo, PROMO_CACHE_TTL)
+    return None if code_promo == CODE_INCONNU else code_promo
+
+
+def invalider_code_promo(code):
+    cache.delete(_cle_code(code))
+
+
+def utiliser_code_promo(code_promo):
+    """
+    Compte une utilisation du code si elle est encore permise ; retourne True si c'est le cas.
+
+    La validation (actif, période, plafond d'utilisations) et l'incrément
+    tiennent dans un seul UPDATE ... WHERE nombre_utilisations <
+    nombre_utilisations_max : deux commandes simultanées ne peuvent pas
+    consommer la même dernière utilisation.
+    """
+    maintenant = timezone.now()
+    utilise = CodePromo.objects.filter(
+        Q(nombre_utilisations_max__isnull=True) | Q(nombre_utilisations__lt=F('nombre_utilisations_max')),
+        pk=code_promo.pk,
+        active=True,
+        date_debut__lte=maintenant,
+        date_fin__gte=maintenant,
+    ).update(nombre_utilisations=F('nombre_utilisations') + 1) == 1
+    if not utilise:
+        # Code épuisé ou expiré : ne plus le présenter comme valide
+        invalider_code_promo(code_promo.code)
+    return utilise
@@ -0,0 +1,92 @@
+import hashlib
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.urls import reverse
+
+from .models import Produit, Categorie, Marque
+
+# Configuration PostgreSQL créée par la migration 0005 (french + unaccent)
+SEARCH_CONFIG = 'french_unaccent'
+
+# Autocomplétion de la barre de recherche
+SUGGESTIONS_LIMITE = 8
+SUGGESTIONS_LIMITE_GROUPES = 3
+SUGGESTIONS_LONGUEUR_MIN = 2
+SUGGESTIONS_CACHE_TTL = 60  # secondes
+
+
+def rechercher_produits(produits, query):
+    """Filtre un queryset de produits par recherche plein texte, trié par pertinence"""
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return produits.filter(
+        search_vector=search_query
+    ).annotate(
+        rang=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rang', '-date_creation')
+
+
+def suggestions_recherche(query, limite=SUGGESTIONS_LIMITE):
+    """Suggestions tolérantes aux fautes de frappe, mises en cache par préfixe"""
+    terme = ' '.join(query.lower().split())[:50]
+    if len(terme) < SUGGESTIONS_LONGUEUR_MIN:
+        return {'produits': [], 'categories': [], 'marques': []}
+
+    cle = 'suggestions:' + hashlib.md5(f'{limite}:{terme}'.encode()).hexdigest()
+    suggestions = cache.get(cle)
+    if suggestions is None:
+        suggestions = _calculer_suggestions(terme, limite)
+        cache.set(cle, suggestions, SUGGESTIONS_CACHE_TTL)
+    return suggestions
+
+
+def suggestions_produits(terme, limite=SUGGESTIONS_LIMITE):
+    """
+    Produits proposés pour `terme` : mot du nom proche du terme (opérateur
+    %>, index produit_nom_trgm) ou référence qui commence par le terme
+    (UPPER(reference) LIKE 'TERME%', index produit_reference_upper). Les
+    deux branches du OR ont leur index : pas de parcours séquentiel.
+    """
+    return Produit.objects.filter(
+        Q(nom__trigram_word_similar=terme) | Q(reference__istartswith=terme),
+        active=True
+    ).annotate(
+        similarite=TrigramWordSimilarity(terme, 'nom')
+    ).order_by('-similarite').values('id', 'nom', 'reference')[:limite]
+
+
+def _calculer_suggestions(terme, limite):
+    produits = suggestions_produits(terme, limite)
+
+    categories = Categorie.objects.filter(
+        nom__trigram_word_similar=terme, active=True
+    ).annotate(
+        similarite=TrigramWordSimilarity(terme, 'nom')
+    ).order_by('-similarite').values('id', 'nom')[:SUGGESTIONS_LIMITE_GROUPES]
+
+    marques = Marque.objects.filter(
+        nom__trigram_word_similar=terme, active=True
+    ).annotate(
+        similarite=TrigramWordSimilarity(terme, 'nom')
+    ).order_by('-similarite').values('id', 'nom')[:SUGGESTIONS_LIMITE_GROUPES]
+
+    url_produits = reverse('boutique:liste_produits')
+    return {
+        'produits': [
+            {
+                'nom': p['nom'],
+                'reference': p['reference'] or '',
+                'url': reverse('boutique:detail_produit', args=[p['id']]),
+            }
+            for p in produits
+        ],
+        'categories': [
+            {'nom': c['nom'], 'url': f"{url_produits}?categorie={c['id']}"}
+            for c in categories
+        ],
+        'marques': [
+            {'nom': m['nom'], 'url': f"{url_produits}?marque={m['id']}"}
+            for m in marques
+        ],
+    }
@@ -0,0 +1,73 @@
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import invalider_catalogue
+from .categories import invalider_cache_categories
+from .images import planifier_renditions
+from .models import Avis, Categorie, CodePromo, ImageProduit, Marque, Produit
+from .notes import contribution, mettre_a_jour_notes
+from .panier import fusionner_panier_anonyme, memoriser_nb_articles
+from .promos import invalider_code_promo
+
+
+@receiver([post_save, post_delete], sender=Categorie)
+def categorie_modifiee(sender, **kwargs):
+    """Invalider l'arbre des catégories en cache après toute modification"""
+    invalider_cache_categories()
+    invalider_catalogue()
+
+
+@receiver([post_save, post_delete], sender=Produit)
+def produit_modifie(sender, **kwargs):
+    """Invalider les pages dépendant du catalogue (accueil, ...)"""
+    invalider_catalogue()
+
+
+@receiver([post_save, post_delete], sender=CodePromo)
+def code_promo_modifie(sender, instance, **kwargs):
+    """Ne pas servir un code promo modifié depuis le cache"""
+    invalider_code_promo(instance.code)
+
+
+@receiver(post_save, sender=Produit)
+@receiver(post_save, sender=ImageProduit)
+@receiver(post_save, sender=Marque)
+@receiver(post_save, sender=Categorie)
+def image_enregistree(sender, instance, **kwargs):
+    """Générer en arrière-plan les renditions d'une image nouvelle ou remplacée"""
+    planifier_renditions(instance)
+
+
+@receiver(pre_save, sender=Avis)
+def avis_avant_modification(sender, instance, **kwargs):
+    """Mémoriser la contribution de l'avis aux notes avant sa modification"""
+    ancien = None
+    if instance.pk:
+        ancien = Avis.objects.filter(pk=instance.pk).only('produit_id', 'note', 'approuve').first()
+    instance._contribution_precedente = contribution(ancien)
+
+
+@receiver(post_save, sender=Avis)
+def avis_modifie(sender, instance, **kwargs):
+    """Mettre à jour les notes du produit (approbation, changement de note...)"""
+    mettre_a_jour_notes(getattr(instance, '_contribution_precedente', None), contribution(instance))
+
+
+@receiver(post_delete, sender=Avis)
+def avis_supprime(sender, instance, **kwargs):
+    mettre_a_jour_notes(contribution(instance), None)
+
+
+@receiver(user_logged_in)
+def client_connecte(sender, request, user, **kwargs):
+    """Reprendre dans le panier du client les articles ajoutés avant la connexion"""
+    if request is not None and hasattr(request, 'session'):
+        fusionner_panier_anonyme(request, user)
+
+
+@receiver(user_logged_out)
+def client_deconnecte(sender, request, user, **kwargs):
+    """Le panier affiché n'est plus celui du client : oublier le compteur"""
+    if request is not None:
+        memoriser_nb_articles(request, None)
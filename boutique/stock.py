@@ -0,0 +1,131 @@
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+import operator
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import invalider_catalogue
+from .models import Panier, Produit
+
+# Nombre de lignes de panier traitées par transaction lors du nettoyage
+LOT_LIBERATION = 1000
+
+
+class StockInsuffisant(Exception):
+    """Stock non réservable ou non vendable ; `produits` liste les ids concernés"""
+
+    def __init__(self, produits):
+        self.produits = list(produits)
+        super().__init__(f"Stock insuffisant pour les produits {self.produits}")
+
+
+def get_duree_reservation():
+    return timedelta(seconds=getattr(settings, 'RESERVATION_STOCK_TTL', 60 * 15))
+
+
+def expiration_reservation():
+    return timezone.now() + get_duree_reservation()
+
+
+def reserver(produit_id, quantite):
+    """
+    Réserve `quantite` unités d'un produit actif, si elles sont libres.
+
+    Vérification et réservation tiennent dans un seul UPDATE conditionnel :
+    deux acheteurs ne peuvent pas obtenir la même dernière unité, et le
+    verrou de la ligne produit n'est tenu que le temps de l'instruction.
+    """
+    if quantite <= 0:
+        return True
+    return Produit.objects.filter(
+        pk=produit_id,
+        active=True,
+        stock__gte=F('stock_reserve') + quantite,
+    ).update(stock_reserve=F('stock_reserve') + quantite) == 1
+
+
+def liberer(quantites):
+    """Rend au stock libre les unités réservées {produit_id: quantite}, en une requête"""
+    quantites = {produit_id: quantite for produit_id, quantite in quantites.items() if quantite > 0}
+    if not quantites:
+        return
+    Produit.objects.filter(pk__in=quantites).update(
+        stock_reserve=Greatest(F('stock_reserve') - _par_produit(quantites), Value(0))
+    )
+
+
+def convertir_en_vente(lignes):
+    """
+    Décrémente le stock des produits vendus en un seul UPDATE ... CASE.
+
+    `lignes` associe à chaque produit_id un couple (quantite, quantite_reservee) :
+    la part réservée sort du stock réservé, le reste doit encore être libre.
+    À appeler dans la transaction qui crée la commande ; lève StockInsuffisant
+    (sans rien modifier) si un produit ne peut pas être servi. Un produit
+    épuisé change d'état (« Rupture de stock ») : le cache du catalogue est
+    alors invalidé après le commit, l'UPDATE n'envoyant pas de post_save.
+    """
+    lignes = {produit_id: (quantite, min(reservee, quantite)) for produit_id, (quantite, reservee) in lignes.items()}
+    if not lignes:
+        return
+    # Le stock libre doit couvrir la part non réservée de chaque ligne
+    vendables = reduce(operator.or_, [
+        Q(pk=produit_id, active=True, stock_reserve__gte=reservee, stock__gte=F('stock_reserve') + quantite - reservee)
+        for produit_id, (quantite, reservee) in lignes.items()
+    ])
+    try:
+        with transaction.atomic():
+            mises_a_jour = Produit.objects.filter(vendables).update(
+                stock=F('stock') - _par_produit({produit_id: quantite for produit_id, (quantite, _) in lignes.items()}),
+                stock_reserve=F('stock_reserve') - _par_produit({produit_id: reservee for produit_id, (_, reservee) in lignes.items()}),
+            )
+            if mises_a_jour != len(lignes):
+                raise StockInsuffisant([])
+            if Produit.objects.filter(pk__in=lignes, stock=0).exists():
+                transaction.on_commit(invalider_catalogue)
+    except StockInsuffisant:
+        # Mise à jour annulée : identifier les produits qui ne peuvent pas être servis
+        servis = set(Produit.objects.filter(vendables).values_list('pk', flat=True))
+        raise StockInsuffisant(produit_id for produit_id in lignes if produit_id not in servis)
+
+
+def liberer_reservations_expirees(maintenant=None):
+    """
+    Libère les réservations expirées, par lots.
+
+    Chaque lot verrouille ses lignes de panier avec SELECT ... FOR UPDATE
+    SKIP LOCKED : plusieurs nettoyeurs peuvent tourner en parallèle sans
+    libérer deux fois la même réservation ni bloquer les paniers en cours
+    de modification. Retourne le nombre de lignes libérées.
+    """
+    maintenant = maintenant or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            lignes = list(
+                Panier.objects.select_for_update(skip_locked=True)
+                .filter(quantite_reservee__gt=0, reservation_expire__lt=maintenant)
+                .values_list('id', 'produit_id', 'quantite_reservee')[:LOT_LIBERATION]
+            )
+            if not lignes:
+                return total
+            Panier.objects.filter(id__in=[ligne_id for ligne_id, _, _ in lignes]).update(
+                quantite_reservee=0, reservation_expire=None
+            )
+            quantites = Counter()
+            for _, produit_id, quantite in lignes:
+                quantites[produit_id] += quantite
+            liberer(quantites)
+        total += len(lignes)
+
+
+def _par_produit(valeurs):
+    return Case(
+        *[When(pk=produit_id, then=Value(valeur)) for produit_id, valeur in valeurs.items()],
+        default=Value(0),
+    )
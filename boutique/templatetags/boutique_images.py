@@ -0,0 +1,68 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from boutique.images import RENDITIONS, FORMATS, get_champ_image, renditions_a_jour
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_responsive(instance, rendition='carte', sizes=None, **attributs):
+    """
+    Image d'un produit, d'une marque... servie par ses renditions.
+
+    Produit un <picture> proposant AVIF/WebP puis JPEG, avec un srcset de
+    toutes les renditions jusqu'à `rendition` : le navigateur télécharge la
+    plus petite suffisante. Tant que les renditions ne sont pas générées,
+    l'image d'origine est utilisée.
+
+        {% image_responsive produit 'carte' class="card-img-top" alt=produit.nom %}
+    """
+    image = getattr(instance, get_champ_image(instance))
+    if not image:
+        return ''
+    attributs.setdefault('loading', 'lazy')
+    attributs.setdefault('decoding', 'async')
+
+    if not renditions_a_jour(instance):
+        return format_html('<img src="{}"{}>', image.url, _attributs(attributs))
+
+    renditions = instance.renditions
+    tailles = [nom for nom in RENDITIONS if nom in renditions]
+    tailles = tailles[:tailles.index(rendition) + 1] if rendition in tailles else tailles
+    principale = renditions[tailles[-1]]
+    sizes = sizes or f"(max-width: 576px) 100vw, {principale['largeur']}px"
+
+    def srcset(extension):
+        return ', '.join(
+            f"{default_storage.url(renditions[nom][extension])} {renditions[nom]['largeur']}w"
+            for nom in tailles if extension in renditions[nom]
+        )
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((FORMATS[extension]['type'], srcset(extension), sizes)
+         for extension in ('avif', 'webp') if extension in principale)
+    )
+    attributs.setdefault('width', principale['largeur'])
+    attributs.setdefault('height', principale['hauteur'])
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        sources, default_storage.url(principale['jpeg']), srcset('jpeg'), sizes, _attributs(attributs)
+    )
+
+
+def _attributs(attributs):
+    return format_html_join('', ' {}="{}"', attributs.items())
+
+
+@register.simple_tag
+def rendition_url(instance, rendition='miniature'):
+    """URL JPEG d'une rendition (ou de l'image d'origine tant qu'elle n'est pas générée)"""
+    image = getattr(instance, get_champ_image(instance))
+    if not image:
+        return ''
+    if renditions_a_jour(instance) and rendition in instance.renditions:
+        return default_storage.url(instance.renditions[rendition]['jpeg'])
+    return image.url
@@ -1,3 +1,1020 @@
-from django.test import TestCase
+"""
+Budgets de requêtes SQL des vues, puis tests de comportement (stock, panier...).
 
-# Create your tests here.
+Chaque URL nommée de boutique.urls (et accounts.urls, voir accounts/tests.py)
+a un nombre maximal de requêtes, vérifié sur un catalogue réaliste à
+plusieurs tailles : une vue dont le nombre de requêtes augmente avec le
+nombre de produits (N+1, boucle sur un queryset...) fait échouer les tests.
+"""
+import json
+import threading
+import time
+from io import BytesIO
+import unittest
+from unittest import mock
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Optional
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.template.backends.django import Template as TemplateDjango
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+
+from inartdeco.profilage import ProfilageMiddleware, ProfilageVueMiddleware
+
+from .models import (
+    Adresse, Avis, Categorie, CodePromo, Commande, ImageProduit, Marque, ModeLivraison, Panier,
+    ProfilClient, Produit,
+)
+from .cache import get_version_catalogue
+from .comptage import Comptage
+from .commandes import CommandeInvalide, passer_commande
+from .exports import COLONNES, exporter_csv
+from .facettes import TRANCHES_PRIX, calculer_facettes, selection_depuis_requete
+from .images import traiter_instance
+from .imports import FEUILLE_PRODUITS, RapportImport, importer_produits, lire_lignes
+from .promos import get_code_promo, utiliser_code_promo
+from .search import suggestions_produits
+from .notes import lire_note_min, recalculer_notes
+from .pagination import TRIS, PaginateurCurseur
+from .panier import COOKIE_NB_ARTICLES
+from .stock import StockInsuffisant, convertir_en_vente, liberer, reserver
+
+MOT_DE_PASSE = 'motdepasse-test'
+
+# Nombres de produits du catalogue auxquels chaque budget est vérifié
+TAILLES = (20, 500, 3000)
+
+AVIS_PAR_PRODUIT = 3
+IMAGES_PAR_PRODUIT = 2
+
+
+# --- Fabriques ---------------------------------------------------------------
+
+def creer_categories(racines=3, enfants=3, petits_enfants=3):
+    """Arbre de catégories à trois niveaux ; retourne les feuilles"""
+    feuilles = []
+    for i in range(racines):
+        racine = Categorie(nom=f'Univers {i}', icone='fas fa-couch', ordre=i)
+        racine.save()
+        for j in range(enfants):
+            enfant = Categorie(nom=f'Rayon {i}.{j}', parent=racine, ordre=j)
+            enfant.save()
+            for k in range(petits_enfants):
+                feuille = Categorie(nom=f'Famille {i}.{j}.{k}', parent=enfant, ordre=k)
+                feuille.save()
+                feuilles.append(feuille)
+    return feuilles
+
+
+def creer_marques(nombre=8):
+    return Marque.objects.bulk_create(Marque(nom=f'Marque {i}') for i in range(nombre))
+
+
+def creer_utilisateur(username, staff=False):
+    """Utilisateur avec son ProfilClient et deux adresses (facturation, livraison)"""
+    user = User.objects.create_user(
+        username, f'{username}@example.com', MOT_DE_PASSE,
+        first_name='Amel', last_name='Ben Salah', is_staff=staff,
+    )
+    client = ProfilClient.objects.create(user=user, telephone='+216 71 000 000')
+    Adresse.objects.bulk_create(
+        Adresse(
+            client=client, type_adresse=type_adresse, nom='Ben Salah', prenom='Amel',
+            adresse1='12 rue de Marseille', ville='Tunis', code_postal='1000',
+            pays='Tunisie', par_defaut=True,
+        )
+        for type_adresse in ('facturation', 'livraison')
+    )
+    return user
+
+
+def creer_auteurs_avis(nombre=AVIS_PAR_PRODUIT):
+    """ProfilClient auteurs des avis (un avis par produit et par client)"""
+    users = User.objects.bulk_create(User(username=f'auteur{i}') for i in range(nombre))
+    return ProfilClient.objects.bulk_create(ProfilClient(user=user) for user in users)
+
+
+def creer_produits(nombre, categories, marques, debut=0):
+    """
+    `nombre` produits actifs numérotés à partir de `debut`, avec leurs images
+    supplémentaires et leurs avis approuvés (notes recalculées à la fin).
+    """
+    produits = [
+        Produit(
+            nom=f'Produit {n}',
+            description=f'Description du produit {n}',
+            prix=Decimal(10 + n % 490),
+            prix_promo=Decimal(9 + n % 490) if n % 5 == 0 else None,
+            stock=n % 50 + 10,
+            categorie=categories[n % len(categories)],
+            marque=marques[n % len(marques)],
+            reference=f'REF-{n:06d}',
+            sku=f'SKU-{n:06d}',
+            etat='neuf',
+            image_principale='produits/test.jpg',
+            featured=n % 10 == 0,
+            nouveau=n % 7 == 0,
+        )
+        for n in range(debut, debut + nombre)
+    ]
+    produits = Produit.objects.bulk_create(produits, batch_size=1000)
+    auteurs = list(ProfilClient.objects.filter(user__username__startswith='auteur'))
+
+    ImageProduit.objects.bulk_create(
+        (
+            ImageProduit(produit=produit, image=f'produits/gallery/test-{i}.jpg', ordre=i)
+            for produit in produits for i in range(IMAGES_PAR_PRODUIT)
+        ),
+        batch_size=1000,
+    )
+    Avis.objects.bulk_create(
+        (
+            Avis(
+                produit=produit, client=auteur, note=(produit.pk + i) % 5 + 1,
+                titre='Très bien', commentaire='Conforme à la description.', approuve=True,
+            )
+            for produit in produits for i, auteur in enumerate(auteurs)
+        ),
+        batch_size=1000,
+    )
+    recalculer_notes()
+    return produits
+
+
+def creer_catalogue(taille=TAILLES[0]):
+    """Arbre de catégories, marques et `taille` produits avec avis et images"""
+    categories = creer_categories()
+    marques = creer_marques()
+    creer_auteurs_avis()
+    return creer_produits(taille, categories, marques)
+
+
+def agrandir_catalogue(taille):
+    """Complète le catalogue jusqu'à `taille` produits"""
+    manquants = taille - Produit.objects.count()
+    if manquants > 0:
+        categories = list(Categorie.objects.filter(niveau=3).order_by('pk'))
+        marques = list(Marque.objects.order_by('pk'))
+        creer_produits(manquants, categories, marques, debut=Produit.objects.count())
+
+
+# --- Budgets -----------------------------------------------------------------
+
+@dataclass
+class Cas:
+    """
+    Une requête à mesurer : URL nommée, méthode et données, utilisateur
+    connecté et nombre maximal de requêtes SQL.
+
+    `kwargs`, `donnees` et `preparer` reçoivent le TestCase (les objets
+    créés dans setUpTestData) ; `preparer(test, client)` construit l'état
+    nécessaire (panier...) avant la mesure.
+    """
+    nom: str
+    budget: int
+    methode: str = 'get'
+    kwargs: Optional[Callable] = None
+    donnees: object = None
+    json: bool = False
+    utilisateur: Optional[str] = None
+    preparer: Optional[Callable] = None
+    entetes: dict = field(default_factory=dict)
+    statut: int = 200
+    # Recherche plein texte et trigrammes : PostgreSQL seulement
+    postgresql: bool = False
+
+    @property
+    def libelle(self):
+        return f'{self.methode.upper()} {self.nom}'
+
+
+def noms_urls(urlconf):
+    """Noms complets ('app:nom') des URL d'un module urls"""
+    resolver = get_resolver(urlconf)
+    app_name = getattr(resolver.urlconf_module, 'app_name', None)
+    return {
+        f'{app_name}:{motif.name}' if app_name else motif.name
+        for motif in resolver.url_patterns
+        if isinstance(motif, URLPattern) and motif.name
+    }
+
+
+class BudgetRequetes:
+    """
+    Mixin des tests de budget : chaque Cas de CAS est exécuté à chaque
+    taille de TAILLES, dans une transaction annulée ensuite et avec un
+    cache vide (le pire cas). Le nombre de requêtes doit rester sous le
+    budget et ne doit pas augmenter avec la taille du catalogue.
+
+    URLCONF et SANS_BUDGET (nom -> raison) servent à vérifier que chaque
+    URL a un budget ou une exemption explicite.
+    """
+    CAS = []
+    URLCONF = None
+    SANS_BUDGET = {}
+    TAILLES = TAILLES
+
+    def mesurer(self, cas):
+        with transaction.atomic():
+            client = Client()
+            if cas.utilisateur:
+                client.force_login(getattr(self, cas.utilisateur))
+            if cas.preparer:
+                cas.preparer(self, client)
+            cache.clear()
+
+            url = reverse(cas.nom, kwargs=cas.kwargs(self) if cas.kwargs else None)
+            donnees = cas.donnees(self) if callable(cas.donnees) else cas.donnees
+            options = {'headers': cas.entetes}
+            if cas.json:
+                options.update(data=json.dumps(donnees or {}), content_type='application/json')
+            elif donnees is not None:
+                options['data'] = donnees
+            with CaptureQueriesContext(connection) as requetes:
+                response = getattr(client, cas.methode)(url, **options)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+
+        self.assertEqual(response.status_code, cas.statut, f'{cas.libelle} : statut inattendu')
+        return requetes
+
+    def test_budgets(self):
+        mesures = {}
+        for taille in self.TAILLES:
+            agrandir_catalogue(taille)
+            for indice, cas in enumerate(self.CAS):
+                if cas.postgresql and connection.vendor != 'postgresql':
+                    continue
+                with self.subTest(cas.libelle, taille=taille):
+                    requetes = self.mesurer(cas)
+                    mesures.setdefault(indice, {})[taille] = len(requetes)
+                    self.assertLessEqual(
+                        len(requetes), cas.budget,
+                        f'{cas.libelle} : {len(requetes)} requêtes pour {taille} produits '
+                        f'(budget {cas.budget})\n' + '\n'.join(q['sql'] for q in requetes.captured_queries)
+                    )
+
+        for indice, par_taille in mesures.items():
+            libelle = self.CAS[indice].libelle
+            with self.subTest(libelle):
+                self.assertLessEqual(
+                    par_taille[max(par_taille)], par_taille[min(par_taille)],
+                    f'{libelle} : le nombre de requêtes augmente avec le catalogue {par_taille}'
+                )
+
+    def test_chaque_url_a_un_budget(self):
+        couverts = {cas.nom for cas in self.CAS} | set(self.SANS_BUDGET)
+        self.assertEqual(noms_urls(self.URLCONF) - couverts, set())
+
+
+def _kwargs_produit(test):
+    return {'pk': test.produit.pk}
+
+
+def _kwargs_produit_id(test):
+    return {'produit_id': test.produit.pk}
+
+
+def _kwargs_ligne_panier(test):
+    return {'produit_id': test.produits_panier[0].pk}
+
+
+def _remplir_panier(test, client):
+    for produit in test.produits_panier:
+        client.post(reverse('boutique:ajouter_panier', kwargs={'produit_id': produit.pk}))
+
+
+def _remplir_panier_sans_compteur(test, client):
+    _remplir_panier(test, client)
+    del client.cookies[COOKIE_NB_ARTICLES]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BudgetRequetesBoutiqueTests(BudgetRequetes, TestCase):
+    URLCONF = 'boutique.urls'
+
+    CAS = [
+        Cas('boutique:accueil', 3),
+        Cas('boutique:liste_produits', 4),
+        Cas('boutique:liste_produits', 6, donnees=lambda test: {
+            'categorie': test.produit.categorie.parent.parent_id, 'marque': test.produit.marque_id,
+            'prix_min': 20, 'prix_max': 300, 'en_stock': 1, 'tri': 'prix_asc',
+        }),
+        Cas('boutique:liste_produits', 8, donnees={'q': 'produit'}, postgresql=True),
+        Cas('boutique:detail_produit', 6, kwargs=_kwargs_produit),
+        Cas('boutique:recherche', 0),
+        Cas('boutique:recherche', 4, donnees={'q': 'produit'}, postgresql=True),
+        Cas('boutique:recherche_avancee', 7, donnees=lambda test: {
+            'categorie': test.produit.categorie.parent.parent_id, 'prix_min': 20, 'en_stock': 1,
+        }),
+        Cas('boutique:recherche_avancee', 8, donnees={'q': 'produit'}, postgresql=True),
+        Cas('boutique:suggestions', 4, donnees={'q': 'prod'}, postgresql=True),
+        Cas('boutique:categories_tree', 1),
+        Cas('boutique:categories_dropdown', 1, entetes={'X-Requested-With': 'XMLHttpRequest'}),
+        Cas('boutique:ajouter_panier', 13, methode='post', kwargs=_kwargs_produit_id),
+        Cas('boutique:voir_panier', 2, preparer=_remplir_panier),
+        Cas('boutique:voir_panier', 3, utilisateur='acheteur', preparer=_remplir_panier),
+        Cas('boutique:modifier_panier', 9, methode='post', kwargs=_kwargs_ligne_panier,
+            donnees={'quantite': 3}, json=True, preparer=_remplir_panier),
+        Cas('boutique:modifier_panier_lot', 9, methode='post', json=True, preparer=_remplir_panier,
+            donnees=lambda test: {'lignes': [
+                {'produit_id': produit.pk, 'quantite': 2} for produit in test.produits_panier
+            ]}),
+        Cas('boutique:supprimer_panier', 9, methode='post', kwargs=_kwargs_ligne_panier, preparer=_remplir_panier),
+        # Compteur lu dans le cookie : ni session ni base
+        Cas('boutique:count_panier', 0, preparer=_remplir_panier),
+        Cas('boutique:count_panier', 2, preparer=_remplir_panier_sans_compteur),
+        Cas('boutique:vider_panier', 6, methode='post', preparer=_remplir_panier),
+        Cas('boutique:verifier_code_promo', 3, methode='post', json=True,
+            donnees={'code': 'BIENVENUE10'}, preparer=_remplir_panier),
+        Cas('boutique:valider_commande', 19, methode='post', json=True, utilisateur='acheteur',
+            preparer=_remplir_panier, donnees=lambda test: {
+                'adresse_facturation': test.adresse.pk, 'adresse_livraison': test.adresse.pk,
+                'code_promo': 'BIENVENUE10',
+            }),
+        Cas('boutique:export_catalogue', 4, kwargs=lambda test: {'format_export': 'csv'}, utilisateur='staff'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        produits = creer_catalogue()
+        cls.produit = produits[0]
+        cls.produits_panier = produits[1:4]
+
+        cls.acheteur = creer_utilisateur('acheteur')
+        cls.staff = creer_utilisateur('staff', staff=True)
+        cls.adresse = Adresse.objects.filter(client__user=cls.acheteur).first()
+        maintenant = timezone.now()
+        CodePromo.objects.create(
+            code='BIENVENUE10', description='10 % de bienvenue', type_reduction='pourcentage',
+            valeur=10, date_debut=maintenant - timedelta(days=1), date_fin=maintenant + timedelta(days=30),
+        )
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CompteurPanierTests(TestCase):
+    """Cookie du nombre d'articles : tenu à jour par les vues du panier, oublié au changement d'utilisateur"""
+
+    @classmethod
+    def setUpTestData(cls):
+        produits = creer_catalogue()
+        cls.produits = produits[:2]
+        cls.acheteur = creer_utilisateur('acheteur')
+
+    def ajouter(self, produit):
+        return self.client.post(reverse('boutique:ajouter_panier', kwargs={'produit_id': produit.pk}))
+
+    def compteur(self):
+        cookie = self.client.cookies.get(COOKIE_NB_ARTICLES)
+        return cookie.value if cookie else None
+
+    def test_modifications_du_panier(self):
+        self.ajouter(self.produits[0])
+        self.ajouter(self.produits[0])
+        self.ajouter(self.produits[1])
+        self.assertEqual(self.compteur(), '3')
+
+        self.client.post(
+            reverse('boutique:modifier_panier', kwargs={'produit_id': self.produits[0].pk}),
+            data=json.dumps({'quantite': 5}), content_type='application/json',
+        )
+        self.assertEqual(self.compteur(), '6')
+
+        self.client.post(reverse('boutique:supprimer_panier', kwargs={'produit_id': self.produits[1].pk}))
+        self.assertEqual(self.compteur(), '5')
+
+        self.client.post(reverse('boutique:vider_panier'))
+        self.assertEqual(self.compteur(), '0')
+
+    def test_count_panier_sans_cookie(self):
+        self.ajouter(self.produits[0])
+        del self.client.cookies[COOKIE_NB_ARTICLES]
+        response = self.client.get(reverse('boutique:count_panier'))
+        self.assertEqual(response.json(), {'count': 1})
+        self.assertEqual(self.compteur(), '1')
+
+    def test_lecture_sans_session(self):
+        self.ajouter(self.produits[0])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('boutique:count_panier'))
+        self.assertEqual(response.json(), {'count': 1})
+
+    def test_connexion_et_deconnexion(self):
+        self.ajouter(self.produits[0])
+        self.client.post(reverse('accounts:login'), {'username': 'acheteur', 'password': MOT_DE_PASSE})
+        self.assertFalse(self.compteur())
+        self.assertEqual(self.client.get(reverse('boutique:count_panier')).json(), {'count': 1})
+
+        self.client.post(reverse('accounts:logout'))
+        self.assertFalse(self.compteur())
+        self.assertEqual(self.client.get(reverse('boutique:count_panier')).json(), {'count': 0})
+
+
+# --- Panier et stock ---------------------------------------------------------
+
+def ajouter_au_panier(client, produit, nombre=1):
+    """Ajoute `nombre` fois une unité ; retourne le nombre d'ajouts acceptés"""
+    url = reverse('boutique:ajouter_panier', kwargs={'produit_id': produit.pk})
+    return sum(client.post(url).json()['success'] for _ in range(nombre))
+
+
+class ReservationPanierTests(TestCase):
+    """Les paniers réservent le stock : jamais plus d'unités réservées que de stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produit = creer_catalogue(taille=1)[0]
+        Produit.objects.filter(pk=cls.produit.pk).update(stock=3)
+
+    def test_deux_paniers_ne_depassent_pas_le_stock(self):
+        premier, second = Client(), Client()
+        acceptes = 0
+        for _ in range(3):
+            acceptes += ajouter_au_panier(premier, self.produit)
+            acceptes += ajouter_au_panier(second, self.produit)
+
+        self.assertEqual(acceptes, 3)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock_reserve, 3)
+        self.assertEqual(Panier.objects.aggregate(total=Sum('quantite_reservee'))['total'], 3)
+
+    def test_echec_de_la_ligne_annule_la_reservation(self):
+        with mock.patch.object(Panier.objects, 'create', side_effect=RuntimeError('panne')):
+            with self.assertRaises(RuntimeError):
+                ajouter_au_panier(Client(), self.produit)
+
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock_reserve, 0)
+        self.assertFalse(Panier.objects.exists())
+
+
+class StockTests(TestCase):
+    """reserver / liberer / convertir_en_vente, appelés directement"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produit, cls.autre = creer_catalogue(taille=2)
+        Produit.objects.filter(pk__in=[cls.produit.pk, cls.autre.pk]).update(stock=5, stock_reserve=0)
+
+    def etat(self, produit):
+        produit.refresh_from_db()
+        return produit.stock, produit.stock_reserve
+
+    def test_reserver_jusqu_au_stock_libre(self):
+        self.assertTrue(reserver(self.produit.pk, 3))
+        self.assertFalse(reserver(self.produit.pk, 3))
+        self.assertTrue(reserver(self.produit.pk, 2))
+        self.assertFalse(reserver(self.produit.pk, 1))
+        self.assertEqual(self.etat(self.produit), (5, 5))
+
+    def test_reserver_quantite_nulle_ou_produit_inactif(self):
+        self.assertTrue(reserver(self.produit.pk, 0))
+        Produit.objects.filter(pk=self.produit.pk).update(active=False)
+        self.assertFalse(reserver(self.produit.pk, 1))
+        self.assertEqual(self.etat(self.produit), (5, 0))
+
+    def test_liberer_sans_passer_sous_zero(self):
+        Produit.objects.filter(pk=self.produit.pk).update(stock_reserve=2)
+        liberer({self.produit.pk: 5, self.autre.pk: 0})
+        self.assertEqual(self.etat(self.produit), (5, 0))
+        self.assertEqual(self.etat(self.autre), (5, 0))
+
+    def test_convertir_part_reservee_et_part_libre(self):
+        Produit.objects.filter(pk=self.produit.pk).update(stock_reserve=3)
+        Produit.objects.filter(pk=self.autre.pk).update(stock_reserve=1)
+        # 4 vendues dont 2 réservées ; une réservation plus grande que la ligne est bornée
+        convertir_en_vente({self.produit.pk: (4, 2), self.autre.pk: (1, 9)})
+        self.assertEqual(self.etat(self.produit), (1, 1))
+        self.assertEqual(self.etat(self.autre), (4, 0))
+
+    def test_convertir_stock_insuffisant_ne_modifie_rien(self):
+        Produit.objects.filter(pk=self.autre.pk).update(stock_reserve=4)
+        with self.assertRaises(StockInsuffisant) as erreur:
+            convertir_en_vente({self.produit.pk: (5, 0), self.autre.pk: (2, 0)})
+        self.assertEqual(erreur.exception.produits, [self.autre.pk])
+        self.assertEqual(self.etat(self.produit), (5, 0))
+        self.assertEqual(self.etat(self.autre), (5, 4))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'verrous de lignes : PostgreSQL seulement')
+class ReservationConcurrenteTests(TransactionTestCase):
+    """Des paniers qui ajoutent en même temps la dernière unité : un seul l'obtient"""
+    ACHETEURS = 8
+
+    def setUp(self):
+        self.produit = creer_catalogue(taille=1)[0]
+        Produit.objects.filter(pk=self.produit.pk).update(stock=3)
+
+    def test_ajouts_simultanes(self):
+        depart = threading.Barrier(self.ACHETEURS)
+        acceptes = []
+
+        def acheter():
+            try:
+                client = Client()
+                depart.wait()
+                acceptes.append(ajouter_au_panier(client, self.produit, nombre=2))
+            finally:
+                connection.close()
+
+        fils = [threading.Thread(target=acheter) for _ in range(self.ACHETEURS)]
+        for fil in fils:
+            fil.start()
+        for fil in fils:
+            fil.join()
+
+        self.produit.refresh_from_db()
+        self.assertEqual(sum(acceptes), 3)
+        self.assertEqual(self.produit.stock_reserve, 3)
+        self.assertEqual(Panier.objects.aggregate(total=Sum('quantite_reservee'))['total'], 3)
+
+
+# --- Commandes ---------------------------------------------------------------
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ValiderCommandeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produit = creer_catalogue(taille=1)[0]
+        cls.acheteur = creer_utilisateur('acheteur')
+        cls.adresse = Adresse.objects.filter(client__user=cls.acheteur).first()
+        cls.mode_livraison = ModeLivraison.objects.create(nom='Express', prix=Decimal('20.00'), delai_min=1, delai_max=2)
+        maintenant = timezone.now()
+        cls.code_promo = CodePromo.objects.create(
+            code='BIENVENUE10', description='10 % de bienvenue', type_reduction='pourcentage',
+            valeur=10, date_debut=maintenant - timedelta(days=1), date_fin=maintenant + timedelta(days=30),
+        )
+
+    def valider(self, **donnees):
+        self.client.force_login(self.acheteur)
+        response = self.client.post(
+            reverse('boutique:valider_commande'),
+            data=json.dumps({'adresse_facturation': self.adresse.pk, 'adresse_livraison': self.adresse.pk, **donnees}),
+            content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'], response.json())
+
+    def test_code_promo_et_mode_de_livraison_enregistres(self):
+        self.client.force_login(self.acheteur)
+        ajouter_au_panier(self.client, self.produit, nombre=2)
+        self.valider(mode_livraison=self.mode_livraison.pk, code_promo='BIENVENUE10')
+
+        commande = Commande.objects.get()
+        self.assertEqual(commande.code_promo, self.code_promo)
+        self.assertEqual(commande.mode_livraison, self.mode_livraison)
+        self.assertEqual(commande.frais_livraison, Decimal('20.00'))
+        self.assertEqual(commande.reduction, (commande.sous_total / 10).quantize(Decimal('0.01')))
+        self.code_promo.refresh_from_db()
+        self.assertEqual(self.code_promo.nombre_utilisations, 1)
+
+    def test_code_promo_compte_en_derniere_instruction(self):
+        self.client.force_login(self.acheteur)
+        ajouter_au_panier(self.client, self.produit)
+        with CaptureQueriesContext(connection) as requetes:
+            passer_commande(self.adresse.client_id, self.adresse, self.adresse, code_promo=self.code_promo)
+
+        sql = [requete['sql'] for requete in requetes.captured_queries]
+        (indice,) = [i for i, requete in enumerate(sql) if requete.startswith('UPDATE "boutique_codepromo"')]
+        self.assertTrue(all(requete.startswith('RELEASE SAVEPOINT') for requete in sql[indice + 1:]), sql[indice:])
+
+    def test_code_epuise_entre_verification_et_commit(self):
+        self.client.force_login(self.acheteur)
+        ajouter_au_panier(self.client, self.produit)
+        # Le code a été lu (et mis en cache) avant qu'une autre commande n'utilise la dernière utilisation
+        code_promo = CodePromo.objects.get(pk=self.code_promo.pk)
+        CodePromo.objects.filter(pk=code_promo.pk).update(nombre_utilisations_max=1, nombre_utilisations=1)
+        code_promo.nombre_utilisations_max = 1
+
+        with self.assertRaises(CommandeInvalide):
+            passer_commande(self.adresse.client_id, self.adresse, self.adresse, code_promo=code_promo)
+
+        self.assertFalse(Commande.objects.exists())
+        self.assertEqual(Panier.objects.count(), 1)
+        self.produit.refresh_from_db()
+        self.assertEqual((self.produit.stock, self.produit.stock_reserve), (10, 1))
+
+    def test_numero_deja_pris_retire(self):
+        self.client.force_login(self.acheteur)
+        ajouter_au_panier(self.client, self.produit)
+        self.valider()
+        pris = Commande.objects.get().numero_commande
+
+        ajouter_au_panier(self.client, self.produit)
+        with mock.patch('boutique.models.prochain_numero_commande', side_effect=[pris, 'CMD-SUIVANTE']):
+            self.valider()
+
+        self.assertEqual(sorted(Commande.objects.values_list('numero_commande', flat=True)), sorted([pris, 'CMD-SUIVANTE']))
+
+    def test_produit_epuise_invalide_le_cache(self):
+        Produit.objects.filter(pk=self.produit.pk).update(stock=2)
+        self.client.force_login(self.acheteur)
+        ajouter_au_panier(self.client, self.produit, nombre=2)
+        # Accueil mis en cache avec le produit encore disponible
+        self.assertContains(self.client.get(reverse('boutique:accueil')), f'ajouterAuPanier({self.produit.pk},')
+        version = get_version_catalogue()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.valider()
+
+        self.assertNotEqual(get_version_catalogue(), version)
+        response = self.client.get(reverse('boutique:accueil'))
+        self.assertNotContains(response, f'ajouterAuPanier({self.produit.pk},')
+
+    def test_vente_sans_rupture_garde_le_cache(self):
+        self.client.force_login(self.acheteur)
+        ajouter_au_panier(self.client, self.produit)
+        version = get_version_catalogue()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.valider()
+
+        self.assertEqual(get_version_catalogue(), version)
+
+
+# --- Images ------------------------------------------------------------------
+
+class RenditionsTests(TestCase):
+    """Le cache du catalogue n'est invalidé que pour les images des pages en cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produit = creer_catalogue(taille=1)[0]
+        cls.image = ImageProduit.objects.filter(produit=cls.produit).first()
+        cls.categorie = Categorie.objects.filter(parent__isnull=True).first()
+        cls.marque = cls.produit.marque
+        Categorie.objects.filter(pk=cls.categorie.pk).update(image='categories/test.jpg')
+        Marque.objects.filter(pk=cls.marque.pk).update(logo='marques/test.png')
+
+    def setUp(self):
+        self.enterContext(override_settings(STORAGES={
+            **settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        }))
+        noms = (self.produit.image_principale.name, self.image.image.name, 'categories/test.jpg', 'marques/test.png')
+        for nom in noms:
+            tampon = BytesIO()
+            Image.new('RGB', (800, 600), 'teal').save(tampon, 'JPEG')
+            default_storage.save(nom, ContentFile(tampon.getvalue()))
+
+    def test_image_de_produit(self):
+        version = get_version_catalogue()
+        self.assertTrue(traiter_instance(Produit, self.produit.pk))
+        self.assertNotEqual(get_version_catalogue(), version)
+
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.renditions['source'], self.produit.image_principale.name)
+        # Déjà à jour : rien à refaire
+        self.assertFalse(traiter_instance(Produit, self.produit.pk))
+
+    def test_image_de_galerie_et_lot(self):
+        version = get_version_catalogue()
+        self.assertTrue(traiter_instance(ImageProduit, self.image.pk))
+        self.assertTrue(traiter_instance(Produit, self.produit.pk, invalider=False))
+        self.assertEqual(get_version_catalogue(), version)
+
+    def test_images_de_categorie_et_de_marque(self):
+        version = get_version_catalogue()
+        self.assertTrue(traiter_instance(Marque, self.marque.pk))
+        # Logo affiché sur la fiche produit seulement, qui n'est pas en cache
+        self.assertEqual(get_version_catalogue(), version)
+        self.assertTrue(traiter_instance(Categorie, self.categorie.pk))
+        # Catégories de l'accueil, en cache
+        self.assertNotEqual(get_version_catalogue(), version)
+
+        accueil = self.client.get(reverse('boutique:accueil'))
+        self.assertContains(accueil, f'alt="{self.categorie.nom}"')
+        self.assertContains(accueil, '-miniature.jpeg')
+        fiche = self.client.get(reverse('boutique:detail_produit', args=[self.produit.pk]))
+        self.assertContains(fiche, f'alt="{self.marque.nom}"')
+
+
+# --- Codes promo -------------------------------------------------------------
+
+def creer_code_promo(code, **champs):
+    maintenant = timezone.now()
+    valeurs = {
+        'description': 'Code de test', 'type_reduction': 'pourcentage', 'valeur': 10,
+        'date_debut': maintenant - timedelta(days=1), 'date_fin': maintenant + timedelta(days=30),
+        **champs,
+    }
+    return CodePromo.objects.create(code=code, **valeurs)
+
+
+class CodePromoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_codes_normalises_et_uniques_sans_casse(self):
+        code_promo = creer_code_promo(' ete10 ')
+        self.assertEqual(code_promo.code, 'ETE10')
+        self.assertEqual(get_code_promo('Ete10'), code_promo)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            creer_code_promo('Ete10')
+
+    def test_code_cree_apres_un_essai_inconnu(self):
+        self.assertIsNone(get_code_promo('noel25'))
+        code_promo = creer_code_promo('NOEL25')
+        self.assertEqual(get_code_promo('noel25'), code_promo)
+
+
+    def test_plafond_d_utilisations(self):
+        code_promo = creer_code_promo('UNEFOIS', nombre_utilisations_max=1)
+        self.assertTrue(utiliser_code_promo(code_promo))
+        self.assertFalse(utiliser_code_promo(code_promo))
+        code_promo.refresh_from_db()
+        self.assertEqual(code_promo.nombre_utilisations, 1)
+        self.assertFalse(code_promo.est_valide)
+
+    def test_code_expire(self):
+        code_promo = creer_code_promo('PASSE', date_fin=timezone.now() - timedelta(minutes=1))
+        self.assertFalse(utiliser_code_promo(code_promo))
+        code_promo.refresh_from_db()
+        self.assertEqual(code_promo.nombre_utilisations, 0)
+
+# --- Notes -------------------------------------------------------------------
+
+class RecalculerNotesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produits = creer_catalogue(taille=3)
+
+    def test_produits_sans_avis_remis_a_zero(self):
+        sans_avis, note = self.produits[:2]
+        Avis.objects.filter(produit=sans_avis).update(approuve=False)
+        Avis.objects.filter(produit=note).update(note=4)
+
+        # Lecture groupée, remise à zéro par sous-requête, bulk_update (+ savepoint)
+        with self.assertNumQueries(5):
+            self.assertEqual(recalculer_notes(), 2)
+
+        sans_avis.refresh_from_db()
+        self.assertEqual((sans_avis.nombre_avis, sans_avis.note_moyenne, sans_avis.nb_avis_5), (0, 0, 0))
+        note.refresh_from_db()
+        self.assertEqual((note.nombre_avis, note.note_moyenne, note.nb_avis_4), (AVIS_PAR_PRODUIT, 4, AVIS_PAR_PRODUIT))
+
+
+
+class NoteMinTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_catalogue(taille=5)
+
+    def test_lire_note_min(self):
+        self.assertEqual(lire_note_min('4'), Decimal('4'))
+        self.assertEqual(lire_note_min('3,5'), Decimal('3.5'))
+        self.assertEqual(lire_note_min('9'), Decimal('5'))
+        self.assertEqual(lire_note_min('-1'), Decimal('0'))
+        for invalide in (None, '', 'abc', 'NaN', 'Infinity'):
+            self.assertIsNone(lire_note_min(invalide))
+
+    def test_valeur_invalide_ignoree(self):
+        for nom in ('boutique:liste_produits', 'boutique:recherche_avancee'):
+            with self.subTest(nom):
+                response = self.client.get(reverse(nom), {'note_min': 'abc'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['page_obj']), 5)
+
+# --- Recherche ---------------------------------------------------------------
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'trigrammes : PostgreSQL seulement')
+class SuggestionsIndexTests(TestCase):
+    """Les deux branches du filtre des suggestions sont servies par un index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_catalogue(taille=20)
+
+    def test_sans_parcours_sequentiel(self):
+        with connection.cursor() as curseur:
+            # Sur une petite table le planificateur préfère le parcours séquentiel
+            # s'il le peut : interdit, il n'y recourt que faute d'index utilisable
+            curseur.execute('SET LOCAL enable_seqscan = off')
+        plan = suggestions_produits('prod').explain()
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('produit_nom_trgm', plan)
+        self.assertIn('produit_reference_upper', plan)
+
+# --- Facettes ----------------------------------------------------------------
+
+class FacettesTests(TestCase):
+    """Décomptes comparés à un filtre ORM par facette"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_catalogue(taille=60)
+        Produit.objects.filter(pk__in=Produit.objects.order_by('pk').values('pk')[:7]).update(stock=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_decomptes_disjonctifs(self):
+        marque = Marque.objects.order_by('pk')[1]
+        base = Produit.objects.filter(active=True)
+        facettes = calculer_facettes(base, {}, selection_depuis_requete(str(marque.pk), None, '1', None))
+
+        sans_marque = base.filter(stock__gt=0)
+        sans_stock = base.filter(marque=marque)
+        avec_tout = sans_marque.filter(marque=marque)
+        self.assertEqual(facettes['marques'], {
+            autre.pk: sans_marque.filter(marque=autre).count() for autre in Marque.objects.all()
+        })
+        self.assertEqual(facettes['en_stock'], avec_tout.count())
+        self.assertEqual(facettes['promotion'], avec_tout.filter(prix_promo__isnull=False).count())
+        self.assertEqual(facettes['etats'], {'neuf': avec_tout.count()})
+        self.assertEqual(facettes['categories'], {
+            racine.pk: avec_tout.filter(categorie__chemin__startswith=racine.chemin).count()
+            for racine in Categorie.objects.filter(parent__isnull=True)
+        })
+        self.assertEqual(sum(tranche['count'] for tranche in facettes['tranches_prix']), avec_tout.count())
+        self.assertEqual(len(facettes['tranches_prix']), len(TRANCHES_PRIX))
+        self.assertLess(sans_stock.filter(stock__gt=0).count(), sans_stock.count())
+
+    def test_base_vide(self):
+        facettes = calculer_facettes(Produit.objects.none(), {'vide': 1}, selection_depuis_requete())
+        self.assertEqual(facettes['marques'], {})
+        self.assertEqual(facettes['en_stock'], 0)
+        self.assertEqual([tranche['count'] for tranche in facettes['tranches_prix']], [0] * len(TRANCHES_PRIX))
+
+# --- Comptage ----------------------------------------------------------------
+
+class ComptageTests(TestCase):
+
+    def test_comparaisons(self):
+        exact, estime = Comptage(42), Comptage(1000, approximatif=True, seuil=1000)
+        self.assertEqual(exact, 42)
+        self.assertEqual(exact, Comptage(42))
+        self.assertLess(exact, estime)
+        self.assertGreater(estime, 999)
+        self.assertEqual(sorted([estime, exact]), [exact, estime])
+        self.assertEqual({exact: 'ok'}[42], 'ok')
+
+    def test_autres_types(self):
+        comptage = Comptage(0)
+        self.assertNotEqual(comptage, None)
+        self.assertNotEqual(comptage, 'abc')
+        self.assertNotIn(None, [comptage])
+        with self.assertRaises(TypeError):
+            comptage < None
+
+# --- Pagination --------------------------------------------------------------
+
+class PaginationCurseurTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_catalogue(taille=30)
+
+    def paginateur(self, tri='prix'):
+        return PaginateurCurseur(Produit.objects.all(), 12, TRIS[tri])
+
+    def test_aller_retour(self):
+        paginateur = self.paginateur()
+        pages = [paginateur.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginateur.get_page(pages[-1].curseur_suivant))
+
+        vus = [produit.pk for page in pages for produit in page]
+        attendus = list(Produit.objects.order_by(*TRIS['prix']).values_list('pk', flat=True))
+        self.assertEqual(vus, attendus)
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+        self.assertFalse(pages[0].has_previous())
+
+        retour = paginateur.get_page(pages[2].curseur_precedent)
+        self.assertEqual([produit.pk for produit in retour], [produit.pk for produit in pages[1]])
+        self.assertTrue(retour.has_previous())
+
+    def test_curseur_falsifie_ou_d_un_autre_tri(self):
+        paginateur = self.paginateur()
+        premiere = [produit.pk for produit in paginateur.get_page()]
+        curseur = paginateur.get_page().curseur_suivant
+
+        falsifie = curseur[:-1] + ('A' if curseur[-1] != 'A' else 'B')
+        for invalide in (falsifie, 'pas-un-curseur', self.paginateur('-prix').get_page().curseur_suivant):
+            page = paginateur.get_page(invalide)
+            self.assertEqual([produit.pk for produit in page], premiere)
+            self.assertFalse(page.has_previous())
+
+
+# --- Imports -----------------------------------------------------------------
+
+class ImportProduitsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorie = creer_categories(racines=1, enfants=1, petits_enfants=1)[0]
+        Marque.objects.create(nom='Pyrex')
+
+    def importer(self, *lignes):
+        entete = ['reference', 'nom', 'prix', 'stock', 'categorie_nom', 'marque_nom']
+        rapport = RapportImport()
+        importer_produits(lire_lignes([entete, *lignes]), rapport)
+        return rapport
+
+    def test_lignes_en_erreur_signalees_sans_bloquer_l_import(self):
+        famille = self.categorie.nom
+        rapport = self.importer(
+            ['IMP-1', 'Plat à four', '24,90', '5', famille, 'Pyrex'],
+            ['IMP-2', 'Cocotte', '89', '2', famille, 'Inconnue'],
+            ['IMP-3', 'Saladier', 'gratuit', '1', famille, ''],
+            ['IMP-4', '', '12', '1', famille, ''],
+            ['IMP-5', 'Bol', '8', '3', 'Rayon absent', ''],
+        )
+
+        self.assertEqual(list(Produit.objects.values_list('reference', 'prix')), [('IMP-1', Decimal('24.90'))])
+        self.assertEqual(rapport.crees[FEUILLE_PRODUITS], 1)
+        erreurs = {ligne: message for _, ligne, message in rapport.erreurs}
+        self.assertEqual(sorted(erreurs), [3, 4, 5, 6])
+        self.assertEqual(erreurs[3], 'marque introuvable : Inconnue')
+        self.assertTrue(erreurs[4].startswith('prix : '))
+        self.assertEqual(erreurs[5], 'colonne(s) obligatoire(s) vide(s) : nom')
+        self.assertEqual(erreurs[6], 'catégorie introuvable : Rayon absent')
+
+    def test_reimport_met_a_jour_sur_la_reference(self):
+        famille = self.categorie.nom
+        self.importer(['IMP-1', 'Plat à four', '24,90', '5', famille, 'Pyrex'])
+        rapport = self.importer(['IMP-1', 'Plat à four XL', '29,90', '7', famille, 'Pyrex'])
+
+        self.assertEqual(rapport.mis_a_jour[FEUILLE_PRODUITS], 1)
+        self.assertEqual(rapport.crees[FEUILLE_PRODUITS], 0)
+        self.assertEqual(
+            list(Produit.objects.values_list('nom', 'prix', 'stock')), [('Plat à four XL', Decimal('29.90'), 7)],
+        )
+
+# --- Exports -----------------------------------------------------------------
+
+class ExportTests(TestCase):
+
+    def test_csv_envoye_avant_la_fin_de_la_lecture(self):
+        lues = []
+
+        def lignes():
+            for numero in range(100000):
+                lues.append(numero)
+                yield {colonne: f'{colonne}-{numero}' for colonne in COLONNES}
+
+        premier = next(exporter_csv(lignes()))
+        self.assertTrue(premier.startswith('\ufeffid,reference'.encode()))
+        self.assertLess(len(lues), 1000)
+
+
+# --- Profilage ---------------------------------------------------------------
+
+class ProfilageTests(TestCase):
+
+    def chaine(self, vue, attente_middleware=0.0):
+        """ProfilageMiddleware -> middleware lent -> ProfilageVueMiddleware -> vue"""
+        def middleware_lent(request):
+            response = vue_profilee(request)
+            time.sleep(attente_middleware)
+            return response
+
+        vue_profilee = ProfilageVueMiddleware(vue)
+        return ProfilageMiddleware(middleware_lent)
+
+    @override_settings(PROFILAGE_TAUX=0)
+    def test_desactive_sans_instrumenter_les_templates(self):
+        rendu = TemplateDjango.render
+        for classe in (ProfilageMiddleware, ProfilageVueMiddleware):
+            with self.assertRaises(MiddlewareNotUsed):
+                classe(lambda request: HttpResponse())
+        self.assertIs(TemplateDjango.render, rendu)
+
+    @override_settings(PROFILAGE_TAUX=1, PROFILAGE_SERVER_TIMING=False)
+    def test_server_timing_desactive(self):
+        with self.assertLogs('inartdeco.profilage'):
+            response = self.chaine(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILAGE_TAUX=1, PROFILAGE_SERVER_TIMING=True)
+    def test_temps_de_vue_sans_les_middlewares(self):
+        def vue(request):
+            time.sleep(0.01)
+            return HttpResponse()
+
+        with self.assertLogs('inartdeco.profilage'):
+            response = self.chaine(vue, attente_middleware=0.2)(RequestFactory().get('/'))
+        metriques = dict(
+            metrique.split(';dur=') for metrique in response['Server-Timing'].split(', ')
+            if ';dur=' in metrique and ';desc=' not in metrique
+        )
+        self.assertGreaterEqual(float(metriques['vue']), 10)
+        self.assertLess(float(metriques['vue']), 200)
+        self.assertGreaterEqual(float(metriques['total']), 200)
@@ -1,16 +1,36 @@
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from decimal import Decimal
 import json
 
-from .models import Produit, Categorie, Marque, ImageProduit
+from .models import Produit, Categorie, Marque, ImageProduit, Adresse, ModeLivraison
+from .search import rechercher_produits, suggestions_recherche
+from .categories import get_arbre_categories, get_mega_menu_html, get_dropdown_html
+from .cache import get_version_catalogue, get_or_set_protege
+from .pagination import paginer, get_ordre, ORDRE_PERTINENCE
+from .comptage import compter, Comptage
+from .facettes import calculer_facettes, selection_depuis_requete, appliquer_decomptes, ajouter_liens_tranches
+from .panier import ServicePanier, lire_nb_articles, memoriser_nb_articles
+from .stock import StockInsuffisant
+from .commandes import passer_commande, calculer_frais_livraison, calculer_reduction, CommandeInvalide
+from .promos import get_code_promo
+from .notes import lire_note_min
+from .exports import FORMATS_EXPORT, TYPES_CONTENU, exporter_catalogue
 
 
-def accueil(request):
+# Les sections de l'accueil ne dépendent que du catalogue : elles sont mises en
+# cache par version du catalogue (invalidée par les signaux Produit/Categorie)
+ACCUEIL_CACHE_TTL = 60 * 10
+
+
+def _contexte_accueil():
     # Récupérer les produits vedettes
     produits_vedettes = Produit.objects.filter(
         featured=True, 
@@ -24,7 +44,6 @@ def accueil(request):
     ).select_related('categorie', 'marque')[:4]
     
     # Récupérer les catégories principales avec le nombre de produits
-    # CORRECTION : changer 'produit' par 'produits' (ligne 32 et 33)
     categories = Categorie.objects.filter(
         parent__isnull=True,  # Catégories principales seulement
         active=True
@@ -32,10 +51,22 @@ def accueil(request):
         produits_count=Count('produits', filter=Q(produits__active=True))
     ).order_by('nom')[:6]  # Limiter à 6 catégories pour l'affichage
     
+    return {
+        'produits_vedettes': list(produits_vedettes),
+        'produits_nouveaux': list(produits_nouveaux),
+        'categories': list(categories),
+    }
+
+
+def accueil(request):
+    version = get_version_catalogue()
+    
+    def rendre_sections():
+        contexte = get_or_set_protege(f'accueil:contexte:{version}', _contexte_accueil, ACCUEIL_CACHE_TTL)
+        return render_to_string('boutique/includes/accueil_sections.html', contexte)
+    
     context = {
-        'produits_vedettes': produits_vedettes,
-        'produits_nouveaux': produits_nouveaux,
-        'categories': categories,
+        'sections_html': get_or_set_protege(f'accueil:sections:{version}', rendre_sections, ACCUEIL_CACHE_TTL),
     }
     return render(request, 'boutique/accueil.html', context)
 
@@ -43,7 +74,7 @@ def accueil(request):
 
 def liste_produits(request):
     """Liste des produits avec filtres"""
-    produits = Produit.objects.filter(active=True)
+    produits = Produit.objects.filter(active=True).select_related('categorie', 'marque')
     
     # Filtres
     categorie_id = request.GET.get('categorie')
@@ -51,37 +82,76 @@ def liste_produits(request):
     prix_min = request.GET.get('prix_min')
     prix_max = request.GET.get('prix_max')
     recherche = request.GET.get('q')
+    etat = request.GET.get('etat')
+    en_stock = request.GET.get('en_stock')
+    promo = request.GET.get('promo')
+    note_min = lire_note_min(request.GET.get('note_min'))
+    tri = request.GET.get('tri')
     
+    categorie_selectionnee = None
     if categorie_id:
-        produits = produits.filter(categorie_id=categorie_id)
-    if marque_id:
-        produits = produits.filter(marque_id=marque_id)
+        # Inclure les sous-catégories (préfixe du chemin matérialisé)
+        categorie_selectionnee = get_object_or_404(Categorie, id=categorie_id)
+        produits = produits.filter(categorie__chemin__startswith=categorie_selectionnee.chemin)
     if prix_min:
         produits = produits.filter(prix__gte=prix_min)
     if prix_max:
         produits = produits.filter(prix__lte=prix_max)
+    if note_min is not None:
+        produits = produits.filter(note_moyenne__gte=note_min)
     if recherche:
-        produits = produits.filter(
-            Q(nom__icontains=recherche) | 
-            Q(description__icontains=recherche)
-        )
+        produits = rechercher_produits(produits, recherche)
+    
+    # Facettes : calculées avant d'appliquer les filtres facettés
+    facettes = calculer_facettes(
+        produits,
+        {
+            'categorie': categorie_id, 'prix_min': prix_min, 'prix_max': prix_max,
+            'note_min': note_min, 'recherche': recherche,
+        },
+        selection_depuis_requete(marque_id, etat, en_stock, promo)
+    )
+    ajouter_liens_tranches(facettes, request)
     
-    # Pagination
-    paginator = Paginator(produits, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if marque_id:
+        produits = produits.filter(marque_id=marque_id)
+    if etat:
+        produits = produits.filter(etat=etat)
+    if en_stock:
+        produits = produits.filter(stock__gt=0)
+    if promo:
+        produits = produits.filter(prix_promo__isnull=False)
+    
+    filtres_actifs = {
+        'categorie': categorie_id,
+        'marque': marque_id,
+        'prix_min': prix_min,
+        'prix_max': prix_max,
+        'recherche': recherche,
+        'etat': etat,
+        'en_stock': en_stock,
+        'promo': promo,
+        'note_min': note_min,
+    }
+    
+    # Le nombre de résultats n'est affiché que pour une recherche
+    total_produits = compter(produits, filtres_actifs, 'liste_produits') if recherche else None
+    
+    # Pagination (par curseur par défaut)
+    ordre = ORDRE_PERTINENCE if recherche and not tri else get_ordre(tri)
+    page_obj = paginer(request, produits, ordre, total=total_produits)
     
     context = {
         'page_obj': page_obj,
-        'categories': Categorie.objects.filter(active=True, parent__isnull=True),
-        'marques': Marque.objects.filter(active=True),
-        'filtres_actifs': {
-            'categorie': categorie_id,
-            'marque': marque_id,
-            'prix_min': prix_min,
-            'prix_max': prix_max,
-            'recherche': recherche,
-        }
+        'produits': page_obj,
+        'total_produits': total_produits,
+        'categorie_selectionnee': categorie_selectionnee,
+        'categories': appliquer_decomptes(
+            Categorie.objects.filter(active=True, parent__isnull=True), facettes['categories']
+        ),
+        'marques': appliquer_decomptes(Marque.objects.filter(active=True), facettes['marques']),
+        'facettes': facettes,
+        'filtres_actifs': filtres_actifs,
     }
     return render(request, 'boutique/liste_produits.html', context)
 
@@ -108,64 +178,41 @@ def detail_produit(request, pk):
 def recherche(request):
     """Page de recherche"""
     query = request.GET.get('q')
-    results = []
+    results = Produit.objects.none()
     
     if query:
-        results = Produit.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(reference__icontains=query),
-            active=True
-        )
+        results = rechercher_produits(Produit.objects.filter(active=True), query)
     
-    paginator = Paginator(results, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    total_results = compter(results, {'q': query}, 'recherche') if query else Comptage(0)
+    # Sans requête, le queryset vide n'est pas annoté par rechercher_produits()
+    page_obj = paginer(request, results, ORDRE_PERTINENCE if query else get_ordre(None), total=total_results)
     
     context = {
         'query': query,
         'page_obj': page_obj,
-        'total_results': results.count() if query else 0,
+        'total_results': total_results,
     }
     return render(request, 'boutique/recherche.html', context)
 
 
+def suggestions(request):
+    """API d'autocomplétion pour la barre de recherche"""
+    query = request.GET.get('q', '')
+    return JsonResponse(suggestions_recherche(query))
+
+
 
 
 def get_categories_tree(request):
     """API pour récupérer l'arbre des catégories"""
-    categories_principales = Categorie.objects.filter(
-        active=True, 
-        parent__isnull=True
-    ).prefetch_related(
-        'sous_categories__sous_categories'
-    ).order_by('ordre', 'nom')
-    
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         # Retour JSON pour AJAX
-        def build_tree(categories):
-            tree = []
-            for cat in categories:
-                item = {
-                    'id': cat.id,
-                    'nom': cat.nom,
-                    'slug': cat.slug,
-                    'icone': cat.icone,
-                    'url': f"/produits/?categorie={cat.id}",
-                    'children': build_tree(cat.sous_categories.filter(active=True))
-                }
-                tree.append(item)
-            return tree
-        
         return JsonResponse({
-            'categories': build_tree(categories_principales)
+            'categories': get_arbre_categories()
         })
     
     # Retour HTML classique
-    html = render_to_string('boutique/includes/categories_dropdown.html', {
-        'categories': categories_principales
-    })
-    return JsonResponse({'html': html})
+    return JsonResponse({'html': get_mega_menu_html()})
 
 def recherche_avancee(request):
     """Page de recherche avancée"""
@@ -181,62 +228,78 @@ def recherche_avancee(request):
     prix_max = request.GET.get('prix_max')
     en_stock = request.GET.get('en_stock')
     promotion = request.GET.get('promotion')
+    note_min = lire_note_min(request.GET.get('note_min'))
+    tri = request.GET.get('tri')
     
     # Construction de la requête
     produits = Produit.objects.filter(active=True)
     
     if query:
-        produits = produits.filter(
-            Q(nom__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(reference__icontains=query)
-        )
+        produits = rechercher_produits(produits, query)
     
     if categorie_id:
-        # Inclure les sous-catégories
+        # Inclure les sous-catégories (préfixe du chemin matérialisé)
         categorie = get_object_or_404(Categorie, id=categorie_id)
-        categories_ids = [categorie.id]
-        categories_ids.extend([cat.id for cat in categorie.get_all_children])
-        produits = produits.filter(categorie_id__in=categories_ids)
+        produits = produits.filter(categorie__chemin__startswith=categorie.chemin)
     
     if sous_categorie_id:
         produits = produits.filter(categorie_id=sous_categorie_id)
     
-    if marque_id:
-        produits = produits.filter(marque_id=marque_id)
-    
     if prix_min:
         produits = produits.filter(prix__gte=prix_min)
     
     if prix_max:
         produits = produits.filter(prix__lte=prix_max)
     
+    if note_min is not None:
+        produits = produits.filter(note_moyenne__gte=note_min)
+    
+    # Facettes : calculées avant d'appliquer les filtres facettés
+    facettes = calculer_facettes(
+        produits,
+        {
+            'query': query, 'categorie': categorie_id, 'sous_categorie': sous_categorie_id,
+            'prix_min': prix_min, 'prix_max': prix_max, 'note_min': note_min,
+        },
+        selection_depuis_requete(marque_id, None, en_stock, promotion)
+    )
+    ajouter_liens_tranches(facettes, request)
+    
+    if marque_id:
+        produits = produits.filter(marque_id=marque_id)
+    
     if en_stock:
         produits = produits.filter(stock__gt=0)
     
     if promotion:
         produits = produits.filter(prix_promo__isnull=False)
     
-    # Pagination
-    paginator = Paginator(produits, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    filtres_actifs = {
+        'query': query,
+        'categorie': categorie_id,
+        'sous_categorie': sous_categorie_id,
+        'marque': marque_id,
+        'prix_min': prix_min,
+        'prix_max': prix_max,
+        'en_stock': en_stock,
+        'promotion': promotion,
+        'note_min': note_min,
+    }
+    
+    # Un seul comptage par requête, mis en cache par jeu de filtres
+    total_results = compter(produits, filtres_actifs, 'recherche_avancee')
+    
+    # Pagination (par curseur par défaut)
+    ordre = ORDRE_PERTINENCE if query and not tri else get_ordre(tri)
+    page_obj = paginer(request, produits, ordre, total=total_results)
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
-        'marques': marques,
-        'filtres_actifs': {
-            'query': query,
-            'categorie': categorie_id,
-            'sous_categorie': sous_categorie_id,
-            'marque': marque_id,
-            'prix_min': prix_min,
-            'prix_max': prix_max,
-            'en_stock': en_stock,
-            'promotion': promotion,
-        },
-        'total_results': produits.count(),
+        'categories': appliquer_decomptes(categories, facettes['categories']),
+        'marques': appliquer_decomptes(marques, facettes['marques']),
+        'facettes': facettes,
+        'filtres_actifs': filtres_actifs,
+        'total_results': total_results,
     }
     
     return render(request, 'boutique/recherche_avancee.html', context)
@@ -248,21 +311,7 @@ from django.template.loader import render_to_string
 def categories_dropdown(request):
     """Vue AJAX pour charger la liste simple des catégories"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        # Récupérer seulement les catégories principales (sans parent)
-        categories_principales = Categorie.objects.filter(parent=None, active=True).order_by('ordre', 'nom')
-        
-        html = ""
-        for categorie in categories_principales:
-            html += f'<li><a class="dropdown-item" href="/produits/?categorie={categorie.id}">'
-            html += f'<i class="{categorie.icone}"></i> {categorie.nom}</a></li>'
-            
-            # Ajouter les sous-catégories avec indentation
-            sous_categories = categorie.sous_categories.filter(active=True).order_by('ordre', 'nom')
-            for sous_cat in sous_categories:
-                html += f'<li><a class="dropdown-item ps-4" href="/produits/?categorie={sous_cat.id}">'
-                html += f'&nbsp;&nbsp;→ {sous_cat.nom}</a></li>'
-        
-        return JsonResponse({'html': html})
+        return JsonResponse({'html': get_dropdown_html()})
     
     return JsonResponse({'error': 'Requête invalide'}, status=400)
 
@@ -274,8 +323,13 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 import json
 
+def _message_stock(produit):
+    if not produit.disponible:
+        return 'Produit non disponible'
+    return f'Stock insuffisant. Seulement {produit.stock_disponible} disponible(s)'
+
 def ajouter_au_panier(request, produit_id):
-    """Ajouter un produit au panier (session)"""
+    """Ajouter un produit au panier"""
     if request.method == 'POST':
         produit = get_object_or_404(Produit, id=produit_id)
         
@@ -286,73 +340,67 @@ def ajouter_au_panier(request, produit_id):
                 'message': 'Produit non disponible'
             })
         
-        # Récupérer le panier de la session
-        panier = request.session.get('panier', {})
-        
-        # Ajouter ou incrémenter la quantité
-        if str(produit_id) in panier:
-            # Vérifier si on peut ajouter encore (stock disponible)
-            nouvelle_quantite = panier[str(produit_id)]['quantite'] + 1
-            if nouvelle_quantite > produit.stock:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Stock insuffisant. Seulement {produit.stock} disponible(s)'
-                })
-            panier[str(produit_id)]['quantite'] = nouvelle_quantite
-        else:
-            panier[str(produit_id)] = {
-                'nom': produit.nom,
-                'prix': float(produit.prix_final),
-                'quantite': 1,
-                'image': produit.image_principale.url if produit.image_principale else '',
-                'reference': produit.reference or '',
-                'max_stock': produit.stock
-            }
-        
-        # Sauvegarder le panier en session
-        request.session['panier'] = panier
-        request.session.modified = True
+        panier = ServicePanier(request)
         
-        # Calculer le nombre total d'articles
-        nb_articles = sum(item['quantite'] for item in panier.values())
+        # Réserver une unité (refusé si tout le stock est déjà réservé)
+        try:
+            panier.ajouter(produit_id)
+        except StockInsuffisant:
+            return JsonResponse({
+                'success': False,
+                'message': _message_stock(produit)
+            })
         
         return JsonResponse({
             'success': True,
             'message': f'{produit.nom} ajouté au panier',
-            'nb_articles': nb_articles
+            'nb_articles': panier.nb_articles()
         })
     
     return JsonResponse({'success': False, 'message': 'Méthode non autorisée'})
 
 def voir_panier(request):
     """Afficher le contenu du panier"""
-    panier = request.session.get('panier', {})
+    panier = ServicePanier(request)
     
-    # Enrichir les données du panier avec les infos produits
     panier_detaille = []
-    sous_total = 0
+    sous_total = Decimal('0.00')
+    nb_articles = 0
+    lignes_retirees = []
+    lignes_ajustees = {}
+    
+    # Lignes et produits en une seule requête
+    for ligne in panier.contenu():
+        produit = ligne.produit
+        if not produit.disponible:
+            # Produit désactivé ou en rupture
+            lignes_retirees.append(ligne.id)
+            continue
+        
+        # Prix et stock actuels : le prix n'est pas mémorisé dans le panier
+        if ligne.quantite > produit.stock:
+            ligne.quantite = lignes_ajustees[ligne.id] = produit.stock
+        prix_unitaire = produit.prix_final
+        item_total = prix_unitaire * ligne.quantite
+        sous_total += item_total
+        nb_articles += ligne.quantite
+        
+        panier_detaille.append({
+            'produit': produit,
+            'quantite': ligne.quantite,
+            'prix_unitaire': prix_unitaire,
+            'total': item_total,
+            'image': produit.image_principale.url if produit.image_principale else '',
+        })
     
-    for produit_id, item in panier.items():
-        try:
-            produit = Produit.objects.get(id=produit_id)
-            item_total = item['prix'] * item['quantite']
-            sous_total += item_total
-            
-            panier_detaille.append({
-                'produit': produit,
-                'quantite': item['quantite'],
-                'prix_unitaire': item['prix'],
-                'total': item_total,
-                'image': item.get('image', ''),
-            })
-        except Produit.DoesNotExist:
-            # Supprimer les produits qui n'existent plus
-            del request.session['panier'][produit_id]
-            request.session.modified = True
+    if lignes_retirees:
+        panier.retirer_lignes(lignes_retirees)
+    if lignes_ajustees:
+        panier.plafonner(lignes_ajustees)
+    memoriser_nb_articles(request, nb_articles)
     
     # Calculer les totaux
-    nb_articles = sum(item['quantite'] for item in panier.values())
-    frais_livraison = 15.00 if sous_total < 100 else 0  # Livraison gratuite au-dessus de 100 TND
+    frais_livraison = calculer_frais_livraison(sous_total)  # Livraison gratuite au-dessus de 100 TND
     total = sous_total + frais_livraison
     
     context = {
@@ -372,71 +420,182 @@ def modifier_quantite_panier(request, produit_id):
         nouvelle_quantite = int(data.get('quantite', 1))
         
         produit = get_object_or_404(Produit, id=produit_id)
-        panier = request.session.get('panier', {})
+        panier = ServicePanier(request)
         
-        if str(produit_id) in panier:
+        if panier.quantite(produit_id):
             if nouvelle_quantite <= 0:
                 # Supprimer l'article
-                del panier[str(produit_id)]
+                panier.supprimer(produit_id)
                 message = f'{produit.nom} retiré du panier'
-            elif nouvelle_quantite > produit.stock:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Stock insuffisant. Seulement {produit.stock} disponible(s)'
-                })
             else:
-                # Mettre à jour la quantité
-                panier[str(produit_id)]['quantite'] = nouvelle_quantite
+                # Mettre à jour la quantité (et la réservation de stock)
+                try:
+                    panier.definir_quantite(produit_id, nouvelle_quantite)
+                except StockInsuffisant:
+                    return JsonResponse({
+                        'success': False,
+                        'message': _message_stock(produit)
+                    })
                 message = f'Quantité mise à jour pour {produit.nom}'
             
-            request.session['panier'] = panier
-            request.session.modified = True
-            
             # Recalculer les totaux
-            nb_articles = sum(item['quantite'] for item in panier.values())
-            sous_total = sum(item['prix'] * item['quantite'] for item in panier.values())
+            nb_articles, sous_total = panier.totaux()
             
             return JsonResponse({
                 'success': True,
                 'message': message,
                 'nb_articles': nb_articles,
-                'sous_total': sous_total
+                'sous_total': float(sous_total)
             })
     
     return JsonResponse({'success': False, 'message': 'Erreur'})
 
+@require_POST
+def modifier_panier_lot(request):
+    """
+    Appliquer plusieurs changements de lignes en une requête.
+    
+    Corps JSON : {"lignes": [{"produit_id": 12, "quantite": 2}, ...]} ;
+    une quantité nulle retire le produit du panier.
+    """
+    try:
+        data = json.loads(request.body)
+        changements = {
+            int(ligne['produit_id']): int(ligne['quantite'])
+            for ligne in data.get('lignes', [])
+        }
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Requête invalide'}, status=400)
+    
+    panier = ServicePanier(request)
+    try:
+        panier.appliquer(changements)
+    except StockInsuffisant as erreur:
+        # Aucune ligne n'a été modifiée
+        produits = Produit.objects.in_bulk(erreur.produits)
+        return JsonResponse({
+            'success': False,
+            'message': 'Certaines lignes sont invalides',
+            'erreurs': {
+                produit_id: _message_stock(produits[produit_id]) if produit_id in produits else 'Produit non disponible'
+                for produit_id in erreur.produits
+            }
+        })
+    nb_articles, sous_total = panier.totaux()
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Panier mis à jour',
+        'nb_articles': nb_articles,
+        'sous_total': float(sous_total)
+    })
+
+@login_required
+@require_POST
+def valider_commande(request):
+    """
+    Transformer le panier en commande.
+    
+    Corps JSON : {"adresse_facturation": id, "adresse_livraison": id,
+    "mode_livraison": id (optionnel), "code_promo": "..." (optionnel), "notes": "..."}
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Requête invalide'}, status=400)
+    
+    client_id = ServicePanier(request).get_client_id()
+    adresse_facturation = get_object_or_404(Adresse, pk=data.get('adresse_facturation'), client_id=client_id)
+    adresse_livraison = get_object_or_404(Adresse, pk=data.get('adresse_livraison'), client_id=client_id)
+    mode_livraison = None
+    if data.get('mode_livraison'):
+        mode_livraison = get_object_or_404(ModeLivraison, pk=data['mode_livraison'], active=True)
+    code_promo = None
+    if data.get('code_promo'):
+        code_promo = get_code_promo(data['code_promo'])
+        if code_promo is None:
+            return JsonResponse({'success': False, 'message': 'Code promo inconnu'})
+    
+    try:
+        commande = passer_commande(
+            client_id, adresse_facturation, adresse_livraison,
+            mode_livraison=mode_livraison, code_promo=code_promo, notes_client=data.get('notes', '')
+        )
+    except CommandeInvalide as erreur:
+        return JsonResponse({'success': False, 'message': str(erreur)})
+    except StockInsuffisant as erreur:
+        noms = Produit.objects.filter(pk__in=erreur.produits).values_list('nom', flat=True)
+        return JsonResponse({
+            'success': False,
+            'message': f"Stock insuffisant pour : {', '.join(noms)}",
+            'erreurs': erreur.produits
+        })
+    # Les lignes du panier sont devenues la commande
+    memoriser_nb_articles(request, 0)
+    
+    return JsonResponse({
+        'success': True,
+        'message': f'Commande {commande.numero_commande} enregistrée',
+        'numero_commande': commande.numero_commande,
+        'total': float(commande.total)
+    })
+
+@require_POST
+def verifier_code_promo(request):
+    """Vérifier un code promo et calculer la réduction sur le panier actuel"""
+    try:
+        code = json.loads(request.body).get('code', '')
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Requête invalide'}, status=400)
+    
+    code_promo = get_code_promo(code)
+    if code_promo is None or not code_promo.est_valide:
+        return JsonResponse({'success': False, 'message': 'Code promo invalide ou expiré'})
+    
+    nb_articles, sous_total = ServicePanier(request).totaux()
+    if sous_total < code_promo.montant_minimum:
+        return JsonResponse({
+            'success': False,
+            'message': f"Ce code nécessite {code_promo.montant_minimum} TND d'achat minimum"
+        })
+    
+    reduction = calculer_reduction(code_promo, sous_total)
+    total = sous_total + calculer_frais_livraison(sous_total) - reduction
+    return JsonResponse({
+        'success': True,
+        'message': f'Code {code_promo.code} appliqué',
+        'code': code_promo.code,
+        'reduction': float(reduction),
+        'total': float(total)
+    })
+
 def supprimer_du_panier(request, produit_id):
     """Supprimer un produit du panier"""
     if request.method == 'POST':
-        panier = request.session.get('panier', {})
+        panier = ServicePanier(request)
         
-        if str(produit_id) in panier:
-            produit_nom = panier[str(produit_id)]['nom']
-            del panier[str(produit_id)]
-            request.session['panier'] = panier
-            request.session.modified = True
-            
-            nb_articles = sum(item['quantite'] for item in panier.values())
+        if panier.supprimer(produit_id):
+            produit_nom = Produit.objects.filter(id=produit_id).values_list('nom', flat=True).first() or 'Produit'
             
             return JsonResponse({
                 'success': True,
                 'message': f'{produit_nom} retiré du panier',
-                'nb_articles': nb_articles
+                'nb_articles': panier.nb_articles()
             })
     
     return JsonResponse({'success': False, 'message': 'Erreur'})
 
 def count_panier(request):
-    """Retourner le nombre d'articles dans le panier"""
-    panier = request.session.get('panier', {})
-    count = sum(item['quantite'] for item in panier.values())
-    return JsonResponse({'count': count})
+    """Retourner le nombre d'articles dans le panier (d'après le cookie s'il est présent, sans session ni base)"""
+    nb_articles = lire_nb_articles(request)
+    if nb_articles is None:
+        nb_articles = ServicePanier(request).nb_articles()
+    return JsonResponse({'count': nb_articles})
 
 def vider_panier(request):
     """Vider complètement le panier"""
     if request.method == 'POST':
-        request.session['panier'] = {}
-        request.session.modified = True
+        ServicePanier(request).vider()
         
         return JsonResponse({
             'success': True,
@@ -461,8 +620,7 @@ def detail_produit(request, pk):
     ).exclude(pk=pk)[:4]
     
     # Vérifier si le produit est dans le panier
-    panier = request.session.get('panier', {})
-    quantite_panier = panier.get(str(pk), {}).get('quantite', 0)
+    quantite_panier = ServicePanier(request).quantite(pk)
     
     context = {
         'produit': produit,
@@ -473,3 +631,22 @@ def detail_produit(request, pk):
     
     return render(request, 'boutique/detail_produit.html', context)
 
+
+
+@staff_member_required
+def export_catalogue(request, format_export):
+    """
+    Export du catalogue (CSV, JSONL ou XLSX) ; ?actifs=1 pour les seuls produits actifs.
+    
+    CSV et JSONL sont envoyés en flux dès la première ligne ; le XLSX n'est
+    envoyé qu'une fois le classeur écrit (voir boutique/exports.py).
+    """
+    if format_export not in FORMATS_EXPORT:
+        raise Http404("Format d'export inconnu")
+    response = StreamingHttpResponse(
+        exporter_catalogue(format_export, actifs=request.GET.get('actifs') == '1'),
+        content_type=TYPES_CONTENU[format_export],
+    )
+    nom_fichier = f"catalogue-{timezone.localdate():%Y%m%d}.{format_export}"
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
@@ -0,0 +1,182 @@
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as TemplateDjango
+
+logger = logging.getLogger('inartdeco.profilage')
+
+# Requêtes dupliquées détaillées dans la ligne de log
+DOUBLONS_JOURNALISES = 5
+
+# Listes de paramètres (IN (%s, %s, ...)) et nombres littéraux : une même
+# requête avec d'autres valeurs doit avoir la même empreinte
+_RE_LISTE = re.compile(r'\((?:\s*%s\s*,)*\s*%s\s*\)')
+_RE_NOMBRE = re.compile(r'\b\d+\b')
+
+_mesure_courante = contextvars.ContextVar('profilage_mesure', default=None)
+
+
+def empreinte_sql(sql):
+    normalise = _RE_NOMBRE.sub('?', _RE_LISTE.sub('(%s...)', sql))
+    return hashlib.sha1(normalise.encode()).hexdigest()[:12]
+
+
+class Mesure:
+    """Compteurs d'une requête HTTP ; sert aussi d'execute_wrapper pour les connexions"""
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.duree_vue = 0.0
+        self.nb_requetes = 0
+        self.duree_sql = 0.0
+        self.duree_templates = 0.0
+        self.profondeur_templates = 0
+        self.empreintes = Counter()
+        self.exemples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duree_sql += time.perf_counter() - debut
+            self.nb_requetes += 1
+            empreinte = empreinte_sql(sql)
+            self.empreintes[empreinte] += 1
+            self.exemples.setdefault(empreinte, sql)
+
+    def doublons(self):
+        return [(empreinte, nombre) for empreinte, nombre in self.empreintes.most_common() if nombre > 1]
+
+
+def _instrumenter_templates():
+    """Mesure le rendu des templates Django (le rendu le plus externe seulement)"""
+    if getattr(TemplateDjango.render, 'profilage', False):
+        return
+    rendu_origine = TemplateDjango.render
+
+    @functools.wraps(rendu_origine)
+    def render(self, context=None, request=None):
+        mesure = _mesure_courante.get()
+        if mesure is None or mesure.profondeur_templates:
+            return rendu_origine(self, context, request)
+        mesure.profondeur_templates += 1
+        debut = time.perf_counter()
+        try:
+            return rendu_origine(self, context, request)
+        finally:
+            mesure.duree_templates += time.perf_counter() - debut
+            mesure.profondeur_templates -= 1
+
+    render.profilage = True
+    TemplateDjango.render = render
+
+
+def _ms(secondes):
+    return round(secondes * 1000, 1)
+
+
+class ProfilageMiddleware:
+    """
+    Mesure un échantillon des requêtes : nombre et durée des requêtes SQL,
+    requêtes dupliquées (N+1), rendu des templates, temps de la vue.
+
+    Activé par PROFILAGE_TAUX (proportion de requêtes mesurées, 0 par
+    défaut : le middleware se retire alors de la chaîne et le rendu des
+    templates n'est pas instrumenté). Les mesures sont ajoutées en en-tête
+    Server-Timing si PROFILAGE_SERVER_TIMING (DEBUG par défaut : l'en-tête
+    est visible de tous les clients) et journalisées en une ligne JSON sur
+    le logger `inartdeco.profilage`. Le temps de la vue est mesuré par
+    ProfilageVueMiddleware, en fin de chaîne. Le SQL exécuté pendant
+    l'itération d'une réponse en flux n'est pas compté.
+    """
+
+    def __init__(self, get_response):
+        self.taux = getattr(settings, 'PROFILAGE_TAUX', 0)
+        if not self.taux:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PROFILAGE_SERVER_TIMING', settings.DEBUG)
+        _instrumenter_templates()
+
+    def __call__(self, request):
+        if random.random() >= self.taux:
+            return self.get_response(request)
+
+        mesure = Mesure()
+        jeton = _mesure_courante.set(mesure)
+        try:
+            with ExitStack() as pile:
+                for connexion in connections.all():
+                    pile.enter_context(connexion.execute_wrapper(mesure))
+                response = self.get_response(request)
+        finally:
+            _mesure_courante.reset(jeton)
+        fin = time.perf_counter()
+
+        duree_vue = mesure.duree_vue
+        doublons = mesure.doublons()
+        if self.server_timing:
+            metriques = [
+                f'sql;dur={_ms(mesure.duree_sql)};desc="{mesure.nb_requetes} requetes"',
+                f'tpl;dur={_ms(mesure.duree_templates)}',
+                f'vue;dur={_ms(duree_vue)}',
+                f'total;dur={_ms(fin - mesure.debut)}',
+            ]
+            if doublons:
+                metriques.append(f'dup;desc="{sum(nombre for _, nombre in doublons)} requetes dupliquees"')
+            if response.has_header('Server-Timing'):
+                metriques.insert(0, response['Server-Timing'])
+            response['Server-Timing'] = ', '.join(metriques)
+
+        logger.info(json.dumps({
+            'methode': request.method,
+            'chemin': request.path,
+            'vue': request.resolver_match.view_name if request.resolver_match else None,
+            'statut': response.status_code,
+            'total_ms': _ms(fin - mesure.debut),
+            'vue_ms': _ms(duree_vue),
+            'sql_ms': _ms(mesure.duree_sql),
+            'templates_ms': _ms(mesure.duree_templates),
+            'requetes': mesure.nb_requetes,
+            'doublons': [
+                {'empreinte': empreinte, 'nombre': nombre, 'sql': mesure.exemples[empreinte][:300]}
+                for empreinte, nombre in doublons[:DOUBLONS_JOURNALISES]
+            ],
+        }, ensure_ascii=False))
+        return response
+
+
+class ProfilageVueMiddleware:
+    """
+    Temps de la vue pour ProfilageMiddleware : placé en dernier dans
+    MIDDLEWARE, il ne compte ni les autres middlewares ni leur traitement de
+    la réponse (seulement la résolution d'URL, les process_view et le rendu
+    d'une TemplateResponse, en plus de la vue).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILAGE_TAUX', 0):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mesure = _mesure_courante.get()
+        if mesure is None:
+            return self.get_response(request)
+        debut = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            mesure.duree_vue = time.perf_counter() - debut
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inartdeco.profilage.ProfilageMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'boutique.panier.CompteurPanierMiddleware',
+    'inartdeco.profilage.ProfilageVueMiddleware',
 ]
 
 ROOT_URLCONF = 'inartdeco.urls'
@@ -89,6 +92,74 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Mémoire locale par défaut ; REDIS_URL ou CACHE_DIR pour partager le cache entre workers.
+# Avec un cache partagé, les sessions sont lues depuis le cache et écrites en
+# base (cached_db) ; la mémoire locale n'est pas partagée entre workers, les
+# sessions restent alors en base seulement.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+elif os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'inartdeco',
+        }
+    }
+
+# Au-delà de ce nombre de résultats estimés, les pages de recherche affichent
+# l'estimation du planificateur (« 1 000+ ») au lieu d'un COUNT(*) exact
+COMPTAGE_SEUIL_EXACT = 1000
+
+# Durée (secondes) pendant laquelle le stock ajouté au panier reste réservé ;
+# les réservations expirées sont libérées par `manage.py liberer_reservations`
+RESERVATION_STOCK_TTL = 60 * 15
+
+# Renditions d'images (boutique/images.py) : générées en arrière-plan après
+# l'upload, sauf si RENDITIONS_SYNCHRONES (tests, scripts d'import)
+RENDITIONS_SYNCHRONES = False
+RENDITIONS_WORKERS = 2
+
+# Profilage des requêtes (inartdeco/profilage.py) : proportion des requêtes
+# HTTP mesurées, 0 = désactivé, 0.01 = une sur cent, 1 = toutes. Mesures en
+# ligne JSON sur le logger `inartdeco.profilage`, et en en-tête Server-Timing
+# en développement seulement (l'en-tête est lisible par tous les visiteurs)
+PROFILAGE_TAUX = float(os.environ.get('PROFILAGE_TAUX', '0'))
+PROFILAGE_SERVER_TIMING = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'inartdeco.profilage': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'boutique:accueil'
 LOGOUT_REDIRECT_URL = 'boutique:accueil'